@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Токен командной строки cmd: непрерывная последовательность непробельных
+# символов, внутри которой "..." может содержать пробелы, а ^x экранирует x.
+_TOKEN_RE = re.compile(r'(?:"[^"]*"?|\^.?|[^\s"^])+')
+
+# Ключи аргументов winws, значения которых — пути к файлам.
+_FILE_ARG_KEYS = ("ipset", "hostlist", "fake", "tls", "quic", "pattern")
+
+
+def join_logical_lines(text: str) -> List[str]:
+    """Склеить строки с ^ в логические, выбросить пустые/комментарии/@-строки."""
+    lines: List[str] = []
+    buf: List[str] = []
+    for raw in text.splitlines():
+        s = raw.strip()
+        if not s:
+            continue
+        low = s.lower()
+        if low.startswith("rem ") or low.startswith("::") or low.startswith("@"):
+            continue
+        if s.endswith("^"):
+            buf.append(s[:-1])
+            buf.append(" ")
+        else:
+            buf.append(s)
+            lines.append("".join(buf).strip())
+            buf = []
+    if buf:
+        lines.append("".join(buf).strip())
+    return lines
+
+
+def expand_vars(line: str, env: Dict[str, str]) -> str:
+    """
+    Один проход подстановки %VAR% и %~dp0 (как в cmd, без повторного раскрытия
+    подставленных значений). Неизвестные переменные остаются как есть.
+    """
+    if "%" not in line:
+        return line
+    out: List[str] = []
+    i = 0
+    while True:
+        j = line.find("%", i)
+        if j < 0:
+            break
+        if line.startswith("%~", j):
+            # %~dp0, %~f0 ... — модификатор аргумента, без закрывающего %
+            m = j + 2
+            while m < len(line) and line[m].isalpha():
+                m += 1
+            if m < len(line) and line[m].isdigit():
+                val = env.get(line[j + 1:m + 1].lower())
+                if val is not None:
+                    out.append(line[i:j])
+                    out.append(val)
+                    i = m + 1
+                    continue
+        k = line.find("%", j + 1)
+        if k < 0:
+            break
+        val = env.get(line[j + 1:k].lower())
+        if val is None:
+            out.append(line[i:j + 1])
+            i = j + 1
+            continue
+        out.append(line[i:j])
+        out.append(val)
+        i = k + 1
+    out.append(line[i:])
+    return "".join(out)
+
+
+def _unescape(token: str) -> str:
+    """Снять ^-экранирование вне кавычек (кавычки сохраняются)."""
+    if "^" not in token:
+        return token
+    out: List[str] = []
+    quoted = False
+    i = 0
+    n = len(token)
+    while i < n:
+        c = token[i]
+        if c == '"':
+            quoted = not quoted
+        elif c == "^" and not quoted and i + 1 < n:
+            i += 1
+            c = token[i]
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+def split_args(line: str) -> List[str]:
+    """Разбить строку на токены по правилам cmd (кавычки остаются в токенах)."""
+    return [_unescape(t) for t in _TOKEN_RE.findall(line)]
+
+
+def _resolve_file_arg(val: str, search_dirs: List[str]) -> str:
+    if os.path.isfile(val):
+        return val
+    for d in search_dirs:
+        p = os.path.join(d, val)
+        if os.path.isfile(p):
+            return p
+    return val
+
+
+def parse_bat_variables_and_command(
+    bat_path: str, app_root: Optional[str] = None
+) -> Tuple[str, List[str], str]:
+    """
+    Разобрать .bat и вернуть (winws.exe, аргументы, рабочая папка).
+    app_root — папка приложения для поиска bin/lists, если их нет рядом с .bat.
+    """
+    bat_dir = os.path.abspath(os.path.dirname(bat_path))
+    app_root = app_root or bat_dir
+
+    env: Dict[str, str] = {
+        "~dp0": bat_dir + "\\",
+        "~f0": os.path.abspath(bat_path),
+    }
+    bin_dir = os.path.join(bat_dir, "bin")
+    env["bin"] = (bin_dir if os.path.isdir(bin_dir) else bat_dir) + "\\"
+
+    with open(bat_path, "r", encoding="utf-8", errors="ignore") as f:
+        lines = join_logical_lines(f.read())
+
+    winws_cmd_parts: Optional[List[str]] = None
+
+    for ln in lines:
+        resolved_ln = expand_vars(ln, env)
+        parts = split_args(resolved_ln)
+        if not parts:
+            continue
+
+        cmd_lower = parts[0].lower()
+        if cmd_lower == "if":
+            continue
+
+        if cmd_lower == "set":
+            remainder = resolved_ln[3:].strip()
+            if remainder.startswith('"') and remainder.endswith('"'):
+                remainder = remainder[1:-1]
+            if "=" in remainder:
+                k, v = remainder.split("=", 1)
+                k, v = k.strip(), v.strip()
+                if v.startswith('"') and v.endswith('"'):
+                    v = v[1:-1]
+                env[k.lower()] = v
+        elif "winws.exe" in resolved_ln.lower():
+            winws_cmd_parts = parts
+            break
+
+    if not winws_cmd_parts:
+        raise RuntimeError("Не найдена команда winws.exe")
+
+    idx = -1
+    for i, p in enumerate(winws_cmd_parts):
+        if "winws.exe" in p.lower():
+            idx = i
+            break
+    if idx == -1:
+        raise RuntimeError("winws.exe потерялся при парсинге")
+
+    exe = winws_cmd_parts[idx].strip('"')
+    raw_args = winws_cmd_parts[idx + 1:]
+
+    if not os.path.isabs(exe):
+        cands = [
+            os.path.join(bat_dir, exe),
+            os.path.join(bat_dir, "bin", "winws.exe"),
+            os.path.join(app_root, "bin", "winws.exe"),
+            os.path.join(bat_dir, "winws.exe"),
+        ]
+        for c in cands:
+            if os.path.isfile(c):
+                exe = c
+                break
+
+    search_dirs = [
+        bat_dir,
+        os.path.join(bat_dir, "lists"),
+        os.path.join(bat_dir, "bin"),
+        app_root,
+        os.path.join(app_root, "lists"),
+    ]
+
+    # одинаковые пути встречаются в нескольких секциях --new: проверяем их один раз
+    resolved: Dict[str, str] = {}
+    final_args: List[str] = []
+    for arg in raw_args:
+        clean = arg.replace('"', "")
+
+        if "=" in clean and any(k in clean for k in _FILE_ARG_KEYS):
+            key, val = clean.split("=", 1)
+            if not val or val.startswith("-"):
+                final_args.append(f"{key}={val}")
+                continue
+            path = resolved.get(val)
+            if path is None:
+                path = resolved[val] = _resolve_file_arg(val, search_dirs)
+            final_args.append(f"{key}={path}")
+        else:
+            final_args.append(clean)
+
+    return exe, final_args, bat_dir
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import bz2
+import struct
+from typing import Dict, List, Optional, Tuple
+
+# bsdiff4 (C-расширение) нужен для построения патчей в make_release;
+# применять патчи умеет и чистый Python ниже, без него
+try:
+    import bsdiff4
+except ImportError:
+    bsdiff4 = None
+
+MAGIC = b"BSDIFF40"
+_HEADER = 32
+
+# кусок для побайтового сложения через длинные int
+_ADD_CHUNK = 1024 * 1024
+_masks: Dict[int, Tuple[int, int]] = {}
+
+
+def diff(old: bytes, new: bytes) -> bytes:
+    """Патч old -> new в формате BSDIFF40 (как у bsdiff4). Нужен пакет bsdiff4."""
+    if bsdiff4 is None:
+        raise RuntimeError("bsdiff4 не установлен: pip install bsdiff4")
+    return bsdiff4.diff(old, new)
+
+
+def _offtin(b: bytes, i: int) -> int:
+    # 64 бита, знак в старшем бите последнего байта (не дополнительный код)
+    v = struct.unpack_from("<Q", b, i)[0]
+    return -(v & 0x7FFFFFFFFFFFFFFF) if v & 0x8000000000000000 else v
+
+
+def _add_bytes(a: bytes, b: bytes) -> bytes:
+    """Побайтовое (a[i] + b[i]) & 0xFF без цикла по байтам: SWAR на длинных int."""
+    n = len(a)
+    if not n:
+        return b""
+    m = _masks.get(n)
+    if m is None:
+        m = (int.from_bytes(b"\x7f" * n, "little"), int.from_bytes(b"\x80" * n, "little"))
+        if n == _ADD_CHUNK or len(_masks) < 8:
+            _masks[n] = m
+    lo, hi = m
+    x = int.from_bytes(a, "little")
+    y = int.from_bytes(b, "little")
+    # младшие 7 бит складываются без переноса в соседний байт, старший — через xor
+    r = ((x & lo) + (y & lo)) ^ ((x ^ y) & hi)
+    return r.to_bytes(n, "little")
+
+
+def _header(p: bytes) -> Tuple[int, int, int]:
+    """(len_control, len_diff, len_new) из заголовка BSDIFF40."""
+    if len(p) < _HEADER or p[:8] != MAGIC:
+        raise ValueError("bspatch: bad header")
+    len_control = _offtin(p, 8)
+    len_diff = _offtin(p, 16)
+    len_new = _offtin(p, 24)
+    if len_control < 0 or len_diff < 0 or len_new < 0:
+        raise ValueError("bspatch: corrupt header")
+    return len_control, len_diff, len_new
+
+
+def new_size(p: bytes) -> int:
+    """Размер результата по заголовку патча — до распаковки чего-либо."""
+    return _header(p)[2]
+
+
+def _bz2_bounded(data: bytes, limit: int) -> bytes:
+    """bz2 с ограничением вывода: блок больше limit — порча или бомба, а не патч."""
+    d = bz2.BZ2Decompressor()
+    out = d.decompress(data, max_length=limit + 1)
+    if len(out) > limit:
+        raise ValueError("bspatch: block larger than the result")
+    if not d.eof:
+        raise ValueError("bspatch: truncated bz2 block")
+    return out
+
+
+def _read_patch(p: bytes) -> Tuple[int, List[Tuple[int, int, int]], bytes, bytes]:
+    len_control, len_diff, len_new = _header(p)
+    pos = _HEADER
+    # diff и extra не длиннее результата; в control на каждую тройку 24 байта,
+    # и троек не больше, чем байтов результата (+1 на завершающую)
+    control = _bz2_bounded(p[pos:pos + len_control], 24 * (len_new + 1))
+    pos += len_control
+    diff_block = _bz2_bounded(p[pos:pos + len_diff], len_new)
+    pos += len_diff
+    extra = _bz2_bounded(p[pos:], len_new)
+    if len(control) % 24:
+        raise ValueError("bspatch: corrupt control block")
+    triples = [(_offtin(control, i), _offtin(control, i + 8), _offtin(control, i + 16))
+               for i in range(0, len(control), 24)]
+    return len_new, triples, diff_block, extra
+
+
+def _patch_py(old: bytes, p: bytes) -> bytes:
+    len_new, triples, diff_block, extra = _read_patch(p)
+    out = bytearray()
+    old_pos = diff_pos = extra_pos = 0
+    for add_len, copy_len, seek in triples:
+        if add_len < 0 or copy_len < 0 or len(out) + add_len + copy_len > len_new:
+            raise ValueError("bspatch: corrupt control data")
+        if diff_pos + add_len > len(diff_block) or extra_pos + copy_len > len(extra):
+            raise ValueError("bspatch: truncated patch")
+        # diff-байты прибавляются к old; за границами old считается нулями
+        done = 0
+        while done < add_len:
+            n = min(_ADD_CHUNK, add_len - done)
+            d = diff_block[diff_pos + done:diff_pos + done + n]
+            o0 = old_pos + done
+            if 0 <= o0 and o0 + n <= len(old):
+                o = old[o0:o0 + n]
+            else:
+                o = bytes(old[j] if 0 <= j < len(old) else 0 for j in range(o0, o0 + n))
+            out += _add_bytes(o, d)
+            done += n
+        diff_pos += add_len
+        old_pos += add_len
+        out += extra[extra_pos:extra_pos + copy_len]
+        extra_pos += copy_len
+        old_pos += seek
+    if len(out) != len_new:
+        raise ValueError("bspatch: size mismatch")
+    return bytes(out)
+
+
+def patch(old: bytes, p: bytes, expected_size: Optional[int] = None) -> bytes:
+    """
+    Применить BSDIFF40-патч к old. С bsdiff4 — в C, иначе на чистом Python.
+    expected_size — известный размер результата (из манифеста): патч с другим
+    размером в заголовке отвергается до распаковки.
+    """
+    if expected_size is not None and new_size(p) != expected_size:
+        raise ValueError(f"bspatch: result size {new_size(p)} != {expected_size}")
+    if bsdiff4 is not None:
+        return bsdiff4.patch(old, p)
+    return _patch_py(old, p)
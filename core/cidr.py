@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import os
+import socket
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Пустой --ipset winws считает «любой адрес», поэтому вместо пустого файла
+# пишется один адрес из TEST-NET-3 (RFC 5737), который в сети не встречается.
+NONE_MARKER = "203.0.113.113/32"
+
+# разрядность -> семейство сокетов
+_FAMILIES = {32: socket.AF_INET, 128: socket.AF_INET6}
+
+# интервалы одного семейства: отсортированные начала и концы [lo, hi)
+_Ranges = Tuple[List[int], List[int]]
+
+
+def _parse_addr(s: str) -> Tuple[int, int]:
+    """Адрес -> (разрядность, число). ValueError, если это не IPv4/IPv6."""
+    bits = 128 if ":" in s else 32
+    try:
+        return bits, int.from_bytes(socket.inet_pton(_FAMILIES[bits], s), "big")
+    except (OSError, ValueError) as e:
+        raise ValueError(f"bad address {s!r}") from e
+
+
+def parse_entry(line: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Строка списка -> (разрядность, lo, hi) с hi не включительно; None для
+    пустой строки или комментария. Понимает адрес, адрес/префикс (биты хоста
+    обнуляются, как это делает winws) и диапазон адрес1-адрес2.
+    """
+    s = line.split("#", 1)[0].strip()
+    if not s:
+        return None
+    if "-" in s:
+        a, _, b = s.partition("-")
+        bits, lo = _parse_addr(a.strip())
+        bits2, hi = _parse_addr(b.strip())
+        if bits2 != bits or hi < lo:
+            raise ValueError(f"bad range {s!r}")
+        return bits, lo, hi + 1
+    addr, slash, plen = s.partition("/")
+    bits, n = _parse_addr(addr)
+    if not slash:
+        return bits, n, n + 1
+    if not plen.isdigit() or int(plen) > bits:
+        raise ValueError(f"bad prefix {s!r}")
+    host = bits - int(plen)
+    lo = n >> host << host
+    return bits, lo, lo + (1 << host)
+
+
+def _merge(pairs: List[Tuple[int, int]]) -> _Ranges:
+    """Отсортировать и слить пересекающиеся и соседние интервалы."""
+    pairs.sort()
+    starts: List[int] = []
+    ends: List[int] = []
+    for lo, hi in pairs:
+        if ends and lo <= ends[-1]:
+            if hi > ends[-1]:
+                ends[-1] = hi
+        else:
+            starts.append(lo)
+            ends.append(hi)
+    return starts, ends
+
+
+def _subtract(a: _Ranges, b: _Ranges) -> _Ranges:
+    """a минус b одним проходом по обоим массивам."""
+    b_starts, b_ends = b
+    nb = len(b_starts)
+    starts: List[int] = []
+    ends: List[int] = []
+    j = 0
+    for lo, hi in zip(*a):
+        while j < nb and b_ends[j] <= lo:
+            j += 1
+        k = j
+        while k < nb and b_starts[k] < hi:
+            if b_starts[k] > lo:
+                starts.append(lo)
+                ends.append(b_starts[k])
+            lo = max(lo, b_ends[k])
+            if lo >= hi:
+                break
+            k += 1
+        if lo < hi:
+            starts.append(lo)
+            ends.append(hi)
+    return starts, ends
+
+
+def _cover(lo: int, hi: int, bits: int) -> Iterator[Tuple[int, int]]:
+    """Минимальный набор префиксов (адрес, длина), покрывающий ровно [lo, hi)."""
+    while lo < hi:
+        size = lo & -lo if lo else 1 << bits
+        while size > hi - lo:
+            size >>= 1
+        yield lo, bits - size.bit_length() + 1
+        lo += size
+
+
+class CidrSet:
+    """
+    Множество IPv4/IPv6-адресов как отсортированные массивы непересекающихся
+    интервалов. Дубли, вложенные и соседние подсети схлопываются при
+    построении; вычитание и поиск адреса — проход или бинарный поиск по
+    массивам, без развёртывания в отдельные подсети.
+    """
+
+    __slots__ = ("_ranges", "entries", "invalid")
+
+    def __init__(self, ranges: Optional[Dict[int, _Ranges]] = None):
+        self._ranges: Dict[int, _Ranges] = ranges or {}
+        # сколько строк прочитано и сколько из них не разобрано (from_lines)
+        self.entries = 0
+        self.invalid = 0
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "CidrSet":
+        pairs: Dict[int, List[Tuple[int, int]]] = {32: [], 128: []}
+        entries = invalid = 0
+        for line in lines:
+            try:
+                e = parse_entry(line)
+            except ValueError:
+                invalid += 1
+                continue
+            if e is None:
+                continue
+            entries += 1
+            pairs[e[0]].append((e[1], e[2]))
+        s = cls({bits: _merge(p) for bits, p in pairs.items() if p})
+        s.entries = entries
+        s.invalid = invalid
+        return s
+
+    @classmethod
+    def from_file(cls, path: str) -> "CidrSet":
+        with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+            return cls.from_lines(f)
+
+    def __bool__(self) -> bool:
+        return any(r[0] for r in self._ranges.values())
+
+    def __len__(self) -> int:
+        """Число непересекающихся интервалов."""
+        return sum(len(r[0]) for r in self._ranges.values())
+
+    def __contains__(self, addr: str) -> bool:
+        try:
+            bits, n = _parse_addr(addr.strip())
+        except ValueError:
+            return False
+        r = self._ranges.get(bits)
+        if not r:
+            return False
+        i = bisect_right(r[0], n) - 1
+        return i >= 0 and n < r[1][i]
+
+    def union(self, other: "CidrSet") -> "CidrSet":
+        out: Dict[int, _Ranges] = {}
+        for bits in set(self._ranges) | set(other._ranges):
+            a = self._ranges.get(bits, ([], []))
+            b = other._ranges.get(bits, ([], []))
+            out[bits] = _merge(list(zip(*a)) + list(zip(*b)))
+        return CidrSet(out)
+
+    def subtract(self, other: "CidrSet") -> "CidrSet":
+        out: Dict[int, _Ranges] = {}
+        for bits, a in self._ranges.items():
+            b = other._ranges.get(bits)
+            out[bits] = _subtract(a, b) if b else (list(a[0]), list(a[1]))
+        return CidrSet(out)
+
+    __or__ = union
+    __sub__ = subtract
+
+    def cidrs(self) -> Iterator[str]:
+        """Минимальное покрытие префиксами: сначала IPv4, затем IPv6, по возрастанию."""
+        for bits in sorted(self._ranges):
+            af = _FAMILIES[bits]
+            nbytes = bits // 8
+            for lo, hi in zip(*self._ranges[bits]):
+                for addr, plen in _cover(lo, hi, bits):
+                    yield f"{socket.inet_ntop(af, addr.to_bytes(nbytes, 'big'))}/{plen}"
+
+    def write(self, path: str, none_marker: bool = True) -> int:
+        """
+        Записать покрытие в файл для --ipset (атомарно). Пустое множество
+        записывается как NONE_MARKER, а с none_marker=False — пустым файлом
+        («любой адрес», как режим any в service.bat). Возвращает число
+        записанных подсетей.
+        """
+        lines = list(self.cidrs()) or ([NONE_MARKER] if none_marker else [])
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            if lines:
+                f.write("\n".join(lines))
+                f.write("\n")
+        os.replace(tmp, path)
+        return len(lines)
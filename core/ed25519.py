@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import os
+import hashlib
+from typing import List, Optional, Tuple
+
+# С пакетом cryptography подпись и проверка идут через OpenSSL; без него —
+# чистый Python ниже (RFC 8032), проверка одной подписи — единицы миллисекунд.
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+except ImportError:
+    Ed25519PrivateKey = None
+    Ed25519PublicKey = None
+    InvalidSignature = None
+
+KEY_SIZE = 32
+SIG_SIZE = 64
+
+_P = 2 ** 255 - 19
+_L = 2 ** 252 + 27742317777372353535851937790883648493
+_D = -121665 * pow(121666, _P - 2, _P) % _P
+_SQRT_M1 = pow(2, (_P - 1) // 4, _P)
+
+# точка в расширенных координатах (X, Y, Z, T), x = X/Z, y = Y/Z, x*y = T/Z
+_Point = Tuple[int, int, int, int]
+
+_BY = 4 * pow(5, _P - 2, _P) % _P
+_IDENT: _Point = (0, 1, 1, 0)
+
+# 2^i * B для i = 0..255: умножение на базовую точку — только сложения
+_base_table: List[_Point] = []
+
+
+def _add(p: _Point, q: _Point) -> _Point:
+    x1, y1, z1, t1 = p
+    x2, y2, z2, t2 = q
+    a = (y1 - x1) * (y2 - x2) % _P
+    b = (y1 + x1) * (y2 + x2) % _P
+    c = 2 * t1 * t2 * _D % _P
+    d = 2 * z1 * z2 % _P
+    e, f, g, h = b - a, d - c, d + c, b + a
+    return e * f % _P, g * h % _P, f * g % _P, e * h % _P
+
+
+def _double(p: _Point) -> _Point:
+    x1, y1, z1, _ = p
+    a = x1 * x1 % _P
+    b = y1 * y1 % _P
+    c = 2 * z1 * z1 % _P
+    h = a + b
+    e = h - (x1 + y1) * (x1 + y1)
+    g = a - b
+    f = c + g
+    return e * f % _P, g * h % _P, f * g % _P, e * h % _P
+
+
+def _mul(s: int, p: _Point) -> _Point:
+    q = _IDENT
+    while s:
+        if s & 1:
+            q = _add(q, p)
+        p = _double(p)
+        s >>= 1
+    return q
+
+
+def _recover_x(y: int, sign: int) -> Optional[int]:
+    if y >= _P:
+        return None
+    x2 = (y * y - 1) * pow(_D * y * y + 1, _P - 2, _P) % _P
+    if x2 == 0:
+        return None if sign else 0
+    x = pow(x2, (_P + 3) // 8, _P)
+    if (x * x - x2) % _P:
+        x = x * _SQRT_M1 % _P
+    if (x * x - x2) % _P:
+        return None
+    if (x & 1) != sign:
+        x = _P - x
+    return x
+
+
+def _base_mul(s: int) -> _Point:
+    if not _base_table:
+        p: _Point = (_recover_x(_BY, 0), _BY, 1, _recover_x(_BY, 0) * _BY % _P)
+        for _ in range(256):
+            _base_table.append(p)
+            p = _double(p)
+    q = _IDENT
+    i = 0
+    while s:
+        if s & 1:
+            q = _add(q, _base_table[i])
+        s >>= 1
+        i += 1
+    return q
+
+
+def _encode(p: _Point) -> bytes:
+    x, y, z, _ = p
+    zi = pow(z, _P - 2, _P)
+    x, y = x * zi % _P, y * zi % _P
+    return (y | (x & 1) << 255).to_bytes(32, "little")
+
+
+def _decode(b: bytes) -> Optional[_Point]:
+    if len(b) != 32:
+        return None
+    v = int.from_bytes(b, "little")
+    y = v & ((1 << 255) - 1)
+    x = _recover_x(y, v >> 255)
+    if x is None:
+        return None
+    return x, y, 1, x * y % _P
+
+
+def _h(*parts: bytes) -> int:
+    return int.from_bytes(hashlib.sha512(b"".join(parts)).digest(), "little")
+
+
+def _expand(seed: bytes) -> Tuple[int, bytes]:
+    h = hashlib.sha512(seed).digest()
+    a = int.from_bytes(h[:32], "little")
+    a &= (1 << 254) - 8
+    a |= 1 << 254
+    return a, h[32:]
+
+
+def generate_seed() -> bytes:
+    """Новый закрытый ключ (32 байта seed по RFC 8032)."""
+    return os.urandom(KEY_SIZE)
+
+
+def public_key(seed: bytes) -> bytes:
+    if len(seed) != KEY_SIZE:
+        raise ValueError("ed25519: seed must be 32 bytes")
+    if Ed25519PrivateKey is not None:
+        from cryptography.hazmat.primitives import serialization
+        return Ed25519PrivateKey.from_private_bytes(seed).public_key().public_bytes(
+            serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return _encode(_base_mul(_expand(seed)[0]))
+
+
+def sign(seed: bytes, msg: bytes) -> bytes:
+    if len(seed) != KEY_SIZE:
+        raise ValueError("ed25519: seed must be 32 bytes")
+    if Ed25519PrivateKey is not None:
+        return Ed25519PrivateKey.from_private_bytes(seed).sign(msg)
+    a, prefix = _expand(seed)
+    pub = _encode(_base_mul(a))
+    r = _h(prefix, msg) % _L
+    rs = _encode(_base_mul(r))
+    s = (r + _h(rs, pub, msg) * a) % _L
+    return rs + s.to_bytes(32, "little")
+
+
+def verify(pub: bytes, msg: bytes, sig: bytes) -> bool:
+    """Проверить подпись sig сообщения msg открытым ключом pub."""
+    if len(pub) != KEY_SIZE or len(sig) != SIG_SIZE:
+        return False
+    if Ed25519PublicKey is not None:
+        try:
+            Ed25519PublicKey.from_public_bytes(pub).verify(sig, msg)
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+    a = _decode(pub)
+    r = _decode(sig[:32])
+    s = int.from_bytes(sig[32:], "little")
+    if a is None or r is None or s >= _L:
+        return False
+    k = _h(sig[:32], pub, msg) % _L
+    # [s]B == R + [k]A; сравниваем в проективных координатах без инверсии
+    sb = _base_mul(s)
+    rka = _add(r, _mul(k, a))
+    return (sb[0] * rka[2] - rka[0] * sb[2]) % _P == 0 and (sb[1] * rka[2] - rka[1] * sb[2]) % _P == 0
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+HASH_CACHE_NAME = "mvz_hash_cache.json"
+
+# Формат файла кэша. Увеличивать при смене алгоритма или структуры записи.
+HASH_CACHE_FORMAT = 1
+
+HASH_CHUNK = 1024 * 1024
+
+# Файл, изменённый меньше чем за столько до хеширования, в кэш не попадает:
+# повторная запись в пределах гранулярности mtime (до 2 с на FAT) не изменила бы
+# ключ, и кэш отдал бы старый хеш («racily clean», как у git).
+RACY_WINDOW_NS = 2_000_000_000
+
+# hashlib отпускает GIL на блоках больше 2 КБ, поэтому потоки читают и
+# хешируют файлы действительно параллельно; больше 8 SSD уже не ускоряет.
+DEFAULT_HASH_WORKERS = min(8, os.cpu_count() or 4)
+
+# (size, mtime_ns, inode/file-id)
+FileKey = Tuple[int, int, int]
+
+# (сколько готово, сколько всего, путь)
+FileCb = Callable[[int, int, str], None]
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_key(st: os.stat_result) -> FileKey:
+    # st_ino на Windows — file index NTFS, поэтому замена файла другим
+    # с тем же размером и mtime (copy2, распаковка) тоже меняет ключ
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class HashCache:
+    """
+    Постоянный кэш sha256 файлов: путь -> (size, mtime_ns, inode, sha256).
+    Хеш берётся из кэша, пока stat() файла даёт тот же ключ; иначе файл
+    перечитывается. save() сохраняет только записи, запрошенные с момента
+    загрузки, — так из кэша уходят удалённые и больше не нужные файлы.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self._entries: Dict[str, Tuple[FileKey, str]] = {}
+        self._used: Set[str] = set()
+        self._loaded = False
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _norm(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _load(self) -> None:
+        self._loaded = True
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("format") != HASH_CACHE_FORMAT:
+            return
+        for path, e in (data.get("files") or {}).items():
+            try:
+                self._entries[path] = ((int(e[0]), int(e[1]), int(e[2])), str(e[3]))
+            except (TypeError, ValueError, IndexError):
+                continue
+
+    def lookup(self, path: str, st: Optional[os.stat_result] = None) -> Optional[str]:
+        """sha256 из кэша, если файл не менялся; None — нужно хешировать."""
+        if not self._loaded:
+            self._load()
+        key = self._norm(path)
+        if st is None:
+            st = os.stat(path)
+        e = self._entries.get(key)
+        self._used.add(key)
+        if e is not None and e[0] == file_key(st):
+            self.hits += 1
+            return e[1]
+        return None
+
+    def store(self, path: str, st: os.stat_result, sha: str) -> None:
+        key = self._norm(path)
+        self._used.add(key)
+        if time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (file_key(st), sha)
+        self._dirty = True
+
+    def sha256(self, path: str) -> str:
+        """sha256 одного файла (hex, нижний регистр) — из кэша или чтением файла."""
+        st = os.stat(path)
+        sha = self.lookup(path, st)
+        if sha is not None:
+            return sha
+        self.misses += 1
+        sha = sha256_file(path).lower()
+        self.store(path, st, sha)
+        return sha
+
+    def save(self) -> None:
+        if not self._loaded:
+            return
+        if not self._dirty and self._used.issuperset(self._entries):
+            return
+        self._entries = {p: e for p, e in self._entries.items() if p in self._used}
+        data = {
+            "format": HASH_CACHE_FORMAT,
+            "files": {p: [k[0], k[1], k[2], sha] for p, (k, sha) in self._entries.items()},
+        }
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self._dirty = False
+
+
+def hash_files(
+        paths: Sequence[str], workers: Optional[int] = None, cache: Optional[HashCache] = None,
+        missing_ok: bool = False, on_file: Optional[FileCb] = None,
+) -> List[Optional[str]]:
+    """
+    sha256 списка файлов пулом потоков. Результат — в порядке paths,
+    независимо от порядка завершения. С cache сначала идёт stat()-проход
+    по кэшу, в пул попадают только промахи. missing_ok=True — вместо
+    исключения для нечитаемого файла в результате None.
+    workers=1 — последовательно, без пула.
+    """
+    workers = DEFAULT_HASH_WORKERS if workers is None else max(1, int(workers))
+    out: List[Optional[str]] = [None] * len(paths)
+    stats: Dict[int, os.stat_result] = {}
+    todo: List[int] = []
+
+    for i, path in enumerate(paths):
+        try:
+            st = os.stat(path)
+        except OSError:
+            if not missing_ok:
+                raise
+            continue
+        sha = cache.lookup(path, st) if cache is not None else None
+        if sha is not None:
+            out[i] = sha
+        else:
+            stats[i] = st
+            todo.append(i)
+
+    def one(i: int) -> Optional[str]:
+        try:
+            return sha256_file(paths[i]).lower()
+        except OSError:
+            if not missing_ok:
+                raise
+            return None
+
+    done = len(paths) - len(todo)
+    if workers == 1 or len(todo) < 2:
+        results = map(one, todo)
+        pool = None
+    else:
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(todo)), thread_name_prefix="mvz-hash")
+        # крупные файлы вперёд, чтобы в конце не ждать один большой хвост
+        order = sorted(todo, key=lambda i: stats[i].st_size, reverse=True)
+        futures = {i: pool.submit(one, i) for i in order}
+        results = (futures[i].result() for i in todo)
+    try:
+        for i, sha in zip(todo, results):
+            out[i] = sha
+            done += 1
+            if cache is not None:
+                cache.misses += 1
+                if sha is not None:
+                    cache.store(paths[i], stats[i], sha)
+            if on_file:
+                on_file(done, len(paths), paths[i])
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return out
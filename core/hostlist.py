@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Пустой --hostlist winws считает «любой домен», поэтому вместо пустого файла
+# пишется зарезервированное имя, которое никогда не резолвится.
+NONE_MARKER = "domain.example.abc"
+
+# ^домен в списке winws — только сам домен, без поддоменов
+EXACT_PREFIX = "^"
+
+_LABEL_RE = re.compile(r"^[a-z0-9_](?:[a-z0-9_-]*[a-z0-9_])?$")
+
+# служебные ключи узла; метки доменов пустыми не бывают, а "^" в них не встречается
+_END = ""
+_EXACT = "^"
+
+
+def normalize(line: str) -> Optional[Tuple[str, bool]]:
+    """
+    Строка списка -> (домен, только_точно); None для пустой строки или
+    комментария. ValueError — строка не похожа на домен.
+    """
+    s = line.split("#", 1)[0].strip().lower()
+    if not s:
+        return None
+    exact = s.startswith(EXACT_PREFIX)
+    if exact:
+        s = s[1:]
+    s = s.rstrip(".")
+    if not s or not all(_LABEL_RE.match(label) for label in s.split(".")):
+        raise ValueError(f"bad domain {line.strip()!r}")
+    return s, exact
+
+
+class HostTrie:
+    """
+    Список доменов как дерево по меткам в обратном порядке
+    (com -> ggpht -> yt3). Запись покрывает свой домен и все поддомены,
+    как в winws, поэтому при добавлении родителя поддерево отбрасывается,
+    а поддомен уже покрытого домена не добавляется вовсе. Поиск —
+    проход по меткам имени, независимо от размера списка.
+    """
+
+    __slots__ = ("_root", "entries", "invalid", "redundant")
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+        # прочитано записей, из них не разобрано и лишних (from_lines)
+        self.entries = 0
+        self.invalid = 0
+        self.redundant = 0
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "HostTrie":
+        t = cls()
+        for line in lines:
+            try:
+                e = normalize(line)
+            except ValueError:
+                t.invalid += 1
+                continue
+            if e is None:
+                continue
+            t.entries += 1
+            t.add(*e)
+        # дубли и поддомены, покрытые родителем — добавленным и до, и после них
+        t.redundant = t.entries - len(t)
+        return t
+
+    @classmethod
+    def from_file(cls, path: str) -> "HostTrie":
+        with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+            return cls.from_lines(f)
+
+    def add(self, domain: str, exact: bool = False) -> bool:
+        """Добавить домен; False, если он уже покрыт списком."""
+        labels = domain.split(".")
+        node = self._root
+        for label in reversed(labels[1:]):
+            node = node.setdefault(label, {})
+            if _END in node:
+                return False
+        leaf = node.get(labels[0])
+        if leaf is not None and _END in leaf:
+            return False
+        if exact:
+            if leaf is not None and _EXACT in leaf:
+                return False
+            node.setdefault(labels[0], {})[_EXACT] = True
+        else:
+            node[labels[0]] = {_END: True}
+        return True
+
+    def covering(self, name: str) -> Optional[str]:
+        """Запись списка, под которую попадает name, или None."""
+        labels = name.lower().rstrip(".").split(".")
+        node = self._root
+        n = len(labels)
+        for i in range(n - 1, -1, -1):
+            node = node.get(labels[i])
+            if node is None:
+                return None
+            if _END in node:
+                return ".".join(labels[i:])
+        return EXACT_PREFIX + ".".join(labels) if _EXACT in node else None
+
+    def __contains__(self, name: str) -> bool:
+        return self.covering(name) is not None
+
+    def __bool__(self) -> bool:
+        return bool(self._root)
+
+    def items(self) -> Iterator[Tuple[str, bool]]:
+        """Минимальный список (домен, только_точно) в порядке дерева: по зонам."""
+        stack: List[Tuple[dict, Tuple[str, ...]]] = [(self._root, ())]
+        while stack:
+            node, path = stack.pop()
+            if path:
+                name = ".".join(reversed(path))
+                if _END in node:
+                    yield name, False
+                    continue
+                if _EXACT in node:
+                    yield name, True
+            for label in sorted((k for k in node if k not in (_END, _EXACT)), reverse=True):
+                stack.append((node[label], path + (label,)))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.items())
+
+    def lines(self) -> Iterator[str]:
+        for name, exact in self.items():
+            yield EXACT_PREFIX + name if exact else name
+
+
+def write_lines(path: str, lines: List[str], none_marker: bool = True) -> int:
+    """
+    Записать список для --hostlist (атомарно). Пустой — как NONE_MARKER,
+    а с none_marker=False — пустым файлом (для winws это «любой домен»).
+    """
+    lines = lines or ([NONE_MARKER] if none_marker else [])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        if lines:
+            f.write("\n".join(lines))
+            f.write("\n")
+    os.replace(tmp, path)
+    return len(lines)
+
+
+def subtract(include: HostTrie, exclude: HostTrie) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Записи include, которые ещё что-то значат при exclude, и конфликты —
+    (запись include, покрывающая её запись exclude). Запись, целиком
+    попавшая под исключение, winws всё равно не применит. Исключение
+    внутри включённого домена (google.com и mail.google.com) — не конфликт.
+    """
+    keep: List[str] = []
+    conflicts: List[Tuple[str, str]] = []
+    for name, exact in include.items():
+        by = exclude.covering(name)
+        if by is not None and (exact or not by.startswith(EXACT_PREFIX)):
+            conflicts.append((EXACT_PREFIX + name if exact else name, by))
+            continue
+        keep.append(EXACT_PREFIX + name if exact else name)
+    return keep, conflicts
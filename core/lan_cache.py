@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import shutil
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from core.hashing import HASH_CACHE_NAME, HashCache
+from core.object_store import OBJECTS_DIR_NAME, ObjectStore
+
+# TCP — HTTP-раздача, UDP — ответы на поиск; один номер, чтобы открыть в брандмауэре одно правило
+LAN_PORT = 8765
+
+DISCOVER_MAGIC = b"MVZ-DISCOVER 1"
+REPLY_MAGIC = b"MVZ-CACHE 1"
+
+# манифест установленной версии и его подпись — в хранилище объектов
+RELEASE_DIR_NAME = "release"
+
+_SHA_RE = re.compile(r"^[0-9a-f]{64}$")
+_LIST_NAME_RE = re.compile(r"^[A-Za-z0-9._-]+\.txt$")
+_CHUNK = 256 * 1024
+
+
+def release_dir(app_dir: str) -> str:
+    return os.path.join(app_dir, OBJECTS_DIR_NAME, RELEASE_DIR_NAME)
+
+
+def save_release(app_dir: str, manifest_path: str, sig_path: Optional[str] = None) -> None:
+    """Запомнить манифест (и подпись) установленной версии — их раздаёт LanCacheServer."""
+    d = release_dir(app_dir)
+    os.makedirs(d, exist_ok=True)
+    name = "manifest.json"
+    for src, dst in ((manifest_path, name), (sig_path, name + ".sig")):
+        path = os.path.join(d, dst)
+        if src and os.path.isfile(src):
+            shutil.copyfile(src, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        elif dst.endswith(".sig"):
+            # подпись от прошлой версии к новому манифесту не подходит
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class LanCache:
+    """
+    Что может отдать эта установка: манифест установленной версии, объекты
+    по sha256 (из хранилища или установленные файлы этой версии, если они
+    не изменены) и списки из lists/. Проверка sha256 — через HashCache
+    по stat(), так что повторные запросы не перечитывают файлы.
+    """
+
+    def __init__(self, app_dir: str, lists_dir: Optional[str] = None):
+        self.app_dir = app_dir
+        self.lists_dir = lists_dir or os.path.join(app_dir, "lists")
+        self.store = ObjectStore(os.path.join(app_dir, OBJECTS_DIR_NAME))
+        # только чтение: кэш апдейтера не перезаписываем
+        self.hashes = HashCache(os.path.join(app_dir, HASH_CACHE_NAME))
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[str]] = {}
+        self._index_mtime = 0
+        self.served = 0
+        self.served_bytes = 0
+
+    # ---------- release ----------
+    def release_file(self, name: str) -> Optional[str]:
+        if name not in ("manifest.json", "manifest.json.sig"):
+            return None
+        p = os.path.join(release_dir(self.app_dir), name)
+        return p if os.path.isfile(p) else None
+
+    def version(self) -> str:
+        p = self.release_file("manifest.json")
+        if not p:
+            return ""
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                return str(json.load(f).get("version") or "")
+        except (OSError, ValueError, AttributeError):
+            return ""
+
+    def _load_index(self) -> None:
+        p = self.release_file("manifest.json")
+        try:
+            mtime = os.stat(p).st_mtime_ns if p else 0
+        except OSError:
+            mtime = 0
+        if mtime == self._index_mtime:
+            return
+        self._index_mtime = mtime
+        self._index = {}
+        if not p:
+            return
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                files = json.load(f).get("files") or []
+        except (OSError, ValueError, AttributeError):
+            return
+        for it in files:
+            if isinstance(it, dict) and isinstance(it.get("path"), str) and isinstance(it.get("sha256"), str):
+                rel = it["path"].replace("\\", "/").lstrip("/")
+                if ".." in rel.split("/"):
+                    continue
+                self._index.setdefault(it["sha256"].lower(), []).append(rel)
+
+    # ---------- objects ----------
+    def object_file(self, sha: str) -> Optional[str]:
+        """Путь к файлу с содержимым sha (проверенным) или None."""
+        sha = sha.lower()
+        if not _SHA_RE.match(sha):
+            return None
+        with self._lock:
+            if self.store.has(sha):
+                return self.store.object_path(sha)
+            self._load_index()
+            for rel in self._index.get(sha, ()):
+                p = os.path.join(self.app_dir, *rel.split("/"))
+                try:
+                    if os.path.isfile(p) and self.hashes.sha256(p) == sha:
+                        return p
+                except OSError:
+                    continue
+        return None
+
+    # ---------- lists ----------
+    def list_file(self, name: str) -> Optional[str]:
+        if not _LIST_NAME_RE.match(name):
+            return None
+        p = os.path.join(self.lists_dir, name)
+        return p if os.path.isfile(p) else None
+
+    def lists_index(self) -> dict:
+        out = {}
+        try:
+            names = sorted(os.listdir(self.lists_dir))
+        except OSError:
+            return out
+        with self._lock:
+            for n in names:
+                p = self.list_file(n)
+                if p:
+                    try:
+                        out[n] = {"sha256": self.hashes.sha256(p), "size": os.path.getsize(p)}
+                    except OSError:
+                        continue
+        return out
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MVZ-LanCache/1"
+    cache: LanCache
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head: bool) -> None:
+        path = self.path.split("?", 1)[0]
+        parts = [p for p in path.split("/") if p]
+        c = self.cache
+        if parts == ["lists"]:
+            body = json.dumps(c.lists_index()).encode("utf-8")
+            return self._send_bytes(body, "application/json", head)
+        f = None
+        if len(parts) == 1:
+            f = c.release_file(parts[0])
+        elif len(parts) == 2 and parts[0] == "objects":
+            f = c.object_file(parts[1])
+        elif len(parts) == 2 and parts[0] == "lists":
+            f = c.list_file(parts[1])
+        if not f:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_file(f, head)
+
+    def _send_bytes(self, body: bytes, ctype: str, head: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _send_file(self, path: str, head: bool) -> None:
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(st.st_size))
+            self.send_header("ETag", f'"{st.st_size:x}-{st.st_mtime_ns:x}"')
+            self.end_headers()
+            if head:
+                return
+            shutil.copyfileobj(f, self.wfile, _CHUNK)
+            self.cache.served += 1
+            self.cache.served_bytes += st.st_size
+
+
+class LanCacheServer:
+    """
+    Раздача LanCache по HTTP в локальной сети и ответы на UDP-поиск
+    (discover()). Всё, что отдаётся, клиент проверяет сам: манифест —
+    подписью, объекты — sha256, списки — по sha256 из /lists и построчно
+    (ui.mvz_updater.list_fetcher), поэтому сервер без авторизации.
+        GET /manifest.json, /manifest.json.sig
+        GET /objects/<sha256>
+        GET /lists            — {имя: {sha256, size}}
+        GET /lists/<имя>.txt
+    """
+
+    def __init__(self, app_dir: str, port: int = LAN_PORT, host: str = "0.0.0.0",
+                 lists_dir: Optional[str] = None):
+        self.cache = LanCache(app_dir, lists_dir)
+        self.host = host
+        self.port = port
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._udp: Optional[socket.socket] = None
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host = "127.0.0.1" if self.host in ("", "0.0.0.0") else self.host
+        return f"http://{host}:{self.port}/"
+
+    @property
+    def running(self) -> bool:
+        return self._httpd is not None
+
+    def start(self) -> None:
+        if self._httpd is not None:
+            return
+        handler = type("LanCacheHandler", (_Handler,), {"cache": self.cache})
+        httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        httpd.daemon_threads = True
+        self.port = httpd.server_address[1]
+        self._httpd = httpd
+        t = threading.Thread(target=httpd.serve_forever, name="mvz-lan-http", daemon=True)
+        t.start()
+        self._threads = [t]
+        try:
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            udp.bind((self.host, self.port))
+            udp.settimeout(0.5)
+            self._udp = udp
+            t = threading.Thread(target=self._udp_loop, name="mvz-lan-udp", daemon=True)
+            t.start()
+            self._threads.append(t)
+        except OSError:
+            # без поиска сервер всё равно доступен по адресу из настроек
+            self._udp = None
+
+    def _udp_loop(self) -> None:
+        udp = self._udp
+        while self._udp is udp and udp is not None:
+            try:
+                data, addr = udp.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if data.strip() != DISCOVER_MAGIC:
+                continue
+            reply = b"%s %d %s" % (REPLY_MAGIC, self.port, self.cache.version().encode("ascii", "ignore") or b"-")
+            try:
+                udp.sendto(reply, addr)
+            except OSError:
+                pass
+
+    def stop(self) -> None:
+        httpd, self._httpd = self._httpd, None
+        udp, self._udp = self._udp, None
+        if httpd is not None:
+            httpd.shutdown()
+            httpd.server_close()
+        if udp is not None:
+            try:
+                udp.close()
+            except OSError:
+                pass
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+
+
+def discover(timeout: float = 0.7, port: int = LAN_PORT,
+             targets: Tuple[str, ...] = ("255.255.255.255",)) -> List[Tuple[str, str]]:
+    """
+    Найти LanCacheServer в локальной сети широковещательным UDP-запросом.
+    Возвращает [(base_url, версия)] в порядке ответов — первым отвечает
+    обычно самый близкий и наименее загруженный.
+    """
+    out: List[Tuple[str, str]] = []
+    seen = set()
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for t in targets:
+            try:
+                s.sendto(DISCOVER_MAGIC, (t, port))
+            except OSError:
+                continue
+        deadline = time.monotonic() + timeout
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            s.settimeout(left)
+            try:
+                data, addr = s.recvfrom(512)
+            except (socket.timeout, OSError):
+                break
+            parts = data.split()
+            if len(parts) < 4 or b" ".join(parts[:2]) != REPLY_MAGIC or not parts[2].isdigit():
+                continue
+            url = f"http://{addr[0]}:{int(parts[2])}/"
+            if url in seen:
+                continue
+            seen.add(url)
+            ver = parts[3].decode("ascii", "ignore")
+            out.append((url, "" if ver == "-" else ver))
+    finally:
+        s.close()
+    return out
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import os
+import json
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Формат файла кэша. Увеличивать при любом изменении парсера .bat,
+# которое может дать другой argv для того же батника.
+PLAN_FORMAT = 2
+
+PLAN_CACHE_NAME = "mvz_launch_plan.json"
+
+# значения аргументов с такими расширениями считаются путями к файлам
+_FILE_EXTS = (".txt", ".bin", ".exe")
+
+ParseFn = Callable[[str], Tuple[str, List[str], str]]
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    """(mtime_ns, size) файла; (-1, -1) если файла нет."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return -1, -1
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass
+class LaunchPlan:
+    """Скомпилированный план запуска winws.exe из .bat."""
+    source: str
+    exe: str
+    args: List[str]
+    workdir: str
+    # путь -> (mtime_ns, size) на момент компиляции
+    files: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    # False, если часть путей не удалось разрешить: такой план не сохраняем,
+    # потому что при появлении файла парсер выбрал бы другой путь.
+    cacheable: bool = True
+
+    @property
+    def argv(self) -> List[str]:
+        return [self.exe] + self.args
+
+    def is_fresh(self) -> bool:
+        for path, key in self.files.items():
+            if _stat_key(path) != tuple(key):
+                return False
+        return True
+
+    def to_json(self) -> dict:
+        return {
+            "exe": self.exe,
+            "args": self.args,
+            "workdir": self.workdir,
+            "files": {p: list(k) for p, k in self.files.items()},
+        }
+
+    @classmethod
+    def from_json(cls, source: str, d: dict) -> "LaunchPlan":
+        return cls(
+            source=source,
+            exe=str(d["exe"]),
+            args=[str(a) for a in d["args"]],
+            workdir=str(d["workdir"]),
+            files={str(p): (int(k[0]), int(k[1])) for p, k in d["files"].items()},
+        )
+
+
+def _referenced_files(exe: str, args: List[str]) -> Tuple[List[str], bool]:
+    """Файлы, от которых зависит план, и флаг «все пути разрешены»."""
+    refs = [exe]
+    resolved = os.path.isabs(exe)
+    for arg in args:
+        if not arg.startswith("--") or "=" not in arg:
+            continue
+        val = arg.split("=", 1)[1]
+        if not val or val.startswith("-"):
+            continue
+        if os.path.isabs(val):
+            refs.append(val)
+        elif val.lower().endswith(_FILE_EXTS):
+            # похоже на файл, но парсер не нашёл его ни в одном из мест
+            resolved = False
+    return refs, resolved
+
+
+def compile_launch_plan(bat_path: str, parse: ParseFn) -> LaunchPlan:
+    bat_path = os.path.abspath(bat_path)
+    exe, args, workdir = parse(bat_path)
+    refs, resolved = _referenced_files(exe, args)
+
+    files: Dict[str, Tuple[int, int]] = {bat_path: _stat_key(bat_path)}
+    for p in refs:
+        files[os.path.abspath(p)] = _stat_key(p)
+
+    return LaunchPlan(
+        source=bat_path,
+        exe=exe,
+        args=list(args),
+        workdir=workdir,
+        files=files,
+        cacheable=resolved,
+    )
+
+
+class LaunchPlanCache:
+    """
+    Кэш планов запуска: в памяти + JSON рядом с приложением.
+    План переиспользуется, пока не изменился .bat или любой файл из аргументов.
+    """
+
+    def __init__(self, cache_path: str, parse: ParseFn):
+        self.cache_path = cache_path
+        self.parse = parse
+        self._plans: Dict[str, LaunchPlan] = {}
+        self._loaded = False
+
+    def _load(self) -> None:
+        self._loaded = True
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("format") != PLAN_FORMAT:
+            return
+        for src, d in (data.get("plans") or {}).items():
+            try:
+                self._plans[src] = LaunchPlan.from_json(src, d)
+            except (KeyError, TypeError, ValueError, IndexError):
+                continue
+
+    def _save(self) -> None:
+        data = {
+            "format": PLAN_FORMAT,
+            "plans": {src: p.to_json() for src, p in self._plans.items() if p.cacheable},
+        }
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def get(self, bat_path: str) -> Tuple[LaunchPlan, bool]:
+        """
+        Вернуть актуальный план для bat_path.
+        Второй элемент — True, если план взят из кэша (без парсинга).
+        """
+        bat_path = os.path.abspath(bat_path)
+        if not self._loaded:
+            self._load()
+
+        plan: Optional[LaunchPlan] = self._plans.get(bat_path)
+        if plan is not None and plan.is_fresh():
+            return plan, True
+
+        plan = compile_launch_plan(bat_path, self.parse)
+        self._plans[bat_path] = plan
+        if plan.cacheable:
+            self._save()
+        return plan, False
+
+    def invalidate(self, bat_path: Optional[str] = None) -> None:
+        if bat_path is None:
+            self._plans.clear()
+        else:
+            self._plans.pop(os.path.abspath(bat_path), None)
+        self._save()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core import hostlist
+from core.cidr import CidrSet
+from core.hostlist import HostTrie
+
+# скомпилированные списки лежат отдельно от исходных: lists/compiled/
+COMPILED_DIR_NAME = "compiled"
+INDEX_NAME = "index.json"
+
+# Увеличивать при любом изменении того, что пишется в скомпилированные файлы.
+COMPILER_FORMAT = 1
+
+_LIST_KEYS = ("--ipset", "--ipset-exclude", "--hostlist", "--hostlist-exclude")
+
+# сколько конфликтов hostlist/exclude перечислять в логе поимённо
+_MAX_CONFLICTS_SHOWN = 5
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    """(mtime_ns, size) файла; (-1, -1) если файла нет."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return -1, -1
+    return st.st_mtime_ns, st.st_size
+
+
+def _split_arg(arg: str) -> Tuple[str, str]:
+    key, _, val = arg.partition("=")
+    return key, val
+
+
+def referenced_lists(args: List[str]) -> List[str]:
+    """Пути списков (--ipset, --hostlist и их -exclude) из аргументов winws, без повторов."""
+    out: List[str] = []
+    for arg in args:
+        key, val = _split_arg(arg)
+        if val and key in _LIST_KEYS and val not in out:
+            out.append(val)
+    return out
+
+
+def _sections(args: List[str]) -> List[Tuple[int, int]]:
+    """Границы секций профилей winws, разделённых --new: [(начало, конец)]."""
+    out = []
+    start = 0
+    for i, a in enumerate(args):
+        if a == "--new":
+            out.append((start, i))
+            start = i + 1
+    out.append((start, len(args)))
+    return out
+
+
+class ListCompiler:
+    """
+    Подготовка списков перед запуском winws. Файл из --ipset каждой секции
+    заменяется скомпилированным: без дублей, с объединёнными вложенными
+    и соседними подсетями и уже вычтенными --ipset-exclude этой секции
+    (сам --ipset-exclude остаётся в аргументах — он действует и на hostlist).
+    --hostlist — без дублей, без поддоменов уже включённых доменов и без
+    записей, целиком попавших под --hostlist-exclude секции (о таких
+    конфликтах пишется в лог); --hostlist-exclude — тоже минимальный.
+    Результат переиспользуется, пока не изменился ни один исходный файл.
+    """
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.index_path = os.path.join(out_dir, INDEX_NAME)
+        self._index: Optional[Dict[str, dict]] = None
+        self._dirty = False
+
+    def _load(self) -> Dict[str, dict]:
+        if self._index is None:
+            self._index = {}
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and data.get("format") == COMPILER_FORMAT:
+                    self._index = dict(data.get("files") or {})
+            except (OSError, ValueError):
+                pass
+        return self._index
+
+    def _save(self) -> None:
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"format": COMPILER_FORMAT, "files": self._index}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        self._dirty = False
+
+    def _fresh(self, name: str, src: list) -> bool:
+        ent = self._load().get(name)
+        return (
+            isinstance(ent, dict)
+            and ent.get("src") == src
+            and tuple(ent.get("out") or ()) == _stat_key(os.path.join(self.out_dir, name))
+        )
+
+    def _compile(self, kind: str, path: str, excludes: List[str],
+                 build: Callable[[str, List[str], str], str]) -> Tuple[str, Optional[str]]:
+        """
+        Общая часть: имя результата, проверка кэша, запись индекса.
+        build(path, excludes, out) пишет out и возвращает строку для лога.
+        Возвращает (путь результата, строка для лога или None, если взят
+        готовый результат).
+        """
+        path = os.path.abspath(path)
+        excludes = [os.path.abspath(p) for p in excludes]
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        # разные наборы исключений для одного файла — разные результаты
+        tag = hashlib.sha1("\n".join([kind, path] + excludes).encode("utf-8")).hexdigest()[:8]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = f"{stem}-{tag}.txt"
+        out = os.path.join(self.out_dir, name)
+        src = [[p, *_stat_key(p)] for p in [path] + excludes]
+        if self._fresh(name, src):
+            return out, None
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        note = build(path, excludes, out)
+        self._load()[name] = {"src": src, "out": list(_stat_key(out))}
+        self._dirty = True
+        return out, note
+
+    @staticmethod
+    def _excluded_note(excludes: List[str]) -> str:
+        more = f" и ещё {len(excludes) - 1}" if len(excludes) > 1 else ""
+        return f" (без {os.path.basename(excludes[0])}{more})"
+
+    def _build_ipset(self, path: str, excludes: List[str], out: str) -> str:
+        inc = CidrSet.from_file(path)
+        exc = CidrSet()
+        for p in excludes:
+            exc = exc | CidrSet.from_file(p)
+        res = inc - exc
+        # пустой исходный ipset winws понимает как «любой адрес» (режим any
+        # в service.bat) — он остаётся пустым; маркер «ничего» — только когда
+        # непустой список целиком ушёл в исключения
+        n = res.write(out, none_marker=bool(inc.entries))
+
+        note = f"{os.path.basename(path)}: {inc.entries} записей -> {n} подсетей"
+        if exc:
+            note += self._excluded_note(excludes)
+        if not inc.entries:
+            note += ", пусто — любой адрес (any), передаётся пустым"
+        elif not res:
+            note += ", пусто — записан маркер «ничего»"
+        if inc.invalid:
+            note += f", пропущено строк с ошибкой: {inc.invalid}"
+        return note
+
+    def _build_hostlist(self, path: str, excludes: List[str], out: str) -> str:
+        inc = HostTrie.from_file(path)
+        exc = HostTrie()
+        for p in excludes:
+            for name, exact in HostTrie.from_file(p).items():
+                exc.add(name, exact)
+        keep, conflicts = hostlist.subtract(inc, exc)
+        # пустой исходный список (для winws — «любой домен») остаётся пустым;
+        # маркер — только когда исключения забрали всё из непустого
+        hostlist.write_lines(out, keep, none_marker=bool(inc.entries))
+
+        note = f"{os.path.basename(path)}: {inc.entries} доменов -> {len(keep)}"
+        if inc.redundant:
+            note += f", дублей и поддоменов уже включённых: {inc.redundant}"
+        if conflicts:
+            shown = ", ".join(f"{a} (в {b})" for a, b in conflicts[:_MAX_CONFLICTS_SHOWN])
+            rest = len(conflicts) - _MAX_CONFLICTS_SHOWN
+            names = ", ".join(os.path.basename(p) for p in excludes)
+            note += f"; целиком под исключениями из {names}, убрано: {shown}"
+            note += f" и ещё {rest}" if rest > 0 else ""
+        if not inc.entries:
+            note += ", пуст — передаётся пустым, как исходный"
+        elif not keep:
+            note += f", пусто — записан маркер {hostlist.NONE_MARKER}"
+        if inc.invalid:
+            note += f", пропущено строк с ошибкой: {inc.invalid}"
+        return note
+
+    def compile_ipset(self, path: str, excludes: List[str]) -> Tuple[str, Optional[str]]:
+        """Скомпилировать ipset path минус excludes (см. _compile)."""
+        return self._compile("ipset", path, excludes, self._build_ipset)
+
+    def compile_hostlist(self, path: str, excludes: List[str]) -> Tuple[str, Optional[str]]:
+        """Скомпилировать hostlist path без записей, которые целиком под excludes."""
+        return self._compile("hostlist", path, excludes, self._build_hostlist)
+
+    def apply(self, args: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Вернуть (аргументы со скомпилированными списками, строки для лога).
+        Список, который не удалось скомпилировать, передаётся как есть.
+        """
+        out = list(args)
+        notes: List[str] = []
+        for a, b in _sections(args):
+            pairs = [_split_arg(x) for x in args[a:b]]
+            excludes = {
+                k: [v for key, v in pairs if key == k + "-exclude" and v]
+                for k in ("--ipset", "--hostlist")
+            }
+            for i, (key, val) in enumerate(pairs, a):
+                if not val:
+                    continue
+                try:
+                    if key == "--ipset":
+                        path, note = self.compile_ipset(val, excludes[key])
+                    elif key == "--hostlist":
+                        path, note = self.compile_hostlist(val, excludes[key])
+                    elif key == "--hostlist-exclude":
+                        path, note = self.compile_hostlist(val, [])
+                    else:
+                        continue
+                except (OSError, ValueError) as e:
+                    notes.append(f"{os.path.basename(val)}: не скомпилирован ({e}), передаётся как есть")
+                    continue
+                out[i] = f"{key}={path}"
+                if note:
+                    notes.append(note)
+        if self._dirty:
+            self._save()
+        return out, notes
@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.cidr import NONE_MARKER as IPSET_NONE_MARKER, CidrSet, parse_entry
+from core.hostlist import EXACT_PREFIX, HostTrie, normalize
+
+# ETag/Last-Modified и отпечатки списков — рядом с приложением
+LIST_STATE_NAME = "mvz_list_state.json"
+
+# прежние версии списков: lists/backup/<имя>.<ГГГГММДД-ЧЧММСС-микросекунды>
+BACKUP_DIR_NAME = "backup"
+BACKUPS_KEEP = 5
+# суффикс времени; без микросекунд — копии, сделанные до их появления
+_BACKUP_STAMP = r"\d{8}-\d{6}(?:-\d{6})?"
+
+# больше — это не список, а что-то другое (страница ошибки, бинарник)
+MAX_LIST_BYTES = 32 * 1024 * 1024
+MAX_INVALID_SHARE = 0.05
+
+IPSET_URL = "https://raw.githubusercontent.com/Flowseal/zapret-discord-youtube/refs/heads/main/.service/ipset-service.txt"
+
+_CHUNK = 64 * 1024
+
+# attempt(url, sha256, stop): скачать и проверить список по адресу; sha256 — ожидаемый
+# ("" — неизвестен), stop — прервать попытку. Бросает исключение, если ответ не годится.
+ListAttempt = Callable[[str, str, threading.Event], Any]
+# fetch(src, attempt, cancel): вызвать attempt для одного или нескольких адресов списка
+# и вернуть первый успешный результат (см. ui.mvz_updater.list_fetcher)
+ListFetch = Callable[["ListSource", ListAttempt, Optional[threading.Event]], Any]
+
+
+@dataclass(frozen=True)
+class ListSource:
+    name: str   # имя файла в lists/
+    url: str
+    kind: str   # "ipset" | "hostlist"
+
+
+DEFAULT_SOURCES: Tuple[ListSource, ...] = (
+    ListSource("ipset-all.txt", IPSET_URL, "ipset"),
+)
+
+
+@dataclass
+class ListUpdate:
+    name: str
+    # not-modified — сервер ответил 304; same — скачано, но по сути то же;
+    # updated — активный список заменён; stored — обновлена копия .backup
+    # (ipset выключен переключателем в service.bat); failed — см. error
+    status: str
+    lines: int = 0
+    invalid: int = 0
+    path: str = ""
+    backup: str = ""
+    error: str = ""
+    # откуда взят список, если не с адреса из ListSource (зеркало, сосед по LAN)
+    source: str = ""
+
+    @property
+    def changed(self) -> bool:
+        """Активный список изменился — winws нужно перезапустить."""
+        return self.status == "updated"
+
+
+def normalize_line(line: str, kind: str) -> Optional[str]:
+    """
+    Строка списка в каноническом виде: без комментария, пробелов и \\r,
+    домены в нижнем регистре. None — пустая строка; ValueError — мусор.
+    """
+    if kind == "ipset":
+        s = line.split("#", 1)[0].strip()
+        if not s:
+            return None
+        parse_entry(s)
+        return s.lower()
+    e = normalize(line)
+    if e is None:
+        return None
+    return EXACT_PREFIX + e[0] if e[1] else e[0]
+
+
+def effective_digest(lines: List[str], kind: str) -> str:
+    """sha256 того, что winws реально применит: порядок, дубли и покрытые записи не важны."""
+    if kind == "ipset":
+        canon = CidrSet.from_lines(lines).cidrs()
+    else:
+        canon = HostTrie.from_lines(lines).lines()
+    h = hashlib.sha256()
+    for s in canon:
+        h.update(s.encode("ascii", "ignore") + b"\n")
+    return h.hexdigest()
+
+
+def _read_lines(path: str) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+def ipset_mode(path: str) -> str:
+    """Режим ipset, как его понимает service.bat: any (пусто), none (маркер), loaded."""
+    lines = [s for s in (x.strip() for x in _read_lines(path)) if s]
+    if not lines:
+        return "any"
+    if lines == [IPSET_NONE_MARKER]:
+        return "none"
+    return "loaded"
+
+
+def list_backups(lists_dir: str, name: str) -> List[str]:
+    """
+    Сохранённые версии списка, от новых к старым. Только <имя>.<время>:
+    копии ipset-all.txt.backup (ipset-all.txt.backup.<время>) — другой список.
+    """
+    d = os.path.join(lists_dir, BACKUP_DIR_NAME)
+    pattern = re.compile(re.escape(name) + r"\." + _BACKUP_STAMP + "$")
+    try:
+        names = [n for n in os.listdir(d) if pattern.match(n)]
+    except OSError:
+        return []
+    return [os.path.join(d, n) for n in sorted(names, reverse=True)]
+
+
+def _backup(path: str, lists_dir: str, keep: int) -> str:
+    if not os.path.isfile(path):
+        return ""
+    d = os.path.join(lists_dir, BACKUP_DIR_NAME)
+    os.makedirs(d, exist_ok=True)
+    name = os.path.basename(path)
+    # микросекунды — чтобы два обновления в одну секунду не затёрли друг друга
+    ns = time.time_ns()
+    while True:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(ns // 1_000_000_000))
+        dst = os.path.join(d, f"{name}.{stamp}-{ns // 1000 % 1_000_000:06d}")
+        if not os.path.exists(dst):
+            break
+        ns += 1000
+    shutil.copy2(path, dst)
+    for old in list_backups(lists_dir, name)[keep:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return dst
+
+
+def restore_backup(lists_dir: str, name: str, backup_path: Optional[str] = None) -> str:
+    """Вернуть сохранённую версию (по умолчанию — последнюю). Возвращает её путь."""
+    if backup_path is None:
+        found = list_backups(lists_dir, name)
+        if not found:
+            raise FileNotFoundError(f"нет сохранённых версий {name}")
+        backup_path = found[0]
+    dst = os.path.join(lists_dir, name)
+    shutil.copyfile(backup_path, dst + ".tmp")
+    os.replace(dst + ".tmp", dst)
+    return backup_path
+
+
+def direct_fetch(src: ListSource, attempt: ListAttempt, cancel: Optional[threading.Event] = None) -> Any:
+    """Только адрес из ListSource."""
+    return attempt(src.url, "", cancel if cancel is not None else threading.Event())
+
+
+class ListUpdater:
+    """
+    Обновление списков из сети. Ответ пишется во временный файл потоком:
+    каждая строка проверяется и нормализуется на лету, мусор отбрасывается,
+    обрыв и «не список» (много мусора) отменяют обновление — рабочий файл
+    не трогается. Подмена — os.replace после сохранения прежней версии
+    в lists/backup/. Повторный запрос условный (ETag/Last-Modified),
+    и список считается изменившимся, только если изменилось то, что
+    применит winws, а не порядок строк или комментарии. fetch решает,
+    с каких адресов качать (по умолчанию — только из ListSource); проверка
+    одна и та же, откуда бы ни пришёл ответ.
+    """
+
+    def __init__(self, lists_dir: str, state_path: str, user_agent: str = "MVZ-Lists",
+                 timeout: int = 30, keep: int = BACKUPS_KEEP, fetch: Optional[ListFetch] = None):
+        self.lists_dir = lists_dir
+        self.state_path = state_path
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.keep = keep
+        self.fetch: ListFetch = fetch or direct_fetch
+
+    def _load_state(self) -> Dict[str, dict]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, dict]) -> None:
+        tmp = self.state_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.state_path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _download(self, src: ListSource, url: str, tmp: str, st: dict, conditional: bool,
+                  expected_sha256: str, stop: threading.Event) -> Optional[Tuple[List[str], int]]:
+        """Скачать url и проверить в tmp. None — 304. Возвращает (строки, отброшено)."""
+        headers = {"User-Agent": self.user_agent}
+        if conditional and st.get("etag"):
+            headers["If-None-Match"] = st["etag"]
+        if conditional and st.get("last_modified"):
+            headers["If-Modified-Since"] = st["last_modified"]
+        req = urllib.request.Request(url, headers=headers)
+        try:
+            resp = urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+
+        lines: List[str] = []
+        invalid = 0
+        got = 0
+        h = hashlib.sha256()
+        with resp, open(tmp, "w", encoding="utf-8", newline="\n") as out:
+            total = int(resp.headers.get("Content-Length") or 0)
+            pending = b""
+
+            def take(raw: bytes) -> None:
+                nonlocal invalid
+                try:
+                    s = normalize_line(raw.decode("utf-8").lstrip("\ufeff"), src.kind)
+                except (UnicodeDecodeError, ValueError):
+                    invalid += 1
+                    return
+                if s is not None:
+                    lines.append(s)
+                    out.write(s + "\n")
+
+            while True:
+                if stop.is_set():
+                    raise RuntimeError("отменено")
+                chunk = resp.read(_CHUNK)
+                if not chunk:
+                    break
+                got += len(chunk)
+                if got > MAX_LIST_BYTES:
+                    raise ValueError(f"больше {MAX_LIST_BYTES // (1024 * 1024)} МБ — не похоже на список")
+                h.update(chunk)
+                pending += chunk
+                *full, pending = pending.split(b"\n")
+                for raw in full:
+                    take(raw)
+            if pending:
+                take(pending)
+            if total and got != total:
+                raise ValueError(f"обрыв загрузки: {got} из {total} байт")
+            new_st = {
+                "etag": resp.headers.get("ETag") or "",
+                "last_modified": resp.headers.get("Last-Modified") or "",
+            }
+
+        if expected_sha256 and h.hexdigest() != expected_sha256.lower().strip():
+            raise ValueError(f"sha256 не совпал ({h.hexdigest()})")
+        if not lines:
+            raise ValueError("в ответе нет ни одной записи")
+        if invalid > MAX_INVALID_SHARE * (len(lines) + invalid):
+            raise ValueError(f"{invalid} строк из {len(lines) + invalid} — не {src.kind}")
+        if src.kind == "ipset" and lines == [IPSET_NONE_MARKER]:
+            # у источника ipset выключен переключателем service.bat — это не список
+            raise ValueError("вместо списка маркер «ipset выключен»")
+        st.update(new_st)
+        return lines, invalid
+
+    def update(self, src: ListSource, state: Dict[str, dict],
+               cancel: Optional[threading.Event] = None) -> ListUpdate:
+        path = os.path.join(self.lists_dir, src.name)
+        target = path
+        if src.kind == "ipset" and os.path.isfile(path) and ipset_mode(path) != "loaded":
+            # ipset выключен (none/any) — обновляем то, что вернёт переключатель service.bat
+            target = path + ".backup"
+        st = dict(state.get(src.url) or {})
+        # условный запрос — только если есть что сравнивать с ответом 304
+        conditional = os.path.isfile(target) and st.get("target") == target
+
+        os.makedirs(self.lists_dir, exist_ok=True)
+
+        def attempt(url: str, sha256: str, stop: threading.Event):
+            # у каждого адреса свой .part: параллельные попытки не пишут в один файл
+            tmp = f"{target}.{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}.part"
+            # ETag/Last-Modified — от адреса из ListSource, зеркалам их не шлём
+            own = url == src.url
+            url_st = dict(st)
+            try:
+                got = self._download(src, url, tmp, url_st, conditional and own, sha256, stop)
+                if got is not None and stop.is_set():
+                    raise RuntimeError("отменено")
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            return url, tmp, got, url_st
+
+        url, tmp, got, url_st = self.fetch(src, attempt, cancel)
+        if got is None:
+            return ListUpdate(src.name, "not-modified", path=target)
+        lines, invalid = got
+        if url == src.url:
+            st = url_st
+        else:
+            # взято с зеркала/соседа: следующий запрос к основному адресу — без условий,
+            # иначе 304 оставит копию зеркала, даже если она старее
+            st.pop("etag", None)
+            st.pop("last_modified", None)
+        source = "" if url == src.url else url
+
+        digest = effective_digest(lines, src.kind)
+        st["target"] = target
+        st["sha256"] = digest
+        state[src.url] = st
+        if os.path.isfile(target) and effective_digest(_read_lines(target), src.kind) == digest:
+            os.remove(tmp)
+            return ListUpdate(src.name, "same", len(lines), invalid, target, source=source)
+
+        backup = _backup(target, self.lists_dir, self.keep)
+        os.replace(tmp, target)
+        status = "updated" if target == path else "stored"
+        return ListUpdate(src.name, status, len(lines), invalid, target, backup, source=source)
+
+    def update_all(self, sources: Tuple[ListSource, ...] = DEFAULT_SOURCES,
+                   cancel: Optional[threading.Event] = None,
+                   on_result: Optional[Callable[[ListUpdate], None]] = None) -> List[ListUpdate]:
+        """Обновить все списки; ошибка одного не мешает остальным."""
+        state = self._load_state()
+        out: List[ListUpdate] = []
+        for src in sources:
+            try:
+                res = self.update(src, state, cancel)
+            except Exception as e:
+                res = ListUpdate(src.name, "failed", error=str(e))
+            out.append(res)
+            if on_result:
+                on_result(res)
+        self._save_state(state)
+        return out
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import ctypes
+import select
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Qt нужен только для сигнальной обёртки; ListWatcher работает и без него
+try:
+    from PySide6.QtCore import QObject, Signal
+except ImportError:
+    QObject = None
+    Signal = None
+
+# сколько ждать тишины после последнего изменения: редакторы пишут файл в несколько приёмов
+DEBOUNCE = 1.0
+POLL_INTERVAL = 2.0
+
+ChangeCb = Callable[[List[str]], None]
+_Snapshot = Dict[str, Tuple[int, int]]
+
+
+def snapshot(directory: str, suffix: str = ".txt") -> _Snapshot:
+    """{имя: (mtime_ns, size)} для файлов *suffix в папке (без подпапок)."""
+    out: _Snapshot = {}
+    try:
+        with os.scandir(directory) as it:
+            for e in it:
+                if e.name.lower().endswith(suffix) and e.is_file():
+                    st = e.stat()
+                    out[e.name] = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        pass
+    return out
+
+
+class _PollBackend:
+    """Опрос stat() — когда системные уведомления недоступны."""
+    name = "poll"
+
+    def __init__(self, directory: str, suffix: str):
+        self.directory = directory
+        self.suffix = suffix
+        self._snap = snapshot(directory, suffix)
+        self._closed = threading.Event()
+
+    def wait(self, timeout: float) -> bool:
+        if self._closed.wait(min(timeout, POLL_INTERVAL)):
+            return False
+        snap = snapshot(self.directory, self.suffix)
+        changed = snap != self._snap
+        self._snap = snap
+        return changed
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class _WinBackend:
+    """
+    FindFirstChangeNotification: то же ядерное уведомление, что и у
+    ReadDirectoryChangesW, но ожидание с таймаутом — поток можно остановить
+    без отмены блокирующего ввода-вывода. Имена не нужны: что изменилось,
+    решает сравнение снимков.
+    """
+    name = "win32"
+
+    _FILTER = 0x1 | 0x8 | 0x10  # FILE_NAME | SIZE | LAST_WRITE
+    _WAIT_OBJECT_0 = 0
+    _INVALID = ctypes.c_void_p(-1).value
+
+    def __init__(self, directory: str, suffix: str):
+        k32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        k32.FindFirstChangeNotificationW.restype = ctypes.c_void_p
+        k32.FindFirstChangeNotificationW.argtypes = [ctypes.c_wchar_p, ctypes.c_int, ctypes.c_uint32]
+        k32.FindNextChangeNotification.argtypes = [ctypes.c_void_p]
+        k32.FindCloseChangeNotification.argtypes = [ctypes.c_void_p]
+        k32.WaitForSingleObject.argtypes = [ctypes.c_void_p, ctypes.c_uint32]
+        k32.WaitForSingleObject.restype = ctypes.c_uint32
+        self._k32 = k32
+        h = k32.FindFirstChangeNotificationW(directory, 0, self._FILTER)
+        if not h or h == self._INVALID:
+            raise OSError(ctypes.get_last_error(), "FindFirstChangeNotification failed", directory)
+        self._h = h
+        self._lock = threading.Lock()
+
+    def wait(self, timeout: float) -> bool:
+        with self._lock:
+            if self._h is None:
+                return False
+            r = self._k32.WaitForSingleObject(self._h, int(timeout * 1000))
+            if r != self._WAIT_OBJECT_0:
+                return False
+            self._k32.FindNextChangeNotification(self._h)
+            return True
+
+    def close(self) -> None:
+        with self._lock:
+            h, self._h = self._h, None
+        if h is not None:
+            self._k32.FindCloseChangeNotification(h)
+
+
+class _InotifyBackend:
+    name = "inotify"
+
+    # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _MASK = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+
+    def __init__(self, directory: str, suffix: str):
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, os.fsencode(directory), self._MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, "inotify_add_watch failed", directory)
+        self._fd: Optional[int] = fd
+
+    def wait(self, timeout: float) -> bool:
+        fd = self._fd
+        if fd is None:
+            return False
+        try:
+            ready, _, _ = select.select([fd], [], [], timeout)
+            if not ready:
+                return False
+            while os.read(fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def close(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def _open_backend(directory: str, suffix: str):
+    kinds = []
+    if os.name == "nt":
+        kinds.append(_WinBackend)
+    elif sys.platform.startswith("linux"):
+        kinds.append(_InotifyBackend)
+    for kind in kinds:
+        try:
+            return kind(directory, suffix)
+        except (OSError, AttributeError):
+            continue
+    return _PollBackend(directory, suffix)
+
+
+class ListWatcher:
+    """
+    Следит за lists/*.txt и вызывает on_change(имена) из своего потока,
+    когда файлы перестали меняться на debounce секунд. Уведомления
+    системы (ReadDirectoryChanges/inotify) только будят поток; изменилось
+    ли что-то на самом деле — по снимку (mtime, size), так что временные
+    файлы, подпапки и запись того же содержимого без изменения размера
+    и времени не вызывают перезагрузку.
+    """
+
+    def __init__(self, directory: str, on_change: ChangeCb, debounce: float = DEBOUNCE,
+                 suffix: str = ".txt"):
+        self.directory = directory
+        self.on_change = on_change
+        self.debounce = debounce
+        self.suffix = suffix
+        self._backend = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def backend(self) -> str:
+        return self._backend.name if self._backend is not None else ""
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._backend = _open_backend(self.directory, self.suffix)
+        self._thread = threading.Thread(target=self._run, name="mvz-list-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        backend, self._backend = self._backend, None
+        if backend is not None:
+            backend.close()
+        if self._thread is not None:
+            self._thread.join(timeout=POLL_INTERVAL + 1)
+        self._thread = None
+
+    def _run(self) -> None:
+        backend = self._backend
+        snap = snapshot(self.directory, self.suffix)
+        while not self._stop.is_set() and backend is not None:
+            if not backend.wait(0.5):
+                continue
+            # дребезг: ждём, пока изменения не прекратятся на debounce секунд
+            quiet_from = time.monotonic()
+            while not self._stop.is_set():
+                if backend.wait(self.debounce):
+                    quiet_from = time.monotonic()
+                elif time.monotonic() - quiet_from >= self.debounce:
+                    break
+            if self._stop.is_set():
+                break
+            new = snapshot(self.directory, self.suffix)
+            changed = sorted(n for n in set(snap) | set(new) if snap.get(n) != new.get(n))
+            snap = new
+            if changed:
+                try:
+                    self.on_change(changed)
+                except Exception:
+                    pass
+
+
+if QObject is not None:
+    class QtListWatcher(QObject):
+        """ListWatcher с Qt-сигналом (доставляется в GUI-поток очередью)."""
+
+        changed = Signal(list)
+
+        def __init__(self, directory: str, debounce: float = DEBOUNCE, parent=None):
+            super().__init__(parent)
+            self.core = ListWatcher(directory, self.changed.emit, debounce)
+
+        @property
+        def backend(self) -> str:
+            return self.core.backend
+
+        @property
+        def running(self) -> bool:
+            return self.core.running
+
+        def start(self) -> None:
+            self.core.start()
+
+        def stop(self) -> None:
+            self.core.stop()
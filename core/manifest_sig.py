@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import json
+from typing import Iterable
+
+from core import ed25519
+
+# подпись лежит рядом с манифестом отдельным ассетом: manifest.json.sig
+SIG_SUFFIX = ".sig"
+
+
+def make_signature(seed: bytes, data: bytes) -> str:
+    """Текст файла подписи для байтов манифеста data."""
+    return json.dumps({
+        "alg": "ed25519",
+        "key": ed25519.public_key(seed).hex(),
+        "sig": ed25519.sign(seed, data).hex(),
+    }, indent=1) + "\n"
+
+
+def check_signature(data: bytes, sig_text: str, trusted_keys: Iterable[str]) -> str:
+    """
+    Проверить подпись байтов манифеста. Возвращает открытый ключ (hex),
+    которым она сделана; ValueError — подпись битая, чужая или не сходится.
+    """
+    try:
+        s = json.loads(sig_text)
+        key = bytes.fromhex(s["key"])
+        sig = bytes.fromhex(s["sig"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"manifest signature: unreadable ({e})") from e
+    if s.get("alg") != "ed25519":
+        raise ValueError(f"manifest signature: unsupported alg {s.get('alg')!r}")
+    if key.hex() not in {k.lower() for k in trusted_keys}:
+        raise ValueError(f"manifest signature: untrusted key {key.hex()[:16]}…")
+    if not ed25519.verify(key, data, sig):
+        raise ValueError("manifest signature: verification failed")
+    return key.hex()
@@ -0,0 +1,378 @@
+"""
+Какая секция --new из батника сработает для домена/IP и почему.
+
+    python -m core.match_query "general (ALT11).bat" youtube.com
+    python -m core.match_query "general (ALT11).bat" https://discord.com 1.2.3.4
+    python -m core.match_query "general (ALT11).bat" "discord.gg udp 50010 stun"
+    python -m core.match_query "general (ALT11).bat" --file queries.txt
+
+Запрос — токены в любом порядке: домен или URL, IP, порт, tcp/udp,
+протокол для --filter-l7 (quic, stun, discord…). По умолчанию tcp/443.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.bat_parser import parse_bat_variables_and_command
+from core.cidr import NONE_MARKER as IPSET_NONE_MARKER, CidrSet, parse_entry
+from core.hostlist import HostTrie, normalize
+
+# имена для --filter-l7 в winws
+L7_NAMES = ("http", "tls", "quic", "wireguard", "dht", "discord", "stun", "xmpp", "dns", "mtproto", "unknown")
+
+_SCHEME_PORTS = {"http": 80, "https": 443}
+
+# интервалы портов [lo, hi] включительно
+_Ports = List[Tuple[int, int]]
+
+
+def parse_ports(spec: str) -> _Ports:
+    """"80,443,50000-50100" -> [(80, 80), (443, 443), (50000, 50100)]."""
+    out: _Ports = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        out.append((int(lo), int(hi or lo)))
+    return out
+
+
+def _port_in(port: int, ports: _Ports) -> bool:
+    return any(lo <= port <= hi for lo, hi in ports)
+
+
+def _load(path: str, kind: str, cache: Dict[str, object], files: Dict[str, Tuple[int, int]]):
+    """HostTrie/CidrSet из файла; один файл из нескольких секций читается один раз."""
+    key = kind + ":" + path
+    if key not in cache:
+        try:
+            st = os.stat(path)
+            files[path] = (st.st_mtime_ns, st.st_size)
+            cache[key] = HostTrie.from_file(path) if kind == "host" else CidrSet.from_file(path)
+        except OSError:
+            # winws с таким списком не запустится; в индексе — пустой, секция — в Section.missing
+            files[path] = (-1, -1)
+            cache[key] = HostTrie() if kind == "host" else CidrSet()
+    return cache[key]
+
+
+@dataclass
+class Query:
+    host: str = ""
+    ip: str = ""
+    port: int = 443
+    proto: str = "tcp"
+    l7: str = ""
+
+    @classmethod
+    def parse(cls, text: str) -> "Query":
+        """Разобрать строку запроса; ValueError — непонятный токен."""
+        q = cls()
+        port_set = False
+        for tok in text.replace(",", " ").split():
+            low = tok.lower()
+            if "://" in low:
+                u = urlsplit(low)
+                q.host = u.hostname or ""
+                if not port_set:
+                    q.port = u.port or _SCHEME_PORTS.get(u.scheme, q.port)
+                continue
+            if low in ("tcp", "udp"):
+                q.proto = low
+                continue
+            if low in L7_NAMES:
+                q.l7 = low
+                continue
+            if low.isdigit():
+                q.port = int(low)
+                port_set = True
+                continue
+            try:
+                e = parse_entry(low)
+            except ValueError:
+                e = None
+            if e is not None and e[2] - e[1] == 1:
+                q.ip = low
+                continue
+            host, _, port = low.rpartition(":")
+            if host and port.isdigit() and ":" not in host:
+                q.port = int(port)
+                port_set = True
+                low = host
+            try:
+                n = normalize(low)
+            except ValueError:
+                raise ValueError(f"непонятно: {tok!r}") from None
+            if n is not None:
+                q.host = n[0]
+        if not q.host and not q.ip:
+            raise ValueError("нужен домен или IP")
+        return q
+
+    def __str__(self) -> str:
+        target = " ".join(x for x in (self.host, self.ip) if x)
+        return f"{target} {self.proto}/{self.port}" + (f" {self.l7}" if self.l7 else "")
+
+
+@dataclass
+class Section:
+    """Одна секция --new: фильтры и загруженные списки."""
+    index: int
+    tcp: Optional[_Ports] = None
+    udp: Optional[_Ports] = None
+    l7: Tuple[str, ...] = ()
+    # (имя для объяснения, список)
+    hosts: List[Tuple[str, HostTrie]] = field(default_factory=list)
+    hosts_exclude: List[Tuple[str, HostTrie]] = field(default_factory=list)
+    ipsets: List[Tuple[str, CidrSet]] = field(default_factory=list)
+    ipsets_exclude: List[Tuple[str, CidrSet]] = field(default_factory=list)
+    # списки секции, которых нет на диске
+    missing: List[str] = field(default_factory=list)
+    desync: str = ""
+
+    def summary(self) -> str:
+        parts = []
+        if self.tcp is not None:
+            parts.append("tcp " + ",".join(f"{a}-{b}" if a != b else str(a) for a, b in self.tcp))
+        if self.udp is not None:
+            parts.append("udp " + ",".join(f"{a}-{b}" if a != b else str(a) for a, b in self.udp))
+        if self.l7:
+            parts.append("l7 " + ",".join(self.l7))
+        parts += [n for n, _ in self.hosts] + [n for n, _ in self.ipsets]
+        if self.desync:
+            parts.append(self.desync)
+        return f"#{self.index}: " + (" · ".join(parts) or "без фильтров")
+
+
+@dataclass
+class Match:
+    """Ответ: секция, которая сработает, и условные секции перед ней."""
+    query: Query
+    section: Optional[Section]
+    reason: str
+    # (секция, при каком условии сработала бы раньше)
+    maybe: List[Tuple[Section, str]] = field(default_factory=list)
+    # (секция, почему пропущена) — для подробного объяснения
+    skipped: List[Tuple[int, str]] = field(default_factory=list)
+
+    def describe(self, verbose: bool = False) -> str:
+        lines = []
+        for sec, cond in self.maybe:
+            lines.append(f"  если {cond}: {sec.summary()}")
+        if self.section is not None:
+            lines.insert(0, f"{self.query} -> {self.section.summary()}\n  {self.reason}")
+        else:
+            lines.insert(0, f"{self.query} -> ни одна секция, winws не трогает трафик\n  {self.reason}")
+        if verbose:
+            lines += [f"  #{i}: {why}" for i, why in self.skipped]
+        return "\n".join(lines)
+
+
+class MatchIndex:
+    """
+    Профиль winws (аргументы из разобранного батника) с загруженными
+    списками: домены — HostTrie, адреса — CidrSet (бинарный поиск по
+    отсортированным интервалам). Секции проверяются по порядку, как в
+    winws: первая подошедшая и применяется.
+    """
+
+    def __init__(self, args: List[str]):
+        self.wf_tcp: Optional[_Ports] = None
+        self.wf_udp: Optional[_Ports] = None
+        self.sections: List[Section] = []
+        # путь -> (mtime_ns, size) на момент загрузки
+        self.files: Dict[str, Tuple[int, int]] = {}
+        cache: Dict[str, object] = {}
+
+        sec = Section(1)
+        for arg in args:
+            if arg == "--new":
+                self.sections.append(sec)
+                sec = Section(len(self.sections) + 1)
+                continue
+            key, _, val = arg.partition("=")
+            name = os.path.basename(val)
+            if key == "--wf-tcp":
+                self.wf_tcp = parse_ports(val)
+            elif key == "--wf-udp":
+                self.wf_udp = parse_ports(val)
+            elif key == "--filter-tcp":
+                sec.tcp = parse_ports(val)
+            elif key == "--filter-udp":
+                sec.udp = parse_ports(val)
+            elif key == "--filter-l7":
+                sec.l7 = tuple(x.strip().lower() for x in val.split(",") if x.strip())
+            elif key == "--hostlist":
+                sec.hosts.append((name, _load(val, "host", cache, self.files)))
+            elif key == "--hostlist-exclude":
+                sec.hosts_exclude.append((name, _load(val, "host", cache, self.files)))
+            elif key == "--hostlist-domains":
+                sec.hosts.append(("--hostlist-domains", HostTrie.from_lines(val.split(","))))
+            elif key == "--ipset":
+                sec.ipsets.append((name, _load(val, "ip", cache, self.files)))
+            elif key == "--ipset-exclude":
+                sec.ipsets_exclude.append((name, _load(val, "ip", cache, self.files)))
+            elif key == "--ipset-ip":
+                sec.ipsets.append(("--ipset-ip", CidrSet.from_lines(val.split(","))))
+            elif key == "--dpi-desync":
+                sec.desync = val
+            if key in ("--hostlist", "--hostlist-exclude", "--ipset", "--ipset-exclude") \
+                    and self.files.get(val) == (-1, -1):
+                sec.missing.append(name)
+        self.sections.append(sec)
+        # ipset из одного маркера «ничего» не совпадает ни с чем — отмечаем один раз
+        self._none_ipsets = {
+            id(s) for sec in self.sections for _, s in sec.ipsets
+            if len(s) == 1 and list(s.cidrs()) == [IPSET_NONE_MARKER]
+        }
+
+    @classmethod
+    def from_bat(cls, bat_path: str) -> "MatchIndex":
+        _, args, _ = parse_bat_variables_and_command(bat_path)
+        return cls(args)
+
+    @property
+    def missing(self) -> List[str]:
+        return [p for p, key in self.files.items() if key == (-1, -1)]
+
+    def is_fresh(self) -> bool:
+        for path, key in self.files.items():
+            try:
+                st = os.stat(path)
+                cur = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                cur = (-1, -1)
+            if cur != key:
+                return False
+        return True
+
+    def _check(self, sec: Section, q: Query) -> Tuple[Optional[str], List[str], str]:
+        """(почему не подходит или None, неизвестные условия, почему подходит)."""
+        if sec.missing:
+            # пустым такой список не считается: это не any, а ошибка запуска winws
+            return f"нет файла {', '.join(sec.missing)}", [], ""
+        ports = sec.tcp if q.proto == "tcp" else sec.udp
+        if sec.tcp is not None or sec.udp is not None:
+            if ports is None:
+                return f"только {'udp' if q.proto == 'tcp' else 'tcp'}", [], ""
+            if not _port_in(q.port, ports):
+                return f"порт {q.port} не в --filter-{q.proto}", [], ""
+        unknown: List[str] = []
+        why: List[str] = [f"{q.proto}/{q.port}"]
+        if sec.l7:
+            if not q.l7:
+                unknown.append(f"протокол {'/'.join(sec.l7)}")
+            elif q.l7 not in sec.l7:
+                return f"--filter-l7={','.join(sec.l7)}, а не {q.l7}", [], ""
+            else:
+                why.append(f"l7 {q.l7}")
+        if q.host:
+            for name, t in sec.hosts_exclude:
+                by = t.covering(q.host)
+                if by:
+                    return f"{q.host} исключён: {by} в {name}", [], ""
+        if q.ip:
+            for name, s in sec.ipsets_exclude:
+                if q.ip in s:
+                    return f"{q.ip} исключён ({name})", [], ""
+        # списки секции winws объединяет, и пустое объединение — «любой» (режим any в service.bat)
+        if sec.hosts and not any(t for _, t in sec.hosts):
+            why.append(f"любой хост (any: пустой {', '.join(n for n, _ in sec.hosts)})")
+        elif sec.hosts:
+            if not q.host:
+                return "нужно имя хоста (--hostlist)", [], ""
+            hit = next(((name, t.covering(q.host)) for name, t in sec.hosts if q.host in t), None)
+            if hit is None:
+                return f"{q.host} нет в {', '.join(n for n, _ in sec.hosts)}", [], ""
+            why.append(f"{q.host} в {hit[0]} ({hit[1]})")
+        if sec.ipsets and not any(s for _, s in sec.ipsets):
+            why.append(f"любой IP (any: пустой {', '.join(n for n, _ in sec.ipsets)})")
+        elif sec.ipsets:
+            live = [(n, s) for n, s in sec.ipsets if s and id(s) not in self._none_ipsets]
+            if not live:
+                return f"{', '.join(n for n, _ in sec.ipsets)} — маркер «ничего»", [], ""
+            if not q.ip:
+                unknown.append(f"IP в {', '.join(n for n, _ in live)}")
+            else:
+                hit_ip = next((n for n, s in live if q.ip in s), None)
+                if hit_ip is None:
+                    return f"{q.ip} нет в {', '.join(n for n, _ in live)}", [], ""
+                why.append(f"{q.ip} в {hit_ip}")
+        return None, unknown, ", ".join(why)
+
+    def match(self, q: Query) -> Match:
+        wf = self.wf_tcp if q.proto == "tcp" else self.wf_udp
+        if wf is not None and not _port_in(q.port, wf):
+            return Match(q, None, f"порт {q.port} не в --wf-{q.proto}: winws его не перехватывает")
+        res = Match(q, None, "ни одна секция не подошла")
+        for sec in self.sections:
+            fail, unknown, why = self._check(sec, q)
+            if fail:
+                res.skipped.append((sec.index, fail))
+            elif unknown:
+                res.maybe.append((sec, " и ".join(unknown)))
+            else:
+                res.section = sec
+                res.reason = why
+                break
+        return res
+
+    def query(self, text: str) -> Match:
+        return self.match(Query.parse(text))
+
+
+def _iter_queries(path: str) -> Iterable[str]:
+    with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+        for line in f:
+            s = line.split("#", 1)[0].strip()
+            if s:
+                yield s
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Какая секция батника сработает для домена/IP")
+    ap.add_argument("bat", help="Батник winws, например \"general (ALT11).bat\"")
+    ap.add_argument("query", nargs="*", help="Домен/URL/IP, порт, tcp|udp, протокол l7")
+    ap.add_argument("--file", default="", help="Файл с запросами, по одному в строке")
+    ap.add_argument("-v", "--verbose", action="store_true", help="Почему пропущены остальные секции")
+    args = ap.parse_args(argv)
+
+    t = time.perf_counter()
+    index = MatchIndex.from_bat(args.bat)
+    print(f"{len(index.sections)} секций, {len(index.files)} списков, загружено за "
+          f"{(time.perf_counter() - t) * 1000:.0f} мс", file=sys.stderr)
+    for p in index.missing:
+        print(f"нет файла: {p}", file=sys.stderr)
+
+    queries = [" ".join(args.query)] if args.query else []
+    if args.file:
+        queries += list(_iter_queries(args.file))
+    if not queries:
+        ap.error("нужен запрос или --file")
+
+    bad = 0
+    t = time.perf_counter()
+    for text in queries:
+        try:
+            m = index.query(text)
+        except ValueError as e:
+            bad += 1
+            print(f"{text} -> ошибка: {e}")
+            continue
+        print(m.describe(args.verbose))
+    dt = time.perf_counter() - t
+    if len(queries) > 1:
+        print(f"{len(queries)} запросов за {dt * 1000:.1f} мс "
+              f"({dt / len(queries) * 1e6:.1f} мкс на запрос)", file=sys.stderr)
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import shutil
+from typing import Dict, Iterable, List, Optional, Set
+
+from core.hashing import HashCache
+
+OBJECTS_DIR_NAME = "mvz_objects"
+
+# сколько предыдущих версий держать для отката
+MAX_SNAPSHOTS = 2
+
+
+def _link_or_copy(src: str, dst: str) -> bool:
+    """Жёсткая ссылка src -> dst, а если ФС не умеет (FAT, другой том) — копия. True — ссылка."""
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        shutil.copy2(src, dst)
+        return False
+
+
+class ObjectStore:
+    """
+    Контентно-адресуемое хранилище рядом с приложением:
+        mvz_objects/objects/ab/abcdef...   — содержимое файла с таким sha256
+        mvz_objects/snapshots/<n>.json     — версия до обновления: путь -> sha256 (null — файла не было)
+    Объекты — жёсткие ссылки на установленные файлы, поэтому место занимают
+    только версии, которых в установке уже нет. Файл, изменённый на месте
+    (жёсткая ссылка делит содержимое), обнаруживается сверкой sha256 через
+    HashCache и из хранилища выбрасывается.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.hashes = HashCache(os.path.join(root, "hash_cache.json"))
+        self.linked = 0
+        self.copied = 0
+
+    # ---------- objects ----------
+    def object_path(self, sha: str) -> str:
+        sha = sha.lower()
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def has(self, sha: str, verify: bool = True) -> bool:
+        path = self.object_path(sha)
+        if not os.path.isfile(path):
+            return False
+        if not verify:
+            return True
+        try:
+            ok = self.hashes.sha256(path) == sha.lower()
+        except OSError:
+            ok = False
+        if not ok:
+            self._drop(path)
+        return ok
+
+    def add(self, path: str, sha: str) -> None:
+        """Положить файл (уже проверенного) содержимого sha; одинаковое содержимое хранится один раз."""
+        dst = self.object_path(sha)
+        if os.path.isfile(dst):
+            return
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = dst + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if _link_or_copy(path, tmp):
+            self.linked += 1
+        else:
+            self.copied += 1
+        os.replace(tmp, dst)
+
+    def put(self, src: str, sha: str) -> None:
+        """Перенести в хранилище уже проверенный файл src (скачанный объект); src исчезает."""
+        dst = self.object_path(sha)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.replace(src, dst)
+        except OSError:
+            shutil.move(src, dst)
+
+    def incoming_path(self, sha: str) -> str:
+        """Куда качать объект, чтобы put() был переименованием в пределах тома."""
+        d = os.path.join(self.root, "incoming")
+        os.makedirs(d, exist_ok=True)
+        return os.path.join(d, sha.lower())
+
+    def materialize(self, sha: str, dst: str) -> None:
+        """Создать dst с содержимым sha (ссылкой на объект, иначе копией); dst заменяется атомарно."""
+        src = self.object_path(sha)
+        d = os.path.dirname(dst)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = dst + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        _link_or_copy(src, tmp)
+        os.replace(tmp, dst)
+
+    def _drop(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def gc(self, keep: Iterable[str]) -> int:
+        """Удалить объекты, которых нет в keep и ни в одном снимке. Возвращает число удалённых."""
+        keep_set: Set[str] = {s.lower() for s in keep if s}
+        for snap in self.snapshots():
+            keep_set.update(s for s in snap["files"].values() if s)
+        removed = 0
+        if not os.path.isdir(self.objects_dir):
+            return 0
+        for sub in os.listdir(self.objects_dir):
+            d = os.path.join(self.objects_dir, sub)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if name not in keep_set:
+                    self._drop(os.path.join(d, name))
+                    removed += 1
+        self.hashes.save()
+        return removed
+
+    # ---------- snapshots ----------
+    def snapshots(self) -> List[dict]:
+        """Снимки от старых к новым."""
+        out = []
+        try:
+            names = sorted(
+                (n for n in os.listdir(self.snapshots_dir) if n.endswith(".json")),
+                key=lambda n: int(n[:-5]) if n[:-5].isdigit() else -1,
+            )
+        except OSError:
+            return []
+        for n in names:
+            try:
+                with open(os.path.join(self.snapshots_dir, n), "r", encoding="utf-8") as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(snap, dict) and isinstance(snap.get("files"), dict):
+                snap["id"] = n[:-5]
+                out.append(snap)
+        return out
+
+    def last_snapshot(self) -> Optional[dict]:
+        snaps = self.snapshots()
+        return snaps[-1] if snaps else None
+
+    def save_snapshot(self, version: str, files: Dict[str, Optional[str]]) -> None:
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        snaps = self.snapshots()
+        n = int(snaps[-1]["id"]) + 1 if snaps and str(snaps[-1]["id"]).isdigit() else 1
+        data = {"version": version, "created": int(time.time()), "files": files}
+        path = os.path.join(self.snapshots_dir, f"{n}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+        for old in snaps[:max(0, len(snaps) + 1 - MAX_SNAPSHOTS)]:
+            self.drop_snapshot(old)
+
+    def drop_snapshot(self, snap: dict) -> None:
+        self._drop(os.path.join(self.snapshots_dir, f"{snap['id']}.json"))
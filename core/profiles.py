@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from core.bat_parser import parse_bat_variables_and_command
+from core.launch_plan import LaunchPlan, LaunchPlanCache, PLAN_CACHE_NAME
+from core.profiles_builtin import BUILTIN_PROFILES, Profile
+
+# профиль по умолчанию — «general (ALT11).bat», если он есть
+DEFAULT_PROFILE_ID = "alt11"
+
+# где искать general*.bat: рядом с приложением и в ZZZ/
+PROFILE_DIRS = ("", "ZZZ")
+BAT_PREFIX = "general"
+
+
+def profile_id_for_bat(path: str) -> str:
+    """«general (ALT11).bat» -> alt11, «general ALT FAKE.bat» -> alt-fake, «general.bat» -> general."""
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    if stem.startswith(BAT_PREFIX):
+        stem = stem[len(BAT_PREFIX):]
+    return re.sub(r"[^a-z0-9]+", "-", stem).strip("-") or BAT_PREFIX
+
+
+def profile_name_for_bat(path: str) -> str:
+    """Подпись для списка: текст в скобках, иначе имя файла без general и .bat."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    m = re.search(r"\(([^)]+)\)", stem)
+    if m:
+        return m.group(1).strip()
+    rest = stem[len(BAT_PREFIX):] if stem.lower().startswith(BAT_PREFIX) else stem
+    return rest.strip(" -_") or stem
+
+
+def discover_bats(base_dir: str) -> List[str]:
+    """general*.bat в PROFILE_DIRS, в порядке папок и имён."""
+    out: List[str] = []
+    for sub in PROFILE_DIRS:
+        d = os.path.join(base_dir, sub) if sub else base_dir
+        try:
+            names = sorted(n for n in os.listdir(d) if n.lower().startswith(BAT_PREFIX) and n.lower().endswith(".bat"))
+        except OSError:
+            continue
+        out.extend(os.path.join(d, n) for n in names)
+    return out
+
+
+class ProfileRegistry:
+    """
+    Все стратегии приложения: general*.bat и встроенные профили.
+    Батники ищутся и разбираются один раз в refresh() (через LaunchPlanCache:
+    между запусками план берётся из JSON), дальше выбор профиля — поиск
+    в словаре, а план перечитывается, только если изменился батник или
+    файл из его аргументов. Один батник под разными именами
+    (general (ALT11).bat и ZZZ/general-ALT11.bat) — один профиль,
+    первый найденный.
+    """
+
+    def __init__(self, base_dir: str, plans: Optional[LaunchPlanCache] = None):
+        self.base_dir = os.path.abspath(base_dir)
+        if plans is None:
+            plans = LaunchPlanCache(
+                os.path.join(self.base_dir, PLAN_CACHE_NAME),
+                lambda p: parse_bat_variables_and_command(p, app_root=self.base_dir),
+            )
+        self.plans = plans
+        self._profiles: Dict[str, Profile] = {}
+        self._builtin_plans: Dict[str, LaunchPlan] = {}
+        # id -> ошибка разбора батника при последнем refresh()
+        self.errors: Dict[str, str] = {}
+        self._scanned = False
+
+    def refresh(self) -> List[Profile]:
+        """Пересканировать папки и разобрать новые/изменённые батники."""
+        profiles: Dict[str, Profile] = {}
+        self.errors = {}
+        for path in discover_bats(self.base_dir):
+            pid = profile_id_for_bat(path)
+            if pid in profiles or pid in self.errors:
+                continue
+            try:
+                self.plans.get(path)
+            except Exception as e:
+                self.errors[pid] = f"{os.path.basename(path)}: {e}"
+                continue
+            profiles[pid] = Profile(pid, profile_name_for_bat(path), self._bat_factory(path), path)
+        for p in BUILTIN_PROFILES:
+            profiles.setdefault(p.id, p)
+        self._profiles = profiles
+        self._scanned = True
+        return self.profiles()
+
+    def _bat_factory(self, path: str):
+        def args(base_dir: str) -> List[str]:
+            # пути в плане уже разрешены парсером относительно батника и base_dir приложения
+            return list(self.plans.get(path)[0].args)
+        return args
+
+    def _ensure(self) -> None:
+        if not self._scanned:
+            self.refresh()
+
+    def profiles(self) -> List[Profile]:
+        self._ensure()
+        return list(self._profiles.values())
+
+    def __contains__(self, profile_id: str) -> bool:
+        self._ensure()
+        return profile_id in self._profiles
+
+    def get(self, profile_id: str) -> Profile:
+        self._ensure()
+        try:
+            return self._profiles[profile_id]
+        except KeyError:
+            raise KeyError(f"неизвестный профиль: {profile_id}") from None
+
+    def default_id(self) -> str:
+        """DEFAULT_PROFILE_ID, если есть, иначе первый найденный."""
+        self._ensure()
+        if DEFAULT_PROFILE_ID in self._profiles:
+            return DEFAULT_PROFILE_ID
+        return next(iter(self._profiles), "")
+
+    def plan(self, profile_id: str) -> Tuple[LaunchPlan, bool]:
+        """
+        План запуска профиля. Второй элемент — True, если план не пришлось
+        строить заново (как у LaunchPlanCache.get).
+        """
+        profile = self.get(profile_id)
+        if profile.source:
+            return self.plans.get(profile.source)
+        plan = self._builtin_plans.get(profile.id)
+        if plan is not None and plan.is_fresh():
+            return plan, True
+        exe = os.path.join(self.base_dir, "bin", "winws.exe")
+        try:
+            st = os.stat(exe)
+            key = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            key = (-1, -1)
+        plan = LaunchPlan(
+            source=f"builtin:{profile.id}",
+            exe=exe,
+            args=profile.args_factory(self.base_dir),
+            workdir=self.base_dir,
+            files={exe: key},
+        )
+        self._builtin_plans[profile.id] = plan
+        return plan, False
+
+
+_registries: Dict[str, ProfileRegistry] = {}
+
+
+def registry_for(base_dir: str) -> ProfileRegistry:
+    """Общий реестр для папки приложения (создаётся и сканируется один раз)."""
+    base_dir = os.path.abspath(base_dir)
+    reg = _registries.get(base_dir)
+    if reg is None:
+        reg = _registries[base_dir] = ProfileRegistry(base_dir)
+    return reg
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+# base_dir -> аргументы winws.exe (без самого exe)
+ArgsFactory = Callable[[str], List[str]]
+
+
+@dataclass(frozen=True)
+class Profile:
+    """Стратегия winws: встроенная или из general*.bat (source — путь к батнику)."""
+    id: str
+    name: str
+    args_factory: ArgsFactory
+    source: str = ""
+
+    @property
+    def builtin(self) -> bool:
+        return not self.source
+
+
+def _alt11_args(base_dir: str) -> List[str]:
+    """ALT11 из «general (ALT11).bat» — запасной вариант, когда батника нет."""
+    b = lambda name: os.path.join(base_dir, "bin", name)
+    ls = lambda name: os.path.join(base_dir, "lists", name)
+
+    quic = b("quic_initial_www_google_com.bin")
+    max_ru = b("tls_clienthello_max_ru.bin")
+    google = b("tls_clienthello_www_google_com.bin")
+    general = f"--hostlist={ls('list-general.txt')}"
+    exclude = f"--hostlist-exclude={ls('list-exclude.txt')}"
+    ip_exclude = f"--ipset-exclude={ls('ipset-exclude.txt')}"
+    ipset = f"--ipset={ls('ipset-all.txt')}"
+    multisplit = [
+        "--dpi-desync=fake,multisplit", "--dpi-desync-split-seqovl=654", "--dpi-desync-split-pos=1",
+        "--dpi-desync-fooling=ts", "--dpi-desync-repeats=8",
+        f"--dpi-desync-split-seqovl-pattern={max_ru}", f"--dpi-desync-fake-tls={max_ru}",
+    ]
+    fake_quic = ["--dpi-desync=fake", "--dpi-desync-repeats=11", f"--dpi-desync-fake-quic={quic}"]
+
+    sections = [
+        ["--filter-udp=443", general, exclude, ip_exclude, *fake_quic],
+        [
+            "--filter-udp=19294-19344,50000-50100", "--filter-l7=discord,stun", "--dpi-desync=fake",
+            f"--dpi-desync-fake-discord={quic}", f"--dpi-desync-fake-stun={quic}", "--dpi-desync-repeats=6",
+        ],
+        ["--filter-tcp=2053,2083,2087,2096,8443", "--hostlist-domains=discord.media", *multisplit],
+        [
+            "--filter-tcp=443", f"--hostlist={ls('list-google.txt')}", "--ip-id=zero",
+            "--dpi-desync=fake,multisplit", "--dpi-desync-split-seqovl=681", "--dpi-desync-split-pos=1",
+            "--dpi-desync-fooling=ts", "--dpi-desync-repeats=8",
+            f"--dpi-desync-split-seqovl-pattern={google}", f"--dpi-desync-fake-tls={google}",
+        ],
+        ["--filter-tcp=80,443", general, exclude, ip_exclude, *multisplit],
+        ["--filter-udp=443", ipset, exclude, ip_exclude, *fake_quic],
+        ["--filter-tcp=80,443", ipset, exclude, ip_exclude, *multisplit],
+        [
+            "--filter-udp=443", ipset, ip_exclude, "--dpi-desync=fake", "--dpi-desync-autottl=2",
+            "--dpi-desync-repeats=10", "--dpi-desync-any-protocol=1",
+            f"--dpi-desync-fake-unknown-udp={quic}", "--dpi-desync-cutoff=n2",
+        ],
+    ]
+    args = [
+        "--wf-tcp=80,443,2053,2083,2087,2096,8443",
+        "--wf-udp=443,19294-19344,50000-50100",
+    ]
+    for i, sec in enumerate(sections):
+        if i:
+            args.append("--new")
+        args.extend(sec)
+    return args
+
+
+BUILTIN_PROFILES: Tuple[Profile, ...] = (
+    Profile("builtin-alt11", "ALT11 (встроенный)", _alt11_args),
+)
+
+
+def get_profile_by_id(profile_id: str) -> Profile:
+    for p in BUILTIN_PROFILES:
+        if p.id == profile_id:
+            return p
+    raise KeyError(f"неизвестный профиль: {profile_id}")
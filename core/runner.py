@@ -5,7 +5,7 @@ import subprocess
 from subprocess import CREATE_NO_WINDOW
 from typing import Callable, Optional, List
 
-from core.profiles_builtin import get_profile_by_id
+from core.profiles import registry_for
 
 
 def _default_winws_paths(base_dir: str) -> dict:
@@ -35,7 +35,12 @@ def start_winws_profile(
             on_line(f"[MVZ] Не найден winws.exe: {exe}")
         return 1
 
-    profile = get_profile_by_id(profile_id)
+    try:
+        profile = registry_for(base_dir).get(profile_id)
+    except KeyError as e:
+        if on_line:
+            on_line(f"[MVZ] {e.args[0]}")
+        return 2
     args: List[str] = profile.args_factory(base_dir)
 
     if not args:
@@ -72,7 +77,7 @@ def spawn_winws_profile_detached(profile_id: str, base_dir: str) -> subprocess.P
     paths = _default_winws_paths(base_dir)
     exe = paths["winws"]
 
-    profile = get_profile_by_id(profile_id)
+    profile = registry_for(base_dir).get(profile_id)
     args: List[str] = profile.args_factory(base_dir)
 
     if not os.path.isfile(exe):
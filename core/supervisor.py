@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import os
+import time
+import threading
+import subprocess
+from typing import Callable, List, NamedTuple, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Qt нужен только для сигнальной обёртки; ProcessSupervisor работает и без него
+try:
+    from PySide6.QtCore import QObject, Signal
+except ImportError:
+    QObject = None
+    Signal = None
+
+CREATE_NO_WINDOW = 0x08000000
+
+# сколько байт stderr хранить для сообщения о падении
+STDERR_TAIL_BYTES = 64 * 1024
+
+# сколько новый процесс должен проработать при swap(), чтобы старый можно было остановить
+SWAP_CONFIRM = 1.5
+
+ExitCb = Callable[[int, int, bool], None]
+
+
+class SwapResult(NamedTuple):
+    pid: int
+    old_pid: Optional[int]
+    ready: float    # запуск нового -> подтверждён живым, с
+    total: float    # запуск нового -> старый остановлен, с
+
+
+class _Child:
+    def __init__(self, proc: subprocess.Popen):
+        self.proc = proc
+        self.started_at = time.monotonic()
+        self.stop_requested = False
+        self.stderr_tail = b""
+        self.thread: Optional[threading.Thread] = None
+
+
+class ProcessSupervisor:
+    """
+    Владеет Popen-хэндлом процесса (winws.exe) и узнаёт о его завершении сразу:
+    отдельный поток читает stderr до EOF и блокируется в wait().
+    on_exited(pid, returncode, expected) вызывается из этого потока;
+    expected=True, если процесс остановлен через stop() или заменён новым.
+    """
+
+    def __init__(self, on_started: Optional[Callable[[int], None]] = None,
+                 on_exited: Optional[ExitCb] = None):
+        self.on_started = on_started
+        self.on_exited = on_exited
+        self._lock = threading.Lock()
+        self._current: Optional[_Child] = None
+        self._children: List[_Child] = []
+
+    # ---------- state ----------
+    @property
+    def pid(self) -> Optional[int]:
+        ch = self._current
+        return ch.proc.pid if ch else None
+
+    @property
+    def started_at(self) -> Optional[float]:
+        """time.monotonic() момента запуска текущего процесса."""
+        ch = self._current
+        return ch.started_at if ch else None
+
+    def is_running(self) -> bool:
+        ch = self._current
+        return ch is not None and ch.proc.poll() is None
+
+    def uptime(self) -> float:
+        ch = self._current
+        if ch is None or ch.proc.poll() is not None:
+            return 0.0
+        return time.monotonic() - ch.started_at
+
+    def stderr_tail(self, pid: Optional[int] = None) -> str:
+        with self._lock:
+            for ch in self._children:
+                if pid is None or ch.proc.pid == pid:
+                    return ch.stderr_tail.decode("utf-8", errors="replace").strip()
+        return ""
+
+    # ---------- control ----------
+    def _spawn(self, argv: List[str], cwd: Optional[str]) -> _Child:
+        kwargs = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = CREATE_NO_WINDOW
+        proc = subprocess.Popen(
+            argv,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            **kwargs,
+        )
+        ch = _Child(proc)
+        with self._lock:
+            self._children.append(ch)
+        ch.thread = threading.Thread(target=self._wait, args=(ch,), name=f"winws-wait-{proc.pid}", daemon=True)
+        ch.thread.start()
+        return ch
+
+    def start(self, argv: List[str], cwd: Optional[str] = None) -> int:
+        """Запустить процесс и сделать его текущим. Возвращает pid."""
+        ch = self._spawn(argv, cwd)
+        with self._lock:
+            prev = self._current
+            if prev is not None:
+                # старый процесс больше не текущий: его выход — не падение
+                prev.stop_requested = True
+            self._current = ch
+
+        if self.on_started:
+            self.on_started(ch.proc.pid)
+        return ch.proc.pid
+
+    def swap(self, argv: List[str], cwd: Optional[str] = None, confirm: float = SWAP_CONFIRM,
+             timeout: float = 3.0) -> SwapResult:
+        """
+        Замена с перекрытием: новый процесс запускается рядом со старым,
+        и только если он прожил confirm секунд (winws падает на плохих
+        аргументах и списках сразу при старте), старый останавливается.
+        Если новый не выжил — текущим остаётся старый, RuntimeError со stderr.
+        Блокирует на время confirm — вызывать не из GUI-потока.
+        """
+        t0 = time.monotonic()
+        ch = self._spawn(argv, cwd)
+        try:
+            code = ch.proc.wait(confirm)
+        except subprocess.TimeoutExpired:
+            code = None
+        if code is not None:
+            if ch.thread is not None:
+                ch.thread.join(timeout)
+            err = ch.stderr_tail.decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"новый процесс завершился с кодом {code}" + (f": {err}" if err else ""))
+        ready = time.monotonic() - t0
+
+        with self._lock:
+            prev = self._current
+            if prev is not None:
+                prev.stop_requested = True
+            self._current = ch
+        if self.on_started:
+            self.on_started(ch.proc.pid)
+        if prev is not None:
+            self._terminate(prev, timeout)
+        return SwapResult(ch.proc.pid, prev.proc.pid if prev else None, ready, time.monotonic() - t0)
+
+    def stop(self, timeout: float = 3.0) -> None:
+        """Завершить все процессы по хэндлу (без taskkill)."""
+        with self._lock:
+            children = list(self._children)
+            self._current = None
+        for ch in children:
+            self._terminate(ch, timeout)
+
+    def stop_pid(self, pid: int, timeout: float = 3.0) -> None:
+        with self._lock:
+            children = [ch for ch in self._children if ch.proc.pid == pid]
+            if self._current is not None and self._current.proc.pid == pid:
+                self._current = None
+        for ch in children:
+            self._terminate(ch, timeout)
+
+    def _terminate(self, ch: _Child, timeout: float) -> None:
+        ch.stop_requested = True
+        proc = ch.proc
+        if proc.poll() is None:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+            try:
+                proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                try:
+                    proc.kill()
+                    proc.wait(timeout)
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+        if ch.thread is not None and ch.thread is not threading.current_thread():
+            ch.thread.join(timeout)
+
+    # ---------- worker ----------
+    def _wait(self, ch: _Child) -> None:
+        proc = ch.proc
+        tail = bytearray()
+        try:
+            if proc.stderr is not None:
+                for chunk in iter(lambda: proc.stderr.read1(4096), b""):
+                    tail += chunk
+                    if len(tail) > STDERR_TAIL_BYTES:
+                        del tail[:-STDERR_TAIL_BYTES]
+        except (OSError, ValueError):
+            pass
+        code = proc.wait()
+        try:
+            if proc.stderr is not None:
+                proc.stderr.close()
+        except OSError:
+            pass
+
+        with self._lock:
+            ch.stderr_tail = bytes(tail)
+            if self._current is ch:
+                self._current = None
+            expected = ch.stop_requested
+            # держим только последний завершившийся — ради stderr_tail()
+            self._children = [c for c in self._children if c is ch or c.proc.poll() is None]
+
+        if self.on_exited:
+            self.on_exited(proc.pid, code, expected)
+
+
+def _win_find_pids(name: str) -> List[int]:
+    """PID процессов с таким именем через снимок Toolhelp32 — без psutil и без tasklist."""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESSENTRY32W(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", wintypes.DWORD),
+            ("cntUsage", wintypes.DWORD),
+            ("th32ProcessID", wintypes.DWORD),
+            ("th32DefaultHeapID", ctypes.c_size_t),
+            ("th32ModuleID", wintypes.DWORD),
+            ("cntThreads", wintypes.DWORD),
+            ("th32ParentProcessID", wintypes.DWORD),
+            ("pcPriClassBase", ctypes.c_long),
+            ("dwFlags", wintypes.DWORD),
+            ("szExeFile", ctypes.c_wchar * 260),
+        ]
+
+    k32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    k32.CreateToolhelp32Snapshot.restype = ctypes.c_void_p
+    k32.CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+    k32.Process32FirstW.argtypes = [ctypes.c_void_p, ctypes.POINTER(PROCESSENTRY32W)]
+    k32.Process32NextW.argtypes = [ctypes.c_void_p, ctypes.POINTER(PROCESSENTRY32W)]
+    k32.CloseHandle.argtypes = [ctypes.c_void_p]
+
+    snap = k32.CreateToolhelp32Snapshot(0x2, 0)  # TH32CS_SNAPPROCESS
+    if not snap or snap == ctypes.c_void_p(-1).value:
+        raise OSError(ctypes.get_last_error(), "CreateToolhelp32Snapshot failed")
+    out: List[int] = []
+    try:
+        e = PROCESSENTRY32W()
+        e.dwSize = ctypes.sizeof(e)
+        ok = k32.Process32FirstW(snap, ctypes.byref(e))
+        while ok:
+            if e.szExeFile.lower() == name.lower():
+                out.append(int(e.th32ProcessID))
+            ok = k32.Process32NextW(snap, ctypes.byref(e))
+    finally:
+        k32.CloseHandle(snap)
+    return out
+
+
+def _win_kill_pids(pids: List[int], timeout: float) -> None:
+    """TerminateProcess по хэндлу и ожидание выхода (WinDivert освобождается после него)."""
+    import ctypes
+    from ctypes import wintypes
+
+    k32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    k32.OpenProcess.restype = ctypes.c_void_p
+    k32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    k32.TerminateProcess.argtypes = [ctypes.c_void_p, ctypes.c_uint]
+    k32.WaitForSingleObject.argtypes = [ctypes.c_void_p, wintypes.DWORD]
+    k32.CloseHandle.argtypes = [ctypes.c_void_p]
+
+    handles = []
+    for pid in pids:
+        h = k32.OpenProcess(0x0001 | 0x00100000, False, pid)  # PROCESS_TERMINATE | SYNCHRONIZE
+        if h:
+            k32.TerminateProcess(h, 1)
+            handles.append(h)
+    deadline = time.monotonic() + timeout
+    for h in handles:
+        left = max(0.0, deadline - time.monotonic())
+        k32.WaitForSingleObject(h, int(left * 1000))
+        k32.CloseHandle(h)
+
+
+def find_processes(name: str = "winws.exe") -> Optional[List[int]]:
+    """PID запущенных процессов с таким именем; None — перечислить нечем."""
+    if psutil is not None:
+        try:
+            return [p.pid for p in psutil.process_iter(["name"])
+                    if (p.info.get("name") or "").lower() == name.lower()]
+        except Exception:
+            return []
+    if os.name == "nt":
+        try:
+            return _win_find_pids(name)
+        except (OSError, AttributeError):
+            return None
+    return None
+
+
+def kill_stray_processes(name: str = "winws.exe", exclude_pids=(), timeout: float = 3.0) -> Optional[int]:
+    """
+    Завершить «чужие» экземпляры (например, оставшиеся после падения MVZ) по хэндлу:
+    через psutil, а без него на Windows — Toolhelp32 + TerminateProcess, без taskkill.
+    Возвращает число завершённых процессов или None, если перечислить процессы нечем.
+    """
+    if psutil is None:
+        pids = find_processes(name)
+        if pids is None:
+            return None
+        pids = [p for p in pids if p not in exclude_pids]
+        if pids:
+            try:
+                _win_kill_pids(pids, timeout)
+            except (OSError, AttributeError):
+                pass
+        return len(pids)
+
+    victims = []
+    try:
+        for p in psutil.process_iter(["pid", "name"]):
+            if (p.info.get("name") or "").lower() == name.lower() and p.pid not in exclude_pids:
+                victims.append(p)
+    except Exception:
+        return 0
+    for p in victims:
+        try:
+            p.kill()
+        except Exception:
+            pass
+    try:
+        psutil.wait_procs(victims, timeout=timeout)
+    except Exception:
+        pass
+    return len(victims)
+
+
+if QObject is not None:
+    class WinwsSupervisor(QObject):
+        """ProcessSupervisor с Qt-сигналами (доставляются в GUI-поток очередью)."""
+
+        started = Signal(int)
+        exited = Signal(int, int, bool)
+        # swap_async(): результат SwapResult или текст ошибки
+        swapped = Signal(object)
+        swap_failed = Signal(str)
+
+        def __init__(self, parent=None):
+            super().__init__(parent)
+            self.core = ProcessSupervisor(
+                on_started=self.started.emit,
+                on_exited=self.exited.emit,
+            )
+
+        @property
+        def pid(self) -> Optional[int]:
+            return self.core.pid
+
+        @property
+        def started_at(self) -> Optional[float]:
+            return self.core.started_at
+
+        def is_running(self) -> bool:
+            return self.core.is_running()
+
+        def uptime(self) -> float:
+            return self.core.uptime()
+
+        def stderr_tail(self, pid: Optional[int] = None) -> str:
+            return self.core.stderr_tail(pid)
+
+        def start(self, argv: List[str], cwd: Optional[str] = None) -> int:
+            return self.core.start(argv, cwd)
+
+        def stop(self, timeout: float = 3.0) -> None:
+            self.core.stop(timeout)
+
+        def stop_pid(self, pid: int, timeout: float = 3.0) -> None:
+            self.core.stop_pid(pid, timeout)
+
+        def swap_async(self, argv: List[str], cwd: Optional[str] = None, confirm: float = SWAP_CONFIRM) -> None:
+            """ProcessSupervisor.swap в отдельном потоке; итог — сигналом swapped/swap_failed."""
+            def run():
+                try:
+                    res = self.core.swap(argv, cwd, confirm)
+                except Exception as e:
+                    self.swap_failed.emit(str(e))
+                    return
+                self.swapped.emit(res)
+
+            threading.Thread(target=run, name="winws-swap", daemon=True).start()
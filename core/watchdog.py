@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Callable, Deque, Optional
+
+
+@dataclass
+class WatchdogStats:
+    restarts: int
+    crashes: int
+    # среднее время работы процесса до падения, сек (MTBF)
+    mtbf: Optional[float]
+    # среднее время от падения до успешного перезапуска, сек
+    mttr: Optional[float]
+    last_recover: Optional[float]
+    tripped: bool
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class CrashWatchdog:
+    """
+    Политика автоперезапуска: экспоненциальная задержка с потолком
+    и «предохранитель» — после max_crashes падений за window секунд
+    перезапуски прекращаются до ручного запуска (reset()).
+    """
+
+    def __init__(
+        self,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_crashes: int = 5,
+        window: float = 60.0,
+        stable_after: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_crashes = max_crashes
+        self.window = window
+        # столько секунд стабильной работы обнуляют счётчик задержки
+        self.stable_after = stable_after
+        self.clock = clock
+
+        self.restarts = 0
+        self.crashes = 0
+        self.tripped = False
+        self._consecutive = 0
+        self._recent: Deque[float] = deque()
+        self._started_at: Optional[float] = None
+        self._crashed_at: Optional[float] = None
+        self._uptime_total = 0.0
+        self._recover_total = 0.0
+        self._recovers = 0
+        self._last_recover: Optional[float] = None
+
+    def reset(self) -> None:
+        """Ручной запуск: снять предохранитель и начать отсчёт задержек заново."""
+        self.tripped = False
+        self._consecutive = 0
+        self._recent.clear()
+        self._crashed_at = None
+
+    def on_started(self) -> None:
+        now = self.clock()
+        self._started_at = now
+        if self._crashed_at is not None:
+            self._last_recover = now - self._crashed_at
+            self._recover_total += self._last_recover
+            self._recovers += 1
+            self.restarts += 1
+            self._crashed_at = None
+
+    def on_stopped(self) -> None:
+        """Штатная остановка: не падение и не повод перезапускать."""
+        self._started_at = None
+        self._crashed_at = None
+
+    def on_crash(self) -> Optional[float]:
+        """
+        Зафиксировать падение. Возвращает задержку перед перезапуском (сек)
+        или None, если сработал предохранитель.
+        """
+        now = self.clock()
+        self.crashes += 1
+        if self._crashed_at is None:
+            # повторное падение во время восстановления отсчитываем от первого
+            self._crashed_at = now
+
+        if self._started_at is not None:
+            uptime = now - self._started_at
+            self._uptime_total += uptime
+            if uptime >= self.stable_after:
+                self._consecutive = 0
+            self._started_at = None
+
+        self._recent.append(now)
+        while self._recent and now - self._recent[0] > self.window:
+            self._recent.popleft()
+        if len(self._recent) >= self.max_crashes:
+            self.tripped = True
+            return None
+
+        delay = min(self.max_delay, self.base_delay * (2 ** self._consecutive))
+        self._consecutive += 1
+        return delay
+
+    def stats(self) -> WatchdogStats:
+        return WatchdogStats(
+            restarts=self.restarts,
+            crashes=self.crashes,
+            mtbf=(self._uptime_total / self.crashes) if self.crashes else None,
+            mttr=(self._recover_total / self._recovers) if self._recovers else None,
+            last_recover=self._last_recover,
+            tripped=self.tripped,
+        )
@@ -0,0 +1,153 @@
+"""
+Микробенчмарк разбора .bat: однопроходный лексер (core.bat_parser)
+против старого цикла подстановки %VAR% + shlex.split.
+
+    python tools/bench_bat_parser.py
+    python tools/bench_bat_parser.py --sizes 1024,65536 --repeat 5
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import shlex
+import argparse
+import tempfile
+from typing import Callable, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.bat_parser import expand_vars, join_logical_lines, parse_bat_variables_and_command, split_args
+
+_HEADER = (
+    "@echo off\r\n"
+    'set "BIN=%~dp0bin\\"\r\n'
+    'set "LISTS=%~dp0lists\\"\r\n'
+    'set "PORTS=80,443,2053,2083,2087,2096,8443"\r\n'
+    'if not exist "%BIN%winws.exe" set "BIN=%~dp0"\r\n'
+    'start "Zapret" /min "%BIN%winws.exe" ^\r\n'
+    "--wf-tcp=%PORTS% --wf-udp=443,19294-19344,50000-50100 ^\r\n"
+)
+
+_SECTION = (
+    '--filter-tcp=%PORTS% --hostlist="%LISTS%list-general.txt" '
+    '--hostlist-exclude="%LISTS%list-exclude.txt" --dpi-desync=fake,multisplit '
+    '--dpi-desync-split-seqovl=654 --dpi-desync-fake-tls="%BIN%tls_clienthello_max_ru.bin" --new ^\r\n'
+)
+
+
+def make_bat(size: int) -> str:
+    parts = [_HEADER]
+    n = len(_HEADER)
+    while n < size:
+        parts.append(_SECTION)
+        n += len(_SECTION)
+    parts.append("--filter-udp=443 --dpi-desync=fake\r\n")
+    return "".join(parts)
+
+
+def legacy_lex(text: str, env: dict) -> List[List[str]]:
+    """Копия старого алгоритма из ui/main_window.py (до перехода на core.bat_parser)."""
+    lines: List[str] = []
+    buf = ""
+    for raw in text.splitlines(True):
+        s = raw.strip()
+        if not s:
+            continue
+        low = s.lower()
+        if low.startswith("rem ") or low.startswith("::") or low.startswith("@"):
+            continue
+        if s.endswith("^"):
+            buf += s[:-1] + " "
+        else:
+            buf += s
+            lines.append(buf.strip())
+            buf = ""
+    if buf:
+        lines.append(buf.strip())
+
+    out = []
+    for ln in lines:
+        resolved_ln = ln.replace("%~dp0", env["~dp0"])
+        for _ in range(10):
+            if "%" not in resolved_ln:
+                break
+            new_ln = ""
+            i = 0
+            while i < len(resolved_ln):
+                if resolved_ln[i] == "%":
+                    j = resolved_ln.find("%", i + 1)
+                    if j != -1:
+                        val = env.get(resolved_ln[i + 1: j].lower())
+                        if val is not None:
+                            new_ln += val
+                            i = j + 1
+                            continue
+                new_ln += resolved_ln[i]
+                i += 1
+            if new_ln == resolved_ln:
+                break
+            resolved_ln = new_ln
+        out.append(shlex.split(resolved_ln, posix=False))
+    return out
+
+
+def new_lex(text: str, env: dict) -> List[List[str]]:
+    return [split_args(expand_vars(ln, env)) for ln in join_logical_lines(text)]
+
+
+def _env() -> dict:
+    base = "C:\\MVZ\\"
+    return {
+        "~dp0": base,
+        "bin": base + "bin\\",
+        "lists": base + "lists\\",
+        "ports": "80,443,2053,2083,2087,2096,8443",
+    }
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1024,16384,131072,1048576", help="Размеры .bat в байтах")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--legacy-max", type=int, default=262144,
+                    help="Не запускать старый алгоритм на файлах больше этого размера")
+    args = ap.parse_args()
+
+    env = _env()
+    print(f"{'size':>10} {'new, ms':>10} {'legacy, ms':>11} {'speedup':>8} {'parse(), ms':>12}")
+
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        text = make_bat(size)
+
+        t_new = _best_of(lambda: new_lex(text, env), args.repeat)
+
+        t_old = None
+        if size <= args.legacy_max:
+            t_old = _best_of(lambda: legacy_lex(text, env), args.repeat)
+            # пути без пробелов: оба алгоритма обязаны дать один и тот же argv
+            if legacy_lex(text, env) != new_lex(text, env):
+                raise SystemExit(f"argv mismatch on {size} bytes")
+
+        with tempfile.TemporaryDirectory() as td:
+            bat = os.path.join(td, "general (bench).bat")
+            with open(bat, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            t_parse = _best_of(lambda: parse_bat_variables_and_command(bat), args.repeat)
+
+        old_s = f"{t_old * 1000:11.2f}" if t_old is not None else f"{'-':>11}"
+        speed = f"{t_old / t_new:7.1f}x" if t_old is not None and t_new > 0 else f"{'-':>8}"
+        print(f"{len(text):>10} {t_new * 1000:10.2f} {old_s} {speed} {t_parse * 1000:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Бенчмарк хеширования: последовательный sha256 против пула потоков
+core.hashing.hash_files на синтетическом дереве, похожем на _internal
+(несколько крупных Qt-DLL и сотни мелких .pyd/.dll).
+
+    python tools/bench_hashing.py
+    python tools/bench_hashing.py --scale 0.25 --workers 1,2,4,8 --dir D:\\tmp\\bench
+
+По умолчанию файлы уже в кэше ОС после генерации — меряется CPU/память;
+для «холодного» диска запускайте с --keep и сбрасывайте кэш между прогонами.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.hashing import hash_files, sha256_file
+
+# (имя, размер в МБ) — примерно как в PySide6-сборке MVZ
+_BIG = [
+    ("opengl32sw.dll", 20.0),
+    ("PySide6/Qt6Core.dll", 6.0),
+    ("PySide6/Qt6Gui.dll", 7.5),
+    ("PySide6/Qt6Widgets.dll", 5.5),
+    ("PySide6/Qt6Pdf.dll", 5.0),
+    ("PySide6/Qt6Network.dll", 1.5),
+    ("PySide6/QtCore.pyd", 3.0),
+    ("PySide6/QtGui.pyd", 2.5),
+    ("PySide6/QtWidgets.pyd", 3.5),
+    ("python311.dll", 5.5),
+    ("libcrypto-3.dll", 5.0),
+    ("base_library.zip", 1.2),
+]
+_SMALL_COUNT = 300
+_SMALL_KB = (4, 400)
+
+
+def make_tree(root: str, scale: float) -> List[Tuple[str, int]]:
+    files = [(name, int(mb * 1024 * 1024 * scale)) for name, mb in _BIG]
+    lo, hi = _SMALL_KB
+    for i in range(_SMALL_COUNT):
+        # детерминированный «случайный» размер
+        kb = lo + (i * 7919) % (hi - lo)
+        files.append((f"PySide6/plugins/mod{i:03d}.pyd", int(kb * 1024 * scale)))
+    block = os.urandom(1024 * 1024)
+    for name, size in files:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            left = size
+            while left > 0:
+                n = min(left, len(block))
+                f.write(block[:n])
+                left -= n
+    return files
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", type=float, default=1.0, help="Множитель размеров файлов")
+    ap.add_argument("--workers", default="1,2,4,8", help="Число потоков через запятую")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--dir", default="", help="Где создать дерево (по умолчанию — временная папка)")
+    ap.add_argument("--keep", action="store_true", help="Не удалять дерево после прогона")
+    args = ap.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="mvz_bench_hash_")
+    try:
+        files = make_tree(root, args.scale)
+        paths = [os.path.join(root, name) for name, _ in files]
+        total = sum(size for _, size in files)
+        print(f"{len(paths)} files, {total / 1024 / 1024:.1f} MB in {root}, {os.cpu_count()} CPUs")
+
+        def serial():
+            return [sha256_file(p) for p in paths]
+
+        ref = serial()
+        t_serial = min(_timed(serial) for _ in range(args.repeat))
+        print(f"{'mode':>12} {'time, s':>8} {'MB/s':>8} {'speedup':>8}")
+        print(f"{'serial':>12} {t_serial:8.3f} {total / 1024 / 1024 / t_serial:8.1f} {'1.00x':>8}")
+
+        for w in (int(x) for x in args.workers.split(",") if x.strip()):
+            got = hash_files(paths, workers=w)
+            if got != ref:
+                raise SystemExit(f"workers={w}: результат не совпадает с последовательным")
+            t = min(_timed(lambda: hash_files(paths, workers=w)) for _ in range(args.repeat))
+            print(f"{f'workers={w}':>12} {t:8.3f} {total / 1024 / 1024 / t:8.1f} {t_serial / t:7.2f}x")
+    finally:
+        if not args.keep and not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def _timed(fn) -> float:
+    t = time.perf_counter()
+    fn()
+    return time.perf_counter() - t
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Бенчмарк бинарных патчей: для пар файлов старой и новой сборки сравнивает
+полный файл в zip (deflate 9) с bsdiff-патчем, время построения патча
+(bsdiff4) и время применения (bsdiff4 и чистый Python из core.binpatch).
+
+    python tools/bench_patches.py --old D:\\MVZ-1.4\\_internal --new dist\\MVZ\\_internal
+    python tools/bench_patches.py            # синтетические пары вида «DLL после пересборки»
+
+Нужен пакет bsdiff4 (pip install bsdiff4).
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import zlib
+import random
+import argparse
+from pathlib import Path
+from typing import Iterator, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import binpatch
+
+
+def real_pairs(old_dir: Path, new_dir: Path, min_size: int) -> Iterator[Tuple[str, bytes, bytes]]:
+    for p in sorted(new_dir.rglob("*")):
+        if not p.is_file() or p.stat().st_size < min_size:
+            continue
+        rel = p.relative_to(new_dir).as_posix()
+        q = old_dir / rel
+        if not q.is_file():
+            continue
+        old, new = q.read_bytes(), p.read_bytes()
+        if old != new:
+            yield rel, old, new
+
+
+def synthetic_pairs(scale: float) -> Iterator[Tuple[str, bytes, bytes]]:
+    """Код DLL после пересборки: вставки/сдвиги и правка адресов по всему файлу."""
+    rnd = random.Random(42)
+    for name, mb in (("Qt6Core.dll", 6.0), ("python311.dll", 5.5), ("QtWidgets.pyd", 3.5), ("small.pyd", 0.2)):
+        size = int(mb * 1024 * 1024 * scale)
+        # не совсем случайные данные: повторяющиеся «инструкции», как в коде
+        words = [rnd.randbytes(rnd.randint(2, 12)) for _ in range(4096)]
+        buf = bytearray()
+        while len(buf) < size:
+            buf += words[rnd.randrange(len(words))]
+        old = bytes(buf[:size])
+        new = bytearray(old)
+        for _ in range(max(1, size // 200_000)):
+            j = rnd.randrange(len(new))
+            new[j:j] = rnd.randbytes(rnd.randint(16, 512))
+        for _ in range(max(1, size // 2_000)):
+            j = rnd.randrange(len(new) - 4)
+            new[j:j + 4] = (int.from_bytes(new[j:j + 4], "little") + 0x40).to_bytes(4, "little")[:4]
+        yield name, old, bytes(new)
+
+
+def _timed(fn):
+    t = time.perf_counter()
+    r = fn()
+    return r, time.perf_counter() - t
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--old", default="", help="Папка старой сборки (например, _internal)")
+    ap.add_argument("--new", default="", help="Папка новой сборки")
+    ap.add_argument("--min-size", type=int, default=64 * 1024, help="Файлы меньше — пропускать")
+    ap.add_argument("--scale", type=float, default=1.0, help="Размер синтетических файлов")
+    args = ap.parse_args()
+
+    if binpatch.bsdiff4 is None:
+        raise SystemExit("нужен bsdiff4: pip install bsdiff4")
+
+    pairs = real_pairs(Path(args.old), Path(args.new), args.min_size) if args.old and args.new \
+        else synthetic_pairs(args.scale)
+
+    print(f"{'file':<32} {'size':>10} {'deflate':>10} {'patch':>10} {'ratio':>7} "
+          f"{'diff, s':>8} {'C, ms':>7} {'py, ms':>7}")
+    tot_full = tot_patch = 0
+    for rel, old, new in pairs:
+        full = len(zlib.compress(new, 9))
+        p, t_diff = _timed(lambda: binpatch.diff(old, new))
+        out_c, t_c = _timed(lambda: binpatch.patch(old, p))
+        out_py, t_py = _timed(lambda: binpatch._patch_py(old, p))
+        if out_c != new or out_py != new:
+            raise SystemExit(f"{rel}: патч восстановил не тот файл")
+        tot_full += full
+        tot_patch += min(full, len(p))
+        print(f"{rel[-32:]:<32} {len(new):>10} {full:>10} {len(p):>10} {len(p) / full:7.1%} "
+              f"{t_diff:8.2f} {t_c * 1000:7.1f} {t_py * 1000:7.1f}")
+    if tot_full:
+        print(f"download: {tot_full} -> {tot_patch} bytes ({tot_patch / tot_full:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Бенчмарк упаковки update.zip: прежний zipfile (deflate 9, один поток)
+против tools/zip_builder — последовательно, в процессах-воркерах и с LZMA
+для .dll/.pyd/.exe. Для каждого варианта — время сборки, размер пакета
+и время распаковки с проверкой sha256 так, как это делает апдейтер.
+
+    python tools/bench_zip.py                       # синтетическое дерево, похожее на _internal
+    python tools/bench_zip.py --input dist\\MVZ      # настоящая onedir-сборка
+    python tools/bench_zip.py --jobs 4 --scale 0.5
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import random
+import hashlib
+import zipfile
+import argparse
+import tempfile
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from zip_builder import LZMA_EXTS, METHOD_NAMES, write_zip_cached
+
+# (имя, размер в МБ, вид содержимого)
+_TREE = [
+    ("PySide6/Qt6Core.dll", 6.0, "code"),
+    ("PySide6/Qt6Gui.dll", 7.5, "code"),
+    ("PySide6/Qt6Widgets.dll", 5.5, "code"),
+    ("PySide6/QtCore.pyd", 3.0, "code"),
+    ("PySide6/QtWidgets.pyd", 3.5, "code"),
+    ("python311.dll", 5.5, "code"),
+    ("libcrypto-3.dll", 5.0, "code"),
+    ("base_library.zip", 1.2, "zip"),
+    ("app.ico", 0.1, "random"),
+]
+_SMALL = 200
+
+
+def _code(rnd: random.Random, size: int) -> bytes:
+    # повторяющиеся «инструкции», как в машинном коде: сжимается примерно как DLL
+    words = [rnd.randbytes(rnd.randint(2, 12)) for _ in range(4096)]
+    buf = bytearray()
+    while len(buf) < size:
+        buf += words[rnd.randrange(len(words))]
+    return bytes(buf[:size])
+
+
+def make_tree(root: str, scale: float) -> None:
+    rnd = random.Random(7)
+    files = [(n, int(mb * 1024 * 1024 * scale), kind) for n, mb, kind in _TREE]
+    for i in range(_SMALL):
+        kb = 4 + (i * 7919) % 300
+        files.append((f"PySide6/plugins/mod{i:03d}.pyd", int(kb * 1024 * scale), "code"))
+        if i % 10 == 0:
+            files.append((f"PySide6/icons/i{i:03d}.png", int(kb * 256 * scale), "random"))
+    for name, size, kind in files:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if kind == "zip":
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+                for j in range(max(1, size // 20000)):
+                    z.writestr(f"lib/m{j}.pyc", _code(rnd, 60000))
+        else:
+            with open(path, "wb") as f:
+                f.write(_code(rnd, size) if kind == "code" else rnd.randbytes(size))
+
+
+def list_files(root: str) -> List[Tuple[str, str]]:
+    out = []
+    for d, _, names in os.walk(root):
+        for n in names:
+            p = os.path.join(d, n)
+            out.append((p, os.path.relpath(p, root).replace(os.sep, "/")))
+    out.sort(key=lambda t: t[1])
+    return out
+
+
+def zip_plain(files: List[Tuple[str, str]], out: str) -> None:
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as z:
+        for src, arc in files:
+            z.write(src, arcname=arc)
+
+
+def extract_all(path: str) -> float:
+    """Чтение и sha256 всех членов, как в extract_needed_from_zip (без записи на диск)."""
+    t = time.perf_counter()
+    with zipfile.ZipFile(path) as z:
+        for info in z.infolist():
+            h = hashlib.sha256()
+            with z.open(info) as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+    return time.perf_counter() - t
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default="", help="Папка onedir-сборки (по умолчанию — синтетическое дерево)")
+    ap.add_argument("--scale", type=float, default=1.0, help="Размер синтетического дерева")
+    ap.add_argument("--jobs", type=int, default=None, help="Процессов сжатия (по умолчанию — по числу CPU)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="mvz_bench_zip_") as tmp:
+        root = args.input
+        if not root:
+            root = os.path.join(tmp, "tree")
+            make_tree(root, args.scale)
+        files = list_files(root)
+        total = sum(os.path.getsize(p) for p, _ in files)
+        print(f"{len(files)} files, {total / 1e6:.1f} MB, jobs={args.jobs or os.cpu_count()}")
+
+        variants: List[Tuple[str, Callable[[str], object]]] = [
+            ("zipfile deflate9", lambda out: zip_plain(files, out)),
+            ("builder serial", lambda out: write_zip_cached(files, out, None, workers=1)),
+            ("builder parallel", lambda out: write_zip_cached(files, out, None, workers=args.jobs)),
+            ("parallel + lzma", lambda out: write_zip_cached(files, out, None, workers=args.jobs,
+                                                             lzma_exts=LZMA_EXTS)),
+        ]
+        print(f"{'variant':<18} {'build, s':>9} {'size, MB':>9} {'extract, s':>11}  members")
+        for i, (name, build) in enumerate(variants):
+            out = os.path.join(tmp, f"{i}.zip")
+            t = time.perf_counter()
+            counts = build(out)
+            t_build = time.perf_counter() - t
+            t_extract = extract_all(out)
+            how = ", ".join(f"{n} {METHOD_NAMES.get(m, m)}" for m, n in sorted(counts.items())) \
+                if isinstance(counts, dict) else ""
+            print(f"{name:<18} {t_build:9.2f} {os.path.getsize(out) / 1e6:9.2f} {t_extract:11.2f}  {how}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,28 @@
 from __future__ import annotations
 
 import os
+import sys
 import json
+import time
 import argparse
-import hashlib
+import tempfile
 import zipfile
 from datetime import datetime, timezone
 from pathlib import Path, PurePosixPath
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-def sha256_file(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        while True:
-            b = f.read(1024 * 1024)
-            if not b:
-                break
-            h.update(b)
-    return h.hexdigest()
+from core import binpatch, ed25519
+from core.manifest_sig import SIG_SUFFIX, make_signature
+from core.hashing import HashCache, hash_files, sha256_file
+from zip_builder import LZMA_EXTS, METHOD_NAMES, BuildCache, write_zip_cached
+
+PATCHES_DIR = "patches"
+# патч кладём в архив, только если он меньше этой доли от нового файла
+PATCH_MAX_RATIO = 0.5
+
+# время по умолчанию для --reproducible без SOURCE_DATE_EPOCH: минимум zip, 1980-01-01 UTC
+REPRODUCIBLE_EPOCH = 315532800
 
 
 def to_posix_rel(path: Path, base: Path) -> str:
@@ -26,15 +31,30 @@ def to_posix_rel(path: Path, base: Path) -> str:
     return str(rel_posix)
 
 
+# кэши, которые MVZ создаёт рядом с собой при запуске, — не часть релиза
+RUNTIME_FILES = {"mvz_launch_plan.json", "mvz_hash_cache.json", "mvz_list_state.json"}
+
+
 def should_skip(rel_posix: str, include_internal: bool) -> bool:
     p = rel_posix.lower()
 
     if p == "manifest.json" or p.endswith("/manifest.json"):
         return True
+    if p in RUNTIME_FILES:
+        return True
     if p.endswith(".log") or p.endswith(".tmp"):
         return True
     if "/__pycache__/" in f"/{p}/":
         return True
+    # недоустановленное обновление и хранилище версий, если сборку запускали
+    if p.startswith("mvz_update_stage/") or p.startswith("mvz_objects/"):
+        return True
+    # скомпилированные списки (ListCompiler): в index.json абсолютные пути этой машины
+    if p.startswith("lists/compiled/"):
+        return True
+    # прежние версии списков и недокачанные списки (ListUpdater)
+    if p.startswith("lists/backup/") or (p.startswith("lists/") and p.endswith(".part")):
+        return True
 
     if not include_internal and p.startswith("_internal/"):
         return True
@@ -75,27 +95,59 @@ def load_prev_manifest_map(prev_manifest_path: str) -> tuple[dict[str, str], set
     return mp, prev_paths
 
 
-def build_maps(base_dir: Path, include_internal: bool) -> tuple[dict[str, dict], set[str]]:
+def build_maps(base_dir: Path, include_internal: bool, jobs: int | None = None,
+               hash_cache: HashCache | None = None) -> tuple[dict[str, dict], set[str]]:
     # returns: path -> {sha256,size,abs_path}, plus set(paths)
     mp: dict[str, dict] = {}
     paths: set[str] = set()
 
-    for p, rel in iter_all_files(base_dir, include_internal=include_internal):
-        sha = sha256_file(str(p)).lower()
+    found = list(iter_all_files(base_dir, include_internal=include_internal))
+    hashes = hash_files([str(p) for p, _ in found], workers=jobs, cache=hash_cache)
+    for (p, rel), sha in zip(found, hashes):
         mp[rel] = {"sha256": sha, "size": p.stat().st_size, "abs": p}
         paths.add(rel)
 
     return mp, paths
 
 
-def write_zip(files_to_pack: list[tuple[Path, str]], out_zip: Path):
+def build_patches(prev_dir: Path, rels: list[str], new_map: dict[str, dict], work_dir: Path,
+                  jobs: int | None = None) -> dict[str, dict]:
+    # returns: rel -> {from, path (в архиве), size, abs}
+    cands = [rel for rel in rels if (prev_dir / rel).is_file()]
+    prev_shas = hash_files([str(prev_dir / rel) for rel in cands], workers=jobs)
+    patches: dict[str, dict] = {}
+    for rel, old_sha in zip(cands, prev_shas):
+        new_sha = new_map[rel]["sha256"]
+        if old_sha == new_sha:
+            continue
+        data = binpatch.diff((prev_dir / rel).read_bytes(), new_map[rel]["abs"].read_bytes())
+        if len(data) >= new_map[rel]["size"] * PATCH_MAX_RATIO:
+            continue
+        arc = f"{PATCHES_DIR}/{old_sha}-{new_sha}.bsdiff"
+        dst = work_dir / f"{old_sha}-{new_sha}.bsdiff"
+        dst.write_bytes(data)
+        patches[rel] = {"from": old_sha, "path": arc, "size": len(data), "abs": dst}
+        print(f"patch {rel}: {len(data)} / {new_map[rel]['size']} bytes")
+    return patches
+
+
+def source_date_epoch(reproducible: bool) -> int | None:
+    # https://reproducible-builds.org/specs/source-date-epoch/ — заданная переменная включает режим сама
+    env = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+    if env:
+        return max(int(env), REPRODUCIBLE_EPOCH)
+    return REPRODUCIBLE_EPOCH if reproducible else None
+
+
+def write_zip(files_to_pack: list[tuple[Path, str]], out_zip: Path, cache: BuildCache | None = None,
+              shas: dict[str, str] | None = None, jobs: int | None = None, use_lzma: bool = False,
+              epoch: int | None = None) -> dict[int, int]:
     if out_zip.exists():
         out_zip.unlink()
 
     out_zip.parent.mkdir(parents=True, exist_ok=True)
-    with zipfile.ZipFile(out_zip, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as z:
-        for abs_path, rel in files_to_pack:
-            z.write(abs_path, arcname=rel)
+    return write_zip_cached([(str(p), rel) for p, rel in files_to_pack], str(out_zip), cache, level=9, shas=shas,
+                            workers=jobs, lzma_exts=LZMA_EXTS if use_lzma else (), fixed_mtime=epoch)
 
 
 def write_manifest(
@@ -106,14 +158,20 @@ def write_manifest(
     files: list[dict],
     delete_list: list[str],
     delta: bool,
+    package_sha256: str = "",
+    package_size: int = 0,
+    epoch: int | None = None,
 ):
     files.sort(key=lambda x: x["path"])
     delete_list = sorted(delete_list)
 
+    created = datetime.fromtimestamp(epoch, timezone.utc) if epoch is not None else datetime.now(timezone.utc)
     manifest = {
         "version": version,
-        "created_utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "created_utc": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
         "package": zip_name,
+        "package_sha256": package_sha256,
+        "package_size": package_size,
         "include_internal": include_internal,
         "delta": delta,
         "files": files,
@@ -125,25 +183,88 @@ def write_manifest(
         json.dump(manifest, f, ensure_ascii=False, indent=2)
 
 
+def load_sign_key(path: str) -> bytes:
+    # файл с hex seed; "env:NAME" — из переменной окружения (секрет CI)
+    if path.startswith("env:"):
+        text = os.environ.get(path[4:], "")
+        if not text:
+            raise SystemExit(f"sign key: environment variable {path[4:]} is empty")
+    else:
+        text = Path(path).read_text(encoding="utf-8")
+    try:
+        seed = bytes.fromhex(text.strip())
+    except ValueError:
+        raise SystemExit(f"sign key: {path} is not hex")
+    if len(seed) != ed25519.KEY_SIZE:
+        raise SystemExit(f"sign key: {path} must hold 32 bytes")
+    return seed
+
+
+def gen_key(path: str) -> None:
+    p = Path(path)
+    if p.exists():
+        raise SystemExit(f"{p} already exists, not overwriting")
+    seed = ed25519.generate_seed()
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(seed.hex() + "\n", encoding="utf-8")
+    print(f"private key: {p} (keep it out of the repo)")
+    print(f"public key for MANIFEST_PUBLIC_KEYS: {ed25519.public_key(seed).hex()}")
+
+
+def sign_manifest(manifest_path: Path, seed: bytes) -> Path:
+    sig_path = manifest_path.with_name(manifest_path.name + SIG_SUFFIX)
+    sig_path.write_text(make_signature(seed, manifest_path.read_bytes()), encoding="utf-8")
+    return sig_path
+
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--input", required=True, help="Path to onedir folder, e.g. dist/MVZ")
+    ap.add_argument("--input", help="Path to onedir folder, e.g. dist/MVZ")
     ap.add_argument("--out", default="release_out", help="Output folder")
-    ap.add_argument("--version", required=True, help="Release version tag, e.g. v1.3.1")
+    ap.add_argument("--version", help="Release version tag, e.g. v1.3.1")
     ap.add_argument("--include-internal", action="store_true", help="Include _internal in update.zip/manifest")
     ap.add_argument("--zip-name", default="update.zip")
     ap.add_argument("--manifest-name", default="manifest.json")
     ap.add_argument("--prev-manifest", default="", help="Path to previous manifest.json (optional)")
+    ap.add_argument("--jobs", type=int, default=None, help="Hashing threads (default: min(8, CPUs); 1 = serial)")
+    ap.add_argument("--patch-from", default="",
+                    help="Previous release onedir folder: add bsdiff patches for changed files (needs bsdiff4)")
+    ap.add_argument("--build-cache", default="",
+                    help="Build cache folder: hashes and compressed members of unchanged files (default: <out>/.build_cache)")
+    ap.add_argument("--no-build-cache", action="store_true", help="Hash and compress everything from scratch")
+    ap.add_argument("--compress-jobs", type=int, default=None,
+                    help="Compression processes (default: CPUs; 1 = in this process)")
+    ap.add_argument("--lzma", action="store_true",
+                    help="LZMA instead of deflate for .dll/.pyd/.exe: smaller package, slower build")
+    ap.add_argument("--reproducible", action="store_true",
+                    help="Byte-identical output for identical input: fixed timestamps (SOURCE_DATE_EPOCH "
+                         "or 1980-01-01), sorted entries, normalized attributes; implied by SOURCE_DATE_EPOCH")
+    ap.add_argument("--sign-key", default="",
+                    help="Ed25519 private key file (hex seed) or env:NAME: writes <manifest>.sig")
+    ap.add_argument("--gen-key", default="", metavar="PATH",
+                    help="Generate a new signing key into PATH, print its public key and exit")
     args = ap.parse_args()
 
+    if args.gen_key:
+        gen_key(args.gen_key)
+        return
+    if not args.input or not args.version:
+        ap.error("--input and --version are required")
+    seed = load_sign_key(args.sign_key) if args.sign_key else None
+
     base_dir = Path(args.input).resolve()
     out_dir = Path(args.out).resolve()
     zip_path = out_dir / args.zip_name
     manifest_path = out_dir / args.manifest_name
 
+    t0 = time.perf_counter()
+    epoch = source_date_epoch(args.reproducible)
+    cache = None if args.no_build_cache else BuildCache(args.build_cache or str(out_dir / ".build_cache"))
+
     prev_map, prev_paths = load_prev_manifest_map(args.prev_manifest)
 
-    new_map, new_paths = build_maps(base_dir, include_internal=args.include_internal)
+    new_map, new_paths = build_maps(base_dir, include_internal=args.include_internal, jobs=args.jobs,
+                                    hash_cache=cache.hashes if cache else None)
 
     delta_mode = bool(args.prev_manifest)
 
@@ -165,7 +286,31 @@ def main():
         to_pack = [(new_map[rel]["abs"], rel) for rel in sorted(new_map.keys())]
         files_list = [{"path": rel, "sha256": new_map[rel]["sha256"], "size": new_map[rel]["size"]} for rel in sorted(new_map.keys())]
 
-    write_zip(to_pack, zip_path)
+    with tempfile.TemporaryDirectory(prefix="mvz_patches_") as work:
+        if args.patch_from:
+            patches = build_patches(Path(args.patch_from).resolve(), [f["path"] for f in files_list],
+                                    new_map, Path(work), jobs=args.jobs)
+            for f in files_list:
+                pe = patches.get(f["path"])
+                if pe:
+                    f["patches"] = [{"from": pe["from"], "path": pe["path"], "size": pe["size"]}]
+                    to_pack.append((pe["abs"], pe["path"]))
+        shas = {str(info["abs"]): info["sha256"] for info in new_map.values()}
+        counts = write_zip(to_pack, zip_path, cache, shas, jobs=args.compress_jobs, use_lzma=args.lzma,
+                           epoch=epoch)
+    print("members: " + ", ".join(f"{n} {METHOD_NAMES.get(m, m)}" for m, n in sorted(counts.items())))
+    if cache is not None:
+        cache.save()
+        print(f"build cache: {cache.hashes.hits} hashes and {cache.reused} members reused, "
+              f"{cache.hashes.misses} hashed, {cache.compressed} compressed")
+
+    # сжатый размер полного файла — с ним апдейтер сравнивает патчи
+    with zipfile.ZipFile(zip_path, "r") as z:
+        packed = {i.filename: i.compress_size for i in z.infolist()}
+    for f in files_list:
+        if f["path"] in packed:
+            f["packed"] = packed[f["path"]]
+
     write_manifest(
         out_manifest=manifest_path,
         version=args.version,
@@ -174,10 +319,16 @@ def main():
         files=files_list,
         delete_list=deleted,
         delta=delta_mode,
+        package_sha256=sha256_file(str(zip_path)),
+        package_size=zip_path.stat().st_size,
+        epoch=epoch,
     )
 
     print(str(zip_path))
     print(str(manifest_path))
+    if seed is not None:
+        print(str(sign_manifest(manifest_path, seed)))
+    print(f"done in {time.perf_counter() - t0:.1f} s")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,387 @@
+"""
+Сборка update.zip из заранее сжатых членов: сжатые данные лежат в кэше
+сборки по sha256 содержимого и при неизменном файле просто копируются
+в архив, без повторного сжатия. Новые члены сжимаются параллельно
+в процессах-воркерах, архив потом собирается из готовых blob'ов по порядку.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import lzma
+import zlib
+import shutil
+import struct
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.hashing import HashCache
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+# zipfile читает LZMA (метод 14) начиная с Python 3.3 — апдейтер тоже
+ZIP_LZMA = 14
+
+METHOD_NAMES = {ZIP_STORED: "stored", ZIP_DEFLATED: "deflate", ZIP_LZMA: "lzma"}
+
+# уже сжатое содержимое: deflate его не уменьшит, только потратит время
+STORED_EXTS = {".zip", ".png", ".ico", ".jpg", ".jpeg", ".gif", ".webp", ".7z", ".gz", ".bz2", ".xz", ".bsdiff"}
+
+# кандидаты на LZMA: код сжимается им на 15–25% лучше deflate
+LZMA_EXTS = {".dll", ".pyd", ".exe"}
+
+BUILD_CACHE_FORMAT = 2
+_CHUNK = 1024 * 1024
+
+# preset выше 6 — словарь 16–64 МБ: столько же памяти нужно клиенту на распаковку,
+# а на DLL выигрыш в размере меньше процента
+LZMA_MAX_PRESET = 6
+
+# 13 байт заголовка .lzma: свойства (5) + размер (8)
+_LZMA_ALONE_HEADER = 13
+
+# без zip64: update.zip заведомо меньше 4 ГБ и 65535 файлов
+_MAX32 = 0xFFFFFFFF
+
+
+@dataclass
+class Blob:
+    """Сжатое содержимое одного файла: payload — данные члена zip как есть."""
+    path: str
+    crc: int
+    file_size: int
+    compress_size: int
+    method: int
+
+
+def member_method(name: str, lzma_exts: Iterable[str] = ()) -> int:
+    """Метод сжатия члена по расширению имени."""
+    ext = os.path.splitext(name)[1].lower()
+    if ext in STORED_EXTS:
+        return ZIP_STORED
+    if ext in lzma_exts:
+        return ZIP_LZMA
+    return ZIP_DEFLATED
+
+
+class _LzmaMember:
+    """
+    Поток LZMA в формате члена zip (как у zipfile.LZMACompressor): версия SDK,
+    длина свойств, свойства, сырой LZMA1 с маркером конца. Собирается из
+    формата .lzma — у него тот же поток, отличается только заголовок.
+    """
+
+    def __init__(self, level: int):
+        self._comp = lzma.LZMACompressor(lzma.FORMAT_ALONE, filters=[
+            {"id": lzma.FILTER_LZMA1, "preset": min(max(level, 0), LZMA_MAX_PRESET)},
+        ])
+        self._head = b""
+
+    def _strip(self, data: bytes) -> bytes:
+        if len(self._head) >= _LZMA_ALONE_HEADER:
+            return data
+        self._head += data
+        if len(self._head) < _LZMA_ALONE_HEADER:
+            return b""
+        props = self._head[:5]
+        rest = self._head[_LZMA_ALONE_HEADER:]
+        return struct.pack("<BBH", 9, 4, len(props)) + props + rest
+
+    def compress(self, data: bytes) -> bytes:
+        return self._strip(self._comp.compress(data))
+
+    def flush(self) -> bytes:
+        return self._strip(self._comp.flush())
+
+
+def _crc_file(path: str) -> Tuple[int, int]:
+    crc = 0
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return crc, size
+
+
+def compress_file(src: str, dst: str, method: int, level: int) -> Blob:
+    """
+    Сжать src в dst (сырой поток члена zip), посчитать CRC32. Если сжатие
+    не уменьшило файл или method == ZIP_STORED, dst не остаётся, а член
+    хранится без сжатия прямо из src.
+    """
+    if method == ZIP_STORED:
+        crc, size = _crc_file(src)
+        return Blob(src, crc, size, size, ZIP_STORED)
+    crc = 0
+    size = 0
+    comp = _LzmaMember(level) if method == ZIP_LZMA else zlib.compressobj(level, zlib.DEFLATED, -15)
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        for chunk in iter(lambda: fi.read(_CHUNK), b""):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            fo.write(comp.compress(chunk))
+        fo.write(comp.flush())
+    csize = os.path.getsize(dst)
+    if csize >= size:
+        os.remove(dst)
+        return Blob(src, crc, size, size, ZIP_STORED)
+    return Blob(dst, crc, size, csize, method)
+
+
+class BuildCache:
+    """
+    Кэш сборки релиза:
+        hashes.json          — sha256 файлов по (size, mtime_ns, inode), см. core.hashing.HashCache
+        blobs/<sha>.<m>-<l>  — сжатый методом m с уровнем l член zip
+        blobs.json           — CRC32, исходный размер и итоговый метод каждого blob
+    Если сжатие не уменьшило файл, в blobs.json запоминается метод stored,
+    а сам blob не создаётся: данные берутся из исходного файла.
+    save() оставляет только blob'ы, использованные в этой сборке.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self.hashes = HashCache(os.path.join(root, "hashes.json"))
+        self._index_path = os.path.join(root, "blobs.json")
+        self._index: Dict[str, List[int]] = {}
+        self._used: set = set()
+        self.reused = 0
+        self.compressed = 0
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("format") == BUILD_CACHE_FORMAT:
+                self._index = {k: list(v) for k, v in (data.get("blobs") or {}).items()}
+        except (OSError, ValueError):
+            pass
+
+    def _key(self, sha: str, method: int, level: int) -> str:
+        return f"{sha}.{method}-{level}"
+
+    def get(self, src: str, sha: str, method: int, level: int) -> Optional[Blob]:
+        """Готовый член для содержимого sha или None — его нужно сжать в tmp_path()."""
+        key = self._key(sha, method, level)
+        self._used.add(key)
+        meta = self._index.get(key)
+        if meta is None or len(meta) < 3:
+            return None
+        crc, size, actual = meta[0], meta[1], meta[2]
+        if actual == ZIP_STORED:
+            self.reused += 1
+            return Blob(src, crc, size, size, ZIP_STORED)
+        path = os.path.join(self.blobs_dir, key)
+        if not os.path.isfile(path):
+            return None
+        self.reused += 1
+        return Blob(path, crc, size, os.path.getsize(path), actual)
+
+    def tmp_path(self, sha: str, method: int, level: int) -> str:
+        return os.path.join(self.blobs_dir, self._key(sha, method, level) + ".tmp")
+
+    def put(self, sha: str, method: int, level: int, blob: Blob) -> Blob:
+        """Принять результат compress_file(..., tmp_path(...)) в кэш."""
+        key = self._key(sha, method, level)
+        if blob.method != ZIP_STORED:
+            path = os.path.join(self.blobs_dir, key)
+            os.replace(blob.path, path)
+            blob.path = path
+        self._index[key] = [blob.crc, blob.file_size, blob.method]
+        self.compressed += 1
+        return blob
+
+    def save(self) -> None:
+        self.hashes.save()
+        for name in os.listdir(self.blobs_dir):
+            if name not in self._used:
+                try:
+                    os.remove(os.path.join(self.blobs_dir, name))
+                except OSError:
+                    pass
+        data = {"format": BUILD_CACHE_FORMAT, "blobs": {k: v for k, v in self._index.items() if k in self._used}}
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self._index_path)
+
+
+def _dos_datetime(ts: float, utc: bool = False) -> Tuple[int, int]:
+    t = time.gmtime(ts) if utc else time.localtime(ts)
+    year = min(max(t.tm_year, 1980), 2107)
+    dosdate = (year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dostime = t.tm_hour << 11 | t.tm_min << 5 | (t.tm_sec // 2)
+    return dostime, dosdate
+
+
+class ZipAssembler:
+    """
+    Пишет zip из готовых Blob'ов: локальный заголовок + сжатые данные как есть,
+    в конце central directory. Результат читается обычным zipfile.
+    """
+
+    def __init__(self, path: str, create_system: Optional[int] = None, utc: bool = False):
+        self.path = path
+        self._tmp = path + ".tmp"
+        self._f: BinaryIO = open(self._tmp, "wb")
+        self._central: List[bytes] = []
+        # zipfile пишет так же: 0 — MS-DOS/Windows, 3 — Unix
+        self._create_system = (0 if sys.platform == "win32" else 3) if create_system is None else create_system
+        # время членов в UTC, а не в поясе сборочной машины
+        self._utc = utc
+
+    def add(self, name: str, blob: Blob, mtime: float, mode: int = 0o100644) -> None:
+        if blob.compress_size > _MAX32 or blob.file_size > _MAX32 or len(self._central) >= 0xFFFF:
+            raise ValueError("update.zip: zip64 не поддерживается")
+        offset = self._f.tell()
+        if offset > _MAX32:
+            raise ValueError("update.zip: zip64 не поддерживается")
+        fname = name.encode("ascii", errors="ignore")
+        flags = 0
+        if fname.decode("ascii") != name:
+            fname = name.encode("utf-8")
+            flags |= 0x800
+        version = 20
+        if blob.method == ZIP_LZMA:
+            # как zipfile: поток с маркером конца (бит 1), версия 6.3
+            flags |= 0x02
+            version = 63
+        dostime, dosdate = _dos_datetime(mtime, self._utc)
+
+        self._f.write(struct.pack(
+            "<4s5H3L2H", b"PK\x03\x04", version, flags, blob.method, dostime, dosdate,
+            blob.crc, blob.compress_size, blob.file_size, len(fname), 0,
+        ))
+        self._f.write(fname)
+        with open(blob.path, "rb") as src:
+            shutil.copyfileobj(src, self._f, _CHUNK)
+
+        self._central.append(struct.pack(
+            "<4s6H3L5H2L", b"PK\x01\x02", self._create_system << 8 | version, version, flags,
+            blob.method, dostime, dosdate, blob.crc, blob.compress_size, blob.file_size,
+            len(fname), 0, 0, 0, 0, (mode & 0xFFFF) << 16, offset,
+        ) + fname)
+
+    def close(self) -> None:
+        cd_offset = self._f.tell()
+        for rec in self._central:
+            self._f.write(rec)
+        cd_size = self._f.tell() - cd_offset
+        self._f.write(struct.pack(
+            "<4s4H2LH", b"PK\x05\x06", 0, 0, len(self._central), len(self._central),
+            cd_size, cd_offset, 0,
+        ))
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        self._f.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+def _compress_job(src: str, dst: str, method: int, level: int) -> Blob:
+    # точка входа воркера: на Windows (spawn) должна импортироваться из модуля
+    return compress_file(src, dst, method, level)
+
+
+def write_zip_cached(
+        files_to_pack: List[Tuple[str, str]], out_zip: str, cache: Optional[BuildCache],
+        level: int = 9, shas: Optional[Dict[str, str]] = None,
+        workers: Optional[int] = None, lzma_exts: Iterable[str] = (),
+        fixed_mtime: Optional[float] = None,
+) -> Dict[int, int]:
+    """
+    files_to_pack — [(путь на диске, имя в архиве)]. С cache неизменённые
+    файлы не сжимаются заново; shas (путь -> sha256) экономит повторный stat.
+    Без cache всё сжимается во временные blob'ы рядом с out_zip.
+
+    Метод выбирается по расширению (member_method), lzma_exts — для каких
+    расширений LZMA вместо deflate. Промахи кэша сжимаются в workers
+    процессах (по умолчанию — по числу CPU, 1 — в этом процессе), крупные
+    первыми; архив пишется в порядке files_to_pack. Возвращает число
+    членов по итоговому методу.
+
+    fixed_mtime — воспроизводимый архив: члены по имени, у всех это время
+    (в UTC), режим 0644 и система «Unix», так что одинаковое содержимое
+    даёт побайтно одинаковый zip на любой машине.
+    """
+    reproducible = fixed_mtime is not None
+    if reproducible:
+        files_to_pack = sorted(files_to_pack, key=lambda t: t[1])
+    lzma_exts = {e.lower() for e in lzma_exts}
+    workers = (os.cpu_count() or 2) if workers is None else max(1, int(workers))
+    tmp_dir = None
+    if cache is None:
+        tmp_dir = out_zip + ".blobs"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+    ready: Dict[int, Blob] = {}
+    todo: List[Tuple[int, str, str, int, str]] = []  # (i, src, dst, method, sha)
+    # одинаковое содержимое (например, qt_en.qm и qtbase_en.qm в PySide6) сжимается
+    # один раз: у таких членов общий tmp_path(), и два воркера писали бы в один файл
+    owner: Dict[Tuple[str, int], int] = {}
+    same_as: Dict[int, int] = {}
+    stats: List[os.stat_result] = []
+    for i, (src, arc) in enumerate(files_to_pack):
+        stats.append(os.stat(src))
+        method = member_method(arc, lzma_exts)
+        if cache is not None:
+            sha = (shas or {}).get(src) or cache.hashes.sha256(src)
+            blob = cache.get(src, sha, method, level)
+            if blob is not None:
+                ready[i] = blob
+            elif (sha, method) in owner:
+                same_as[i] = owner[(sha, method)]
+            else:
+                owner[(sha, method)] = i
+                todo.append((i, src, cache.tmp_path(sha, method, level), method, sha))
+        else:
+            todo.append((i, src, os.path.join(tmp_dir, str(i)), method, ""))
+
+    pool = None
+    futures: Dict[int, Future] = {}
+    if workers > 1 and len(todo) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(todo)))
+        # крупные файлы вперёд, чтобы в конце не ждать один большой хвост
+        for i, src, dst, method, _ in sorted(todo, key=lambda t: stats[t[0]].st_size, reverse=True):
+            futures[i] = pool.submit(_compress_job, src, dst, method, level)
+    pending = {t[0]: t for t in todo}
+
+    counts: Dict[int, int] = {}
+    z = ZipAssembler(out_zip, create_system=3 if reproducible else None, utc=reproducible)
+    try:
+        for i, (src, arc) in enumerate(files_to_pack):
+            blob = ready.get(i)
+            if blob is None and i in same_as:
+                # первый член с этим содержимым идёт раньше по files_to_pack и уже готов
+                blob = ready[same_as[i]]
+            elif blob is None:
+                _, _, dst, method, sha = pending[i]
+                blob = futures[i].result() if pool is not None else compress_file(src, dst, method, level)
+                if cache is not None:
+                    blob = cache.put(sha, method, level, blob)
+                ready[i] = blob
+            if reproducible:
+                z.add(arc, blob, fixed_mtime, 0o100644)
+            else:
+                z.add(arc, blob, stats[i].st_mtime, stats[i].st_mode)
+            counts[blob.method] = counts.get(blob.method, 0) + 1
+        z.close()
+    except BaseException:
+        z.abort()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return counts
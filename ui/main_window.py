@@ -5,9 +5,9 @@ from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QTextEdit, QLabel, QFrame, QMessageBox, QStackedWidget,
     QSystemTrayIcon, QMenu, QCheckBox, QApplication, QComboBox,
-    QDialog, QTextBrowser, QProgressDialog
+    QDialog, QTextBrowser, QProgressDialog, QLineEdit
 )
-from PySide6.QtCore import Qt, QProcess, QTimer, QSettings
+from PySide6.QtCore import Qt, QProcess, QTimer, QSettings, QThreadPool
 from PySide6.QtGui import QAction, QPixmap, QIcon
 
 import os
@@ -16,10 +16,6 @@ import datetime
 import time
 import ctypes
 import subprocess
-import shlex
-import json
-import urllib.request
-import urllib.error
 import tempfile
 from typing import Optional, List, Tuple
 
@@ -27,11 +23,34 @@ from typing import Optional, List, Tuple
 # --- Updater (лежит в ui/mvz_updater.py) ---
 _UPDATER_IMPORT_ERROR = None
 try:
-    from ui.mvz_updater import apply_update_from_release
+    from ui.mvz_updater import (
+        MANIFEST_PUBLIC_KEYS, GitHubSource, LanSource, apply_update_from_release, format_bytes, list_fetcher,
+        parse_sources, rollback_last_update,
+    )
+    from ui.update_worker import ListUpdateTask, UpdateCheckTask, UpdateJob
 except Exception as e:
     apply_update_from_release = None
+    rollback_last_update = None
+    parse_sources = None
+    list_fetcher = None
+    MANIFEST_PUBLIC_KEYS = ()
+    UpdateCheckTask = None
+    UpdateJob = None
+    ListUpdateTask = None
     _UPDATER_IMPORT_ERROR = f"ui.mvz_updater import error: {e}"
 
+from core.bat_parser import parse_bat_variables_and_command as _parse_bat
+from core.launch_plan import LaunchPlanCache, PLAN_CACHE_NAME
+from core.list_compiler import ListCompiler, COMPILED_DIR_NAME, referenced_lists
+from core.list_watcher import QtListWatcher
+from core.match_query import MatchIndex
+from core.profiles import ProfileRegistry
+from core.list_updater import LIST_STATE_NAME, ListUpdater
+from core.supervisor import WinwsSupervisor, find_processes, kill_stray_processes
+from core.watchdog import CrashWatchdog
+from core.object_store import ObjectStore, OBJECTS_DIR_NAME
+from core.lan_cache import LanCacheServer, LAN_PORT
+
 
 # --- Windows registry (autostart) ---
 try:
@@ -50,15 +69,19 @@ UPDATE_MANIFEST_ASSET = "manifest.json"
 UPDATE_CHECK_URL = f"https://api.github.com/repos/{UPDATE_OWNER}/{UPDATE_REPO}/releases/latest"
 UPDATE_USER_AGENT = "MVZ-Updater"
 
+UPDATE_STAGE_TITLES = {
+    "release": "Проверка релиза",
+    "manifest": "Загрузка manifest",
+    "diff": "Сравнение файлов",
+    "download": "Загрузка",
+    "verify": "Проверка",
+    "stage": "Распаковка",
+    "apply": "Установка",
+}
+
 APP_VERSION = "1.4"
 CREATE_NO_WINDOW = 0x08000000
 
-ALT11_BAT_CANDIDATES = [
-    "general (ALT11).bat",
-    "general-ALT11.bat",
-    "general_ALT11.bat",
-]
-
 
 # -------------------- Optional deps --------------------
 try:
@@ -483,168 +506,8 @@ def app_dir() -> str:
     return os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
 
-def resolve_alt11_bat() -> str:
-    base = app_dir()
-    candidates: List[str] = []
-    for name in ALT11_BAT_CANDIDATES:
-        candidates.append(os.path.join(base, name))
-        candidates.append(os.path.join(base, "ZZZ", name))
-    for p in candidates:
-        if os.path.isfile(p):
-            return p
-    return candidates[0] if candidates else os.path.join(base, ALT11_BAT_CANDIDATES[0])
-
-
 def parse_bat_variables_and_command(bat_path: str) -> Tuple[str, List[str], str]:
-    bat_dir = os.path.abspath(os.path.dirname(bat_path))
-    env = {}
-
-    def get_var(k: str) -> Optional[str]:
-        return env.get(k.lower())
-
-    def set_var(k: str, v: str):
-        env[k.lower()] = v
-
-    set_var("~dp0", bat_dir + "\\")
-
-    bin_dir = os.path.join(bat_dir, "bin")
-    if os.path.isdir(bin_dir):
-        set_var("BIN", bin_dir + "\\")
-    else:
-        set_var("BIN", bat_dir + "\\")
-
-    with open(bat_path, "r", encoding="utf-8", errors="ignore") as f:
-        raw_lines = f.readlines()
-
-    lines: List[str] = []
-    buf = ""
-    for raw in raw_lines:
-        s = raw.strip()
-        if not s:
-            continue
-        low = s.lower()
-        if low.startswith("rem ") or low.startswith("::") or low.startswith("@"):
-            continue
-        if s.endswith("^"):
-            buf += s[:-1] + " "
-        else:
-            buf += s
-            lines.append(buf.strip())
-            buf = ""
-    if buf:
-        lines.append(buf.strip())
-
-    winws_cmd_parts = None
-
-    for ln in lines:
-        resolved_ln = ln.replace("%~dp0", bat_dir + "\\")
-
-        # expand %VAR%
-        for _ in range(10):
-            if "%" not in resolved_ln:
-                break
-            new_ln = ""
-            i = 0
-            while i < len(resolved_ln):
-                if resolved_ln[i] == "%":
-                    j = resolved_ln.find("%", i + 1)
-                    if j != -1:
-                        var_name = resolved_ln[i + 1: j]
-                        val = get_var(var_name)
-                        if val is not None:
-                            new_ln += val
-                            i = j + 1
-                            continue
-                new_ln += resolved_ln[i]
-                i += 1
-            if new_ln == resolved_ln:
-                break
-            resolved_ln = new_ln
-
-        try:
-            parts = shlex.split(resolved_ln, posix=False)
-        except ValueError:
-            continue
-        if not parts:
-            continue
-
-        cmd_lower = parts[0].lower()
-        if cmd_lower == "if":
-            continue
-
-        if cmd_lower == "set":
-            remainder = resolved_ln[3:].strip()
-            if remainder.startswith('"') and remainder.endswith('"'):
-                remainder = remainder[1:-1]
-            if "=" in remainder:
-                k, v = remainder.split("=", 1)
-                k, v = k.strip(), v.strip()
-                if v.startswith('"') and v.endswith('"'):
-                    v = v[1:-1]
-                set_var(k, v)
-        elif "winws.exe" in resolved_ln.lower():
-            winws_cmd_parts = parts
-            break
-
-    if not winws_cmd_parts:
-        raise RuntimeError("Не найдена команда winws.exe")
-
-    idx = -1
-    for i, p in enumerate(winws_cmd_parts):
-        if "winws.exe" in p.lower():
-            idx = i
-            break
-    if idx == -1:
-        raise RuntimeError("winws.exe потерялся при парсинге")
-
-    exe_raw = winws_cmd_parts[idx].strip('"')
-    raw_args = winws_cmd_parts[idx + 1:]
-    exe = exe_raw
-
-    if not os.path.isabs(exe):
-        cands = [
-            os.path.join(bat_dir, exe),
-            os.path.join(bat_dir, "bin", "winws.exe"),
-            os.path.join(app_dir(), "bin", "winws.exe"),
-            os.path.join(bat_dir, "winws.exe"),
-        ]
-        for c in cands:
-            if os.path.isfile(c):
-                exe = c
-                break
-
-    final_args: List[str] = []
-    for arg in raw_args:
-        clean = arg.replace('"', "")
-
-        if "=" in clean and any(k in clean for k in ["ipset", "hostlist", "fake", "tls", "quic", "pattern"]):
-            key, val = clean.split("=", 1)
-
-            if not val or val.startswith("-"):
-                final_args.append(f"{key}={val}")
-                continue
-
-            if os.path.isfile(val):
-                final_args.append(f"{key}={val}")
-                continue
-
-            possible_paths = [
-                os.path.join(bat_dir, val),
-                os.path.join(bat_dir, "lists", val),
-                os.path.join(bat_dir, "bin", val),
-                os.path.join(app_dir(), val),
-                os.path.join(app_dir(), "lists", val),
-            ]
-            found_path = None
-            for p in possible_paths:
-                if os.path.isfile(p):
-                    found_path = p
-                    break
-            final_args.append(f"{key}={found_path or val}")
-        else:
-            final_args.append(clean)
-
-    return exe, final_args, bat_dir
+    return _parse_bat(bat_path, app_root=app_dir())
 
 
 # -------------------- Main Window --------------------
@@ -661,19 +524,58 @@ class MainWindow(QMainWindow):
 
         self.settings = QSettings("MVZ", "MVZapret")
         self.current_theme_name = self.settings.value("theme", "dark")
-        self.alt11_bat_path = resolve_alt11_bat()
+        self.launch_plans = LaunchPlanCache(
+            os.path.join(app_dir(), PLAN_CACHE_NAME), parse_bat_variables_and_command
+        )
+        # general*.bat и встроенные профили разбираются здесь один раз,
+        # переключение стратегии — поиск в словаре
+        self.profiles = ProfileRegistry(app_dir(), self.launch_plans)
+        self.profiles.refresh()
+        self.profile_id = self.settings.value("profile_id", "", type=str)
+        if self.profile_id not in self.profiles:
+            self.profile_id = self.profiles.default_id()
+        self.list_compiler = ListCompiler(os.path.join(app_dir(), "lists", COMPILED_DIR_NAME))
 
         # state
         self.detached_running = False
         self.session_start_time: Optional[datetime.datetime] = None
         self.winws_pid: Optional[int] = None
-        self.winws_process_obj: Optional[subprocess.Popen] = None
+        self._winws_launch_time = 0.0
+
+        # владелец процесса winws.exe: сообщает о выходе сразу, без опроса
+        self.supervisor = WinwsSupervisor(self)
+        self.supervisor.exited.connect(self._on_winws_exited)
+        self.supervisor.swapped.connect(self._on_winws_swapped)
+        self.supervisor.swap_failed.connect(self._on_winws_swap_failed)
+
+        # правка lists/*.txt -> новый winws рядом со старым, без остановки обхода
+        self.list_watcher = QtListWatcher(os.path.join(app_dir(), "lists"), parent=self)
+        self.list_watcher.changed.connect(self._on_lists_changed)
+        # argv и (путь, mtime_ns, size) списков, с которыми запущен текущий winws
+        self._lists_key: Optional[tuple] = None
+        self._swap_busy = False
+        self._swap_lists_key: Optional[tuple] = None
+        self._swap_note = ""
+        # отложенная подмена (пришла во время идущей): её подпись для лога
+        self._reload_pending: Optional[str] = None
+
+        # автоперезапуск после падения (backoff + предохранитель)
+        self.watchdog = CrashWatchdog()
 
         self._really_quit = False
         self._hires_timer_enabled = False
         self.net_optimized_once = False
 
         self.discord_rpc = None
+        self._update_check_task = None
+        self._update_job = None
+        self._update_progress: Optional[QProgressDialog] = None
+        # раздача обновлений и списков соседям по LAN
+        self._lan_server: Optional[LanCacheServer] = None
+        # индекс «домен/IP -> секция батника», строится при первом запросе
+        self._match_index: Optional[MatchIndex] = None
+        self._match_plan = None
+        self._list_update_task = None
 
         # icon
         icon_path = None
@@ -692,19 +594,14 @@ class MainWindow(QMainWindow):
         self.resize(1200, 750)
 
         # timers (ВАЖНО: все методы существуют)
-        self.crash_check_timer = QTimer(self)
-        self.crash_check_timer.setSingleShot(True)
-        self.crash_check_timer.setInterval(2500)
-        self.crash_check_timer.timeout.connect(self._check_startup_status)
-
-        self.monitor_timer = QTimer(self)
-        self.monitor_timer.setInterval(3000)
-        self.monitor_timer.timeout.connect(self.poll_running)
-
         self.uptime_timer = QTimer(self)
         self.uptime_timer.setInterval(1000)
         self.uptime_timer.timeout.connect(self.update_uptime_footer)
 
+        self.restart_timer = QTimer(self)
+        self.restart_timer.setSingleShot(True)
+        self.restart_timer.timeout.connect(self._watchdog_restart)
+
         self.discord_update_timer = QTimer(self)
         self.discord_update_timer.setInterval(30000)
         self.discord_update_timer.timeout.connect(self._update_discord_status)
@@ -781,7 +678,7 @@ class MainWindow(QMainWindow):
         self.btn_logs.clicked.connect(lambda: self.switch_tab(2))
         self.btn_info.clicked.connect(lambda: self.switch_tab(3))
 
-        self.run_btn.clicked.connect(self.run_alt11_internal)
+        self.run_btn.clicked.connect(self.run_profile_internal)
         self.stop_btn.clicked.connect(self.stop_winws)
         self.optimize_btn.clicked.connect(self.optimize_network)
 
@@ -793,7 +690,7 @@ class MainWindow(QMainWindow):
         tray_menu = QMenu(self)
         tray_menu.addAction(QAction("Открыть MVZ", self, triggered=self.show_main_from_tray))
         tray_menu.addSeparator()
-        tray_menu.addAction(QAction("Запустить", self, triggered=self.run_alt11_internal))
+        tray_menu.addAction(QAction("Запустить", self, triggered=self.run_profile_internal))
         tray_menu.addAction(QAction("Остановить", self, triggered=self.stop_winws))
         tray_menu.addSeparator()
 
@@ -849,12 +746,27 @@ class MainWindow(QMainWindow):
             self.settings.setValue("discord_rpc_enabled", False)
             self.append_log("[Discord RPC] модуль не установлен/недоступен")
 
+        if self.settings.value("lan_cache_enabled", False, type=bool):
+            self.on_toggle_lan_cache(True)
+        if self.hot_reload_cb.isChecked():
+            self.on_toggle_hot_reload(True)
+        # winws, запущенный не из MVZ (service.bat, прошлый сеанс): постоянного опроса
+        # больше нет, поэтому сообщаем о нём один раз при старте
+        external = find_processes("winws.exe")
+        if external:
+            self.append_log(
+                f"[MVZ] Уже запущен winws.exe не из MVZ (PID {', '.join(map(str, external))}); "
+                "при запуске обхода он будет завершён"
+            )
+        for err in self.profiles.errors.values():
+            self.append_log(f"[MVZ] Профиль пропущен, батник не разобран: {err}")
+
         # auto-run launch
         # если включено "автоматически запускать обход", то запускаем через 1 сек.
         # (работает и при автозапуске, и при ручном запуске)
         if auto_run_bypass and (("--autorun" in sys.argv) or is_win_autostart):
             self.append_log("[Autostart] Запуск обхода через 1 сек...")
-            QTimer.singleShot(1000, self.run_alt11_internal)
+            QTimer.singleShot(1000, self.run_profile_internal)
 
     # ---------- Pages ----------
     def _create_home_page(self):
@@ -869,9 +781,23 @@ class MainWindow(QMainWindow):
         title_row.addWidget(title)
         title_row.addStretch()
 
-        self.current_profile_label = QLabel(f"ALT11: {os.path.basename(self.alt11_bat_path)}")
-        self.current_profile_label.setStyleSheet("font-size:12px;color:#94A3B8;")
-        title_row.addWidget(self.current_profile_label)
+        profile_label = QLabel("Профиль:")
+        profile_label.setStyleSheet("font-size:12px;color:#94A3B8;")
+        title_row.addWidget(profile_label)
+
+        self.profile_combo = QComboBox()
+        self.profile_combo.setToolTip(
+            "Стратегия обхода: general*.bat рядом с MVZ (и в ZZZ) и встроенные профили.\n"
+            "При работающем обходе новый winws запускается рядом с прежним, без остановки."
+        )
+        for prof in self.profiles.profiles():
+            self.profile_combo.addItem(prof.name, prof.id)
+            self.profile_combo.setItemData(
+                self.profile_combo.count() - 1, prof.source or "встроенный профиль", Qt.ToolTipRole
+            )
+        self.profile_combo.setCurrentIndex(max(0, self.profile_combo.findData(self.profile_id)))
+        self.profile_combo.currentIndexChanged.connect(self.on_profile_changed)
+        title_row.addWidget(self.profile_combo)
         lay.addLayout(title_row)
 
         status_row = QHBoxLayout()
@@ -916,6 +842,9 @@ class MainWindow(QMainWindow):
         self.priority_label = QLabel("")
         self.priority_label.setStyleSheet("font-size:12px;")
 
+        self.watchdog_label = QLabel("")
+        self.watchdog_label.setStyleSheet("font-size:12px;color:#94A3B8;")
+
         footer = QHBoxLayout()
         footer.addStretch()
         self.uptime_footer = QLabel("Время работы: —")
@@ -927,6 +856,7 @@ class MainWindow(QMainWindow):
         lay.addLayout(btns)
         lay.addWidget(self.optimize_btn)
         lay.addWidget(self.priority_label)
+        lay.addWidget(self.watchdog_label)
         lay.addStretch()
         lay.addLayout(footer)
 
@@ -950,6 +880,63 @@ class MainWindow(QMainWindow):
         self.auto_run_cb = QCheckBox("Запускать обход автоматически при старте MVZ")
         lay.addWidget(self.auto_run_cb)
 
+        self.watchdog_cb = QCheckBox("Перезапускать winws автоматически при падении")
+        self.watchdog_cb.setChecked(self.settings.value("watchdog_enabled", True, type=bool))
+        self.watchdog_cb.toggled.connect(self.on_toggle_watchdog)
+        lay.addWidget(self.watchdog_cb)
+
+        self.rollback_btn = QPushButton("Откатить последнее обновление")
+        self.rollback_btn.clicked.connect(self.rollback_update)
+        lay.addWidget(self.rollback_btn)
+
+        self.update_lists_btn = QPushButton("Обновить списки (ipset)")
+        self.update_lists_btn.setToolTip(
+            "Скачать свежий ipset-all.txt. Файл проверяется построчно и подменяется целиком;\n"
+            "прежние версии — в lists\\backup. winws перезапускается, только если список изменился."
+        )
+        self.update_lists_btn.clicked.connect(self.update_lists)
+        lay.addWidget(self.update_lists_btn)
+
+        self.lan_cache_cb = QCheckBox(f"Раздавать обновления и списки в локальной сети (порт {LAN_PORT})")
+        self.lan_cache_cb.setToolTip(
+            "Другие MVZ в сети найдут этот компьютер и скачают обновление у него, а не с GitHub.\n"
+            "Раздаются только файлы установленной версии и списки; получатель проверяет их по sha256."
+        )
+        self.lan_cache_cb.setChecked(self.settings.value("lan_cache_enabled", False, type=bool))
+        self.lan_cache_cb.toggled.connect(self.on_toggle_lan_cache)
+        lay.addWidget(self.lan_cache_cb)
+
+        self.lan_updates_cb = QCheckBox("Брать обновления у других MVZ в локальной сети")
+        self.lan_updates_cb.setToolTip(
+            "Соседи находятся широковещательным запросом, отвечать может любой компьютер в сети.\n"
+            "Поэтому их манифест принимается только с проверенной подписью релиза,\n"
+            "а списки — после проверки sha256 и каждой строки."
+        )
+        self.lan_updates_cb.setChecked(self.settings.value("lan_updates_enabled", False, type=bool))
+        self.lan_updates_cb.toggled.connect(lambda on: self.settings.setValue("lan_updates_enabled", on))
+        lay.addWidget(self.lan_updates_cb)
+
+        sources_row = QHBoxLayout()
+        sources_row.addWidget(QLabel("Источники обновлений:"))
+        self.update_sources_edit = QLineEdit(self.settings.value("update_sources", "", type=str))
+        self.update_sources_edit.setPlaceholderText(r"http://192.168.1.10:8765; \\server\mvz; E:\MVZ — до GitHub")
+        self.update_sources_edit.setToolTip(
+            "Зеркала, соседи по сети (http://…) и папки с release_out (флешка, шара), через «;».\n"
+            "Опрашиваются раньше GitHub; файлы проверяются по sha256 из манифеста."
+        )
+        self.update_sources_edit.editingFinished.connect(self.on_update_sources_changed)
+        sources_row.addWidget(self.update_sources_edit, 1)
+        lay.addLayout(sources_row)
+
+        self.hot_reload_cb = QCheckBox("Применять изменения списков на лету (без остановки обхода)")
+        self.hot_reload_cb.setToolTip(
+            "При правке lists\\*.txt новый winws запускается рядом с работающим,\n"
+            "и старый останавливается только когда новый поднялся."
+        )
+        self.hot_reload_cb.setChecked(self.settings.value("lists_hot_reload", True, type=bool))
+        self.hot_reload_cb.toggled.connect(self.on_toggle_hot_reload)
+        lay.addWidget(self.hot_reload_cb)
+
         self.discord_rpc_cb = QCheckBox("Discord Rich Presence")
         self.discord_rpc_cb.toggled.connect(self.on_toggle_discord_rpc)
         lay.addWidget(self.discord_rpc_cb)
@@ -981,7 +968,22 @@ class MainWindow(QMainWindow):
         self.log = QTextEdit()
         self.log.setReadOnly(True)
 
+        match_row = QHBoxLayout()
+        self.match_edit = QLineEdit()
+        self.match_edit.setPlaceholderText("youtube.com, https://discord.com, 1.2.3.4 udp 443 — какая секция сработает")
+        self.match_edit.setToolTip(
+            "Домен, URL или IP; можно добавить порт, tcp/udp и протокол (quic, stun, discord).\n"
+            "Ответ — секция --new выбранного профиля, которая применится, и почему."
+        )
+        self.match_edit.returnPressed.connect(self.on_match_query)
+        match_btn = QPushButton("Проверить")
+        match_btn.setCursor(Qt.PointingHandCursor)
+        match_btn.clicked.connect(self.on_match_query)
+        match_row.addWidget(self.match_edit, 1)
+        match_row.addWidget(match_btn)
+
         lay.addWidget(title)
+        lay.addLayout(match_row)
         lay.addWidget(self.log, 1)
         return page
 
@@ -1168,70 +1170,29 @@ class MainWindow(QMainWindow):
             pass
         return p
 
-    def _kill_by_name(self, name: str):
-        killer = self._create_hidden_proc()
-        killer.setProcessChannelMode(QProcess.MergedChannels)
-        killer.start("taskkill", ["/IM", name, "/F", "/T"])
-        killer.waitForFinished(4000)
-
-    def _kill_by_pid(self, pid: int):
-        killer = self._create_hidden_proc()
-        killer.setProcessChannelMode(QProcess.MergedChannels)
-        killer.start("taskkill", ["/PID", str(pid), "/F", "/T"])
-        killer.waitForFinished(4000)
-
     def kill_running_instances(self, note: bool = True):
-        if self.winws_pid:
-            try:
-                self._kill_by_pid(self.winws_pid)
-            except Exception:
-                pass
-        try:
-            self._kill_by_name("winws.exe")
-        except Exception:
-            pass
+        # свой процесс — по хэндлу; оставшиеся от прошлых запусков — тоже по хэндлу
+        # (psutil или Toolhelp32), без taskkill и ожидания в GUI-потоке
+        self.supervisor.stop()
+        strays = kill_stray_processes("winws.exe")
+        if strays:
+            self.append_log(f"[MVZ] Завершены сторонние winws.exe: {strays}")
 
         self.winws_pid = None
-        self.winws_process_obj = None
 
         if note:
             self.append_log("[MVZ] Завершены процессы winws.exe")
 
-    def _is_running_now(self) -> bool:
-        if self.winws_pid and psutil is not None:
-            return _pid_alive(self.winws_pid)
-
-        if self.winws_process_obj is not None:
-            try:
-                return self.winws_process_obj.poll() is None
-            except Exception:
-                pass
-
-        checker = self._create_hidden_proc()
-        checker.setProcessChannelMode(QProcess.MergedChannels)
-        checker.start("tasklist", ["/FI", "IMAGENAME eq winws.exe"])
-        checker.waitForFinished(2000)
-        out = bytes(checker.readAllStandardOutput()).decode("utf-8", errors="replace")
-        return "winws.exe" in out
-
     # ---------- Timers/slots ----------
-    def poll_running(self):
-        running = self._is_running_now()
-
-        if running != self.detached_running:
-            self.detached_running = running
-            self.update_buttons(running)
-            self.update_status_indicator(running)
-            self.append_log("[MVZ] " + ("Запущен" if running else "Остановлен"))
-            self._enable_hires_timer(running)
-
-            if not running:
-                self.monitor_timer.stop()
-
     def update_uptime_footer(self):
         if not hasattr(self, "uptime_footer") or self.uptime_footer is None:
             return
 
+        if self.supervisor.is_running():
+            up = datetime.timedelta(seconds=int(self.supervisor.uptime()))
+            self.uptime_footer.setText(f"Время работы: {up}")
+            return
+
         if psutil is None:
             self.uptime_footer.setText("Время работы: —")
             return
@@ -1259,97 +1220,239 @@ class MainWindow(QMainWindow):
         except Exception:
             self.uptime_footer.setText("Время работы: —")
 
-    def _check_startup_status(self):
-        # if subprocess finished quickly => show stderr
-        if self.winws_process_obj is not None:
-            try:
-                if self.winws_process_obj.poll() is not None:
-                    err_output = ""
-                    try:
-                        if self.winws_process_obj.stderr:
-                            err_output = self.winws_process_obj.stderr.read().decode("utf-8", errors="replace").strip()
-                    except Exception:
-                        err_output = ""
-
-                    self.append_log("[MVZ] ПАДЕНИЕ ПРОЦЕССА! Код: " + str(self.winws_process_obj.returncode))
-                    if err_output:
-                        self.append_log("[MVZ WINWS STDERR]: " + err_output)
-                        QMessageBox.critical(self, "Ошибка запуска winws", f"winws упал:\n\n{err_output}")
-                    else:
-                        self.append_log("[MVZ] Процесс упал без stderr (возможно права/пути).")
-
-                    self.update_buttons(False)
-                    self.update_status_indicator(False)
-                    return
-            except Exception:
-                pass
+    def _on_winws_exited(self, pid: int, code: int, expected: bool):
+        if expected or pid != self.winws_pid:
+            return
 
-        if not self._is_running_now():
-            self.append_log("[MVZ] Внимание: процесс завершился сразу после старта!")
-            self.update_buttons(False)
-            self.update_status_indicator(False)
+        err_output = self.supervisor.stderr_tail(pid)
+        lifetime = time.monotonic() - self._winws_launch_time
+
+        self.append_log("[MVZ] ПАДЕНИЕ ПРОЦЕССА! Код: " + str(code))
+        if err_output:
+            self.append_log("[MVZ WINWS STDERR]: " + err_output)
+        else:
+            self.append_log("[MVZ] Процесс упал без stderr (возможно права/пути).")
+
+        self.winws_pid = None
+        self.detached_running = False
+        self.update_buttons(False)
+        self.update_status_indicator(False)
+        self._enable_hires_timer(False)
+
+        if self.watchdog_cb.isChecked() and self._schedule_watchdog_restart():
+            return
+
+        # упал сразу после старта — почти наверняка ошибка аргументов/прав
+        if err_output and lifetime < 2.5:
+            QMessageBox.critical(self, "Ошибка запуска winws", f"winws упал:\n\n{err_output}")
+
+    def _schedule_watchdog_restart(self) -> bool:
+        """Засчитать падение и запланировать перезапуск; False — сработал предохранитель."""
+        delay = self.watchdog.on_crash()
+        self._update_watchdog_label()
+        if delay is not None:
+            self.append_log(f"[Watchdog] Перезапуск через {delay:.0f} с")
+            self.restart_timer.start(int(delay * 1000))
+            return True
+        self.append_log(
+            f"[Watchdog] {self.watchdog.max_crashes} падений за {self.watchdog.window:.0f} с — "
+            "автоперезапуск остановлен. Запустите вручную."
+        )
+        if self.tray.supportsMessages():
+            self.tray.showMessage("MVZ", "winws постоянно падает — автоперезапуск остановлен",
+                                  QSystemTrayIcon.Critical, 5000)
+        return False
+
+    def _watchdog_restart(self):
+        if self.detached_running:
+            return
+        self.append_log("[Watchdog] Перезапуск winws...")
+        if self._launch_profile(interactive=False):
+            return
+        # не запустился вовсе (батник, exe, Popen) — это такая же неудача для backoff и предохранителя
+        if self.watchdog_cb.isChecked():
+            self._schedule_watchdog_restart()
+
+    def _update_watchdog_label(self):
+        st = self.watchdog.stats()
+        if not st.crashes:
+            self.watchdog_label.setText("")
+            return
+
+        def fmt(v: Optional[float]) -> str:
+            return "—" if v is None else str(datetime.timedelta(seconds=int(v)))
+
+        text = (
+            f"Падений: {st.crashes} · перезапусков: {st.restarts} · "
+            f"MTBF: {fmt(st.mtbf)} · восстановление: {fmt(st.mttr)}"
+        )
+        if st.tripped:
+            text += " · автоперезапуск остановлен"
+        self.watchdog_label.setText(text)
+
+    def on_toggle_watchdog(self, checked: bool):
+        self.settings.setValue("watchdog_enabled", checked)
+        if not checked:
+            self.restart_timer.stop()
+        self.append_log("[Watchdog] Автоперезапуск " + ("включён" if checked else "выключен"))
 
     # ---------- Actions ----------
-    def run_alt11_internal(self):
+    def on_update_sources_changed(self):
+        self.settings.setValue("update_sources", self.update_sources_edit.text().strip())
+
+    def _configured_sources(self) -> list:
+        """Источники из настроек, соседи по LAN — первыми (если включены)."""
+        if parse_sources is None:
+            return []
+        sources = parse_sources(self.settings.value("update_sources", "", type=str))
+        if self.settings.value("lan_updates_enabled", False, type=bool):
+            # соседи по LAN — первыми: N загрузок через общий канал превращаются в одну
+            sources.insert(0, LanSource())
+        return sources
+
+    def _extra_update_sources(self) -> list:
+        sources = self._configured_sources()
+        if sources and not MANIFEST_PUBLIC_KEYS:
+            # без ключа подпись не проверить, а неподписанный манифест принимается только с GitHub
+            self.append_log("[Update] ключ подписи релизов не задан — зеркала и соседи по LAN не используются")
+            return []
+        return sources
+
+    def on_toggle_lan_cache(self, enabled: bool):
+        self.settings.setValue("lan_cache_enabled", enabled)
+        if enabled and self._lan_server is None:
+            server = LanCacheServer(app_dir())
+            try:
+                server.start()
+            except OSError as e:
+                self.append_log(f"[LAN] не удалось открыть порт {LAN_PORT}: {e}")
+                self.lan_cache_cb.blockSignals(True)
+                self.lan_cache_cb.setChecked(False)
+                self.lan_cache_cb.blockSignals(False)
+                return
+            self._lan_server = server
+            self.append_log(f"[LAN] раздача включена: порт {server.port}")
+        elif not enabled and self._lan_server is not None:
+            self._lan_server.stop()
+            self._lan_server = None
+            self.append_log("[LAN] раздача выключена")
+
+    def _get_match_index(self) -> MatchIndex:
+        plan, _ = self.profiles.plan(self.profile_id)
+        index = self._match_index
+        if index is None or self._match_plan is not plan or not index.is_fresh():
+            index = MatchIndex(plan.args)
+            self._match_index, self._match_plan = index, plan
+            for p in index.missing:
+                self.append_log(f"[Match] нет файла: {p}")
+        return index
+
+    def on_match_query(self):
+        text = self.match_edit.text().strip()
+        if not text:
+            return
+        try:
+            index = self._get_match_index()
+        except Exception as e:
+            self.append_log(f"[Match] не удалось разобрать батник: {e}")
+            return
+        try:
+            m = index.query(text)
+        except ValueError as e:
+            self.append_log(f"[Match] {text}: {e}")
+            return
+        for line in m.describe(verbose=True).splitlines():
+            self.append_log(f"[Match] {line}")
+
+    def run_profile_internal(self):
+        # ручной запуск снимает предохранитель watchdog
+        self.restart_timer.stop()
+        self.watchdog.reset()
+        self._launch_profile(interactive=True)
+
+    def on_profile_changed(self, index: int):
+        pid = self.profile_combo.itemData(index)
+        if not pid or pid == self.profile_id:
+            return
+        self.profile_id = pid
+        self.settings.setValue("profile_id", pid)
+        name = self.profiles.get(pid).name
+        self.append_log(f"[MVZ] Профиль: {name}")
+        self._update_discord_status()
+        if self.detached_running and self.supervisor.is_running():
+            self._swap_winws(f"Профиль «{name}» применён")
+
+    def _launch_profile(self, interactive: bool) -> bool:
         ensure_hidden_console()
 
-        bat_path = resolve_alt11_bat()
-        if not os.path.isfile(bat_path):
-            QMessageBox.critical(self, "MVZ", f"Не найден ALT11 .bat:\n{bat_path}")
-            return
+        def fail(msg: str) -> bool:
+            if interactive:
+                QMessageBox.critical(self, "MVZ", msg)
+            else:
+                self.append_log(f"[MVZ] {msg}")
+            return False
 
         try:
-            exe, args, workdir = parse_bat_variables_and_command(bat_path)
+            profile = self.profiles.get(self.profile_id)
+        except KeyError as e:
+            return fail(str(e.args[0]))
+        if profile.source and not os.path.isfile(profile.source):
+            return fail(f"Не найден .bat профиля «{profile.name}»:\n{profile.source}")
+
+        try:
+            plan, from_cache = self.profiles.plan(profile.id)
+            exe, args, workdir = plan.exe, plan.args, plan.workdir
             if not os.path.isfile(exe):
                 raise FileNotFoundError(exe)
         except Exception as e:
-            QMessageBox.critical(self, "MVZ", f"Ошибка парсинга батника:\n{e}\n\nПроверь файл.")
-            return
+            return fail(f"Ошибка парсинга батника:\n{e}\n\nПроверь файл.")
+
+        # winws получает списки уже без дублей, лишних поддоменов и исключённого — меньше записей при старте
+        args, notes = self.list_compiler.apply(args)
+        for note in notes:
+            self.append_log(f"[MVZ] Списки: {note}")
+        self._lists_key = self._current_lists_key(plan)
 
         self.kill_running_instances(note=False)
 
-        self.append_log(f"[MVZ] Старт: {exe}")
+        self.append_log(f"[MVZ] Старт «{profile.name}»: {exe}" + (" (план из кэша)" if from_cache else ""))
         self.append_log(f"[DEBUG] Аргументы: {' '.join(args)}")
 
         try:
-            proc = subprocess.Popen(
-                [exe] + args,
-                cwd=workdir,
-                creationflags=CREATE_NO_WINDOW,
-                stderr=subprocess.PIPE,
-            )
+            self._winws_launch_time = time.monotonic()
+            pid = self.supervisor.start([exe] + args, cwd=workdir)
         except Exception as e:
             self.append_log(f"[MVZ] Ошибка запуска: {e}")
             self.update_buttons(False)
             self.update_status_indicator(False)
-            return
+            return False
 
-        self.winws_pid = proc.pid
-        self.winws_process_obj = proc
+        self.winws_pid = pid
         self.detached_running = True
-        self.session_start_time = datetime.datetime.now()
+        self.watchdog.on_started()
+        if interactive or self.session_start_time is None:
+            self.session_start_time = datetime.datetime.now()
 
         self.update_buttons(True)
         self.update_status_indicator(True)
+        self._update_watchdog_label()
 
-        self.monitor_timer.start()
-        self.crash_check_timer.start()
-
-        if self.tray.supportsMessages():
-            self.tray.showMessage("MVZ", "ALT11 запущен", QSystemTrayIcon.Information, 3000)
+        if interactive and self.tray.supportsMessages():
+            self.tray.showMessage("MVZ", f"{profile.name} запущен", QSystemTrayIcon.Information, 3000)
 
         self._optimize_network_silent()
         self._boost_winws_priority()
         self._enable_hires_timer(True)
+        return True
 
     def stop_winws(self):
+        self.restart_timer.stop()
+        self.watchdog.on_stopped()
         self.kill_running_instances(note=False)
         self.detached_running = False
 
         self.update_buttons(False)
         self.update_status_indicator(False)
-        self.crash_check_timer.stop()
-        self.monitor_timer.stop()
 
         self.append_log("[MVZ] Остановлен")
         self._enable_hires_timer(False)
@@ -1431,6 +1534,12 @@ class MainWindow(QMainWindow):
             pass
 
     # ---------- Discord ----------
+    def _profile_name(self) -> str:
+        try:
+            return self.profiles.get(self.profile_id).name
+        except KeyError:
+            return self.profile_id
+
     def _update_discord_status(self):
         try:
             if not self.discord_rpc:
@@ -1438,7 +1547,7 @@ class MainWindow(QMainWindow):
             if getattr(self.discord_rpc, "connected", False):
                 if self.detached_running:
                     if hasattr(self.discord_rpc, "update_running"):
-                        self.discord_rpc.update_running("ALT11", self.session_start_time)
+                        self.discord_rpc.update_running(self._profile_name(), self.session_start_time)
                 else:
                     if hasattr(self.discord_rpc, "update_idle"):
                         self.discord_rpc.update_idle()
@@ -1519,56 +1628,81 @@ class MainWindow(QMainWindow):
 
     def check_updates_silent(self):
         # ВСЕГДА логируем, иначе ты не понимаешь что происходит
+        if self._update_check_task is not None:
+            return  # предыдущая проверка ещё идёт
+
         self.append_log(f"[Update] check start (app={APP_VERSION})")
 
-        try:
-            req = urllib.request.Request(
-                UPDATE_CHECK_URL,
-                headers={"User-Agent": UPDATE_USER_AGENT},
-            )
-            with urllib.request.urlopen(req, timeout=10) as r:
-                data = json.loads(r.read().decode("utf-8", errors="replace"))
+        if UpdateCheckTask is None:
+            self.append_log(f"[Update] updater import failed: {_UPDATER_IMPORT_ERROR}")
+            return
 
+        # условный запрос имеет смысл, только если есть что показать по 304
+        etag = last_modified = ""
+        if self.settings.value("update_cached_tag", "", type=str):
+            etag = self.settings.value("update_etag", "", type=str)
+            last_modified = self.settings.value("update_last_modified", "", type=str)
+
+        task = UpdateCheckTask(UPDATE_CHECK_URL, UPDATE_USER_AGENT, etag, last_modified, timeout=10,
+                               fallback=self._extra_update_sources(), manifest_name=UPDATE_MANIFEST_ASSET)
+        task.setAutoDelete(False)
+        task.signals.finished.connect(self._on_update_check_finished)
+        task.signals.failed.connect(self._on_update_check_failed)
+        self._update_check_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def _on_update_check_finished(self, res):
+        self._update_check_task = None
+
+        if res.not_modified:
+            tag = self.settings.value("update_cached_tag", "", type=str)
+            has_manifest = self.settings.value("update_cached_has_manifest", False, type=bool)
+            changelog = self.settings.value("update_cached_body", "", type=str)
+            self.append_log(f"[Update] 304 Not Modified, latest tag={tag!r}")
+        else:
+            data = res.release or {}
             tag = (data.get("tag_name") or "").strip()
+            assets = data.get("assets", []) or []
+            has_manifest = any(a.get("name") == UPDATE_MANIFEST_ASSET for a in assets)
+            changelog = data.get("body", "") or ""
             self.append_log(f"[Update] latest tag={tag!r}")
+            self.append_log(f"[Update] assets={[a.get('name') for a in assets]}")
 
-            if not tag:
-                self.append_log("[Update] no tag_name in release/latest")
-                return
+            self.settings.setValue("update_etag", res.etag)
+            self.settings.setValue("update_last_modified", res.last_modified)
+            self.settings.setValue("update_cached_tag", tag)
+            self.settings.setValue("update_cached_has_manifest", has_manifest)
+            self.settings.setValue("update_cached_body", changelog)
 
-            if self._version_tuple(tag) <= self._version_tuple(APP_VERSION):
-                self.append_log("[Update] up-to-date")
-                return
-
-            assets = data.get("assets", []) or []
-            names = [a.get("name") for a in assets]
-            self.append_log(f"[Update] assets={names}")
+        if not tag:
+            self.append_log("[Update] no tag_name in release/latest")
+            return
 
-            has_manifest = any(a.get("name") == UPDATE_MANIFEST_ASSET for a in assets)
-            if not has_manifest:
-                self.append_log(f"[Update] missing asset: {UPDATE_MANIFEST_ASSET}")
-                return
+        if self._version_tuple(tag) <= self._version_tuple(APP_VERSION):
+            self.append_log("[Update] up-to-date")
+            return
 
-            if apply_update_from_release is None:
-                self.append_log(f"[Update] updater import failed: {_UPDATER_IMPORT_ERROR}")
-                return
+        if not has_manifest:
+            self.append_log(f"[Update] missing asset: {UPDATE_MANIFEST_ASSET}")
+            return
 
-            changelog = data.get("body", "") or ""
-            self._show_update_dialog(tag, changelog)
+        if apply_update_from_release is None:
+            self.append_log(f"[Update] updater import failed: {_UPDATER_IMPORT_ERROR}")
+            return
 
-        except urllib.error.HTTPError as e:
-            self.append_log(f"[Update] HTTP error: {e.code}")
-        except Exception as e:
-            self.append_log(f"[Update] Exception: {e}")
+        self._show_update_dialog(tag, changelog)
 
+    def _on_update_check_failed(self, code: int, message: str):
+        self._update_check_task = None
 
-        except urllib.error.HTTPError as e:
-            if e.code == 403:
-                self.append_log("[Update] GitHub API: 403 (возможен лимит запросов). Попробуйте позже.")
-            elif e.code != 404:
-                self.append_log(f"[Update] HTTP ошибка: {e.code}")
-        except Exception as e:
-            self.append_log(f"[Update] Ошибка проверки: {e}")
+        if code == 403:
+            self.append_log("[Update] GitHub API: 403 (возможен лимит запросов). Попробуйте позже.")
+        elif code == 404:
+            self.append_log("[Update] Релизов пока нет (404)")
+        elif code:
+            self.append_log(f"[Update] HTTP ошибка: {code}")
+        else:
+            self.append_log(f"[Update] Ошибка проверки: {message}")
 
     def _show_update_dialog(self, version: str, changelog: str):
         dialog = QDialog(self)
@@ -1616,58 +1750,104 @@ class MainWindow(QMainWindow):
     def _start_update(self, dialog: QDialog):
         dialog.accept()
 
-        progress = QProgressDialog("Подготовка обновления...", None, 0, 100, self)
+        if UpdateJob is None:
+            QMessageBox.warning(self, "MVZ", "Модуль обновления (mvz_updater.py) не найден.")
+            return
+        if self._update_job is not None:
+            return
+
+        job = UpdateJob(
+            owner=UPDATE_OWNER,
+            repo=UPDATE_REPO,
+            current_version=APP_VERSION,
+            manifest_name=UPDATE_MANIFEST_ASSET,
+            user_agent=UPDATE_USER_AGENT,
+            allow_internal=True,
+            sources=self._extra_update_sources() + [GitHubSource(UPDATE_OWNER, UPDATE_REPO)],
+        )
+        job.signals.finished.connect(self._on_update_finished)
+        self._run_update_job(job, "Подготовка обновления...")
+
+    def _run_update_job(self, job, text: str):
+        progress = QProgressDialog(text, "Отмена", 0, 100, self)
         progress.setWindowTitle("MVZ Update")
         progress.setWindowModality(Qt.WindowModal)
         progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
         progress.setValue(0)
+
+        job.setAutoDelete(False)
+        job.signals.progress.connect(self._on_update_progress)
+        job.signals.stop_requested.connect(self._on_update_stop_requested)
+        job.signals.failed.connect(self._on_update_failed)
+        job.signals.cancelled.connect(self._on_update_cancelled)
+        progress.canceled.connect(job.cancel)
+
+        self._update_job = job
+        self._update_progress = progress
         progress.show()
+        QThreadPool.globalInstance().start(job)
 
-        try:
-            self._download_and_update_v2(progress)
-        except Exception as e:
-            progress.close()
-            QMessageBox.critical(self, "MVZ", f"Ошибка обновления:\n{e}")
+    def _close_update_progress(self):
+        self._update_job = None
+        if self._update_progress is not None:
+            self._update_progress.close()
+            self._update_progress = None
 
-    def _download_and_update_v2(self, progress_dialog: QProgressDialog):
-        if apply_update_from_release is None:
-            progress_dialog.close()
-            QMessageBox.warning(self, "MVZ", "Модуль обновления (mvz_updater.py) не найден.")
+    def _on_update_progress(self, st):
+        dlg = self._update_progress
+        if dlg is None:
             return
 
-        def progress_cb(label: str, percent: int):
-            try:
-                progress_dialog.setLabelText(label)
-                progress_dialog.setValue(max(0, min(100, int(percent))))
-                QApplication.processEvents()
-            except Exception:
-                pass
+        text = f"{UPDATE_STAGE_TITLES.get(st.stage, st.stage)}: {st.label}"
+        details = []
+        if st.bytes_done:
+            size = format_bytes(st.bytes_done)
+            if st.bytes_total:
+                size += f" / {format_bytes(st.bytes_total)}"
+            details.append(size)
+        if st.rate:
+            details.append(f"{format_bytes(st.rate)}/s")
+        if st.eta:
+            details.append(f"осталось ~{datetime.timedelta(seconds=int(st.eta))}")
+        details.append(f"{st.elapsed:.1f} с")
+        dlg.setLabelText(text + "\n" + " · ".join(details))
+        dlg.setValue(st.percent)
+
+        if st.stage == "apply":
+            # файлы уже заменяются — отмена больше невозможна
+            dlg.setCancelButton(None)
+
+    def _on_update_stop_requested(self):
+        try:
+            self.stop_winws()
+        except Exception:
+            pass
+        finally:
+            if self._update_job is not None:
+                self._update_job.ack_stop()
 
-        def stop_bin_cb():
-            try:
-                self.stop_winws()
-            except Exception:
-                pass
+    def _on_update_cancelled(self, stage: str):
+        self._close_update_progress()
+        self.append_log(f"[Update] Отменено на стадии {stage!r}; файлы приложения не изменены.")
 
-        res = apply_update_from_release(
-            owner=UPDATE_OWNER,
-            repo=UPDATE_REPO,
-            current_version=APP_VERSION,
-            manifest_name=UPDATE_MANIFEST_ASSET,
-            user_agent=UPDATE_USER_AGENT,
-            allow_internal=True,
-            progress=progress_cb,
-            stop_bin_cb=stop_bin_cb,
-            settings=self.settings,
-        )
+    def _on_update_failed(self, message: str):
+        self._close_update_progress()
+        self.append_log(f"[Update] Ошибка обновления: {message}")
+        QMessageBox.critical(self, "MVZ", f"Ошибка обновления:\n{message}")
 
-        progress_dialog.close()
+    def _on_update_finished(self, res):
+        self._close_update_progress()
+
+        new_ver = getattr(res, 'new_version', '') or ''
+        if new_ver and self._version_tuple(new_ver) > self._version_tuple(APP_VERSION):
+            self.settings.setValue("last_release_tag", new_ver)
 
         if getattr(res, 'updated_any', False):
             try:
                 changed = getattr(res, 'changed_files', [])
-                new_ver = getattr(res, 'new_version', '?')
-                self.append_log(f"[Update] Обновлено файлов: {len(changed)}; новая версия: {new_ver}")
+                self.append_log(f"[Update] Обновлено файлов: {len(changed)}; новая версия: {new_ver or '?'}")
             except Exception:
                 self.append_log("[Update] Обновление применено")
         else:
@@ -1689,6 +1869,167 @@ class MainWindow(QMainWindow):
 
 
 
+    def update_lists(self):
+        if ListUpdateTask is None:
+            self.append_log(f"[Lists] updater import failed: {_UPDATER_IMPORT_ERROR}")
+            return
+        if self._list_update_task is not None:
+            return
+        # списки не подписываются, их проверяет сам ListUpdater — ключ релизов для них не нужен
+        updater = ListUpdater(
+            os.path.join(app_dir(), "lists"), os.path.join(app_dir(), LIST_STATE_NAME), UPDATE_USER_AGENT,
+            fetch=list_fetcher(self._configured_sources(), UPDATE_USER_AGENT),
+        )
+        task = ListUpdateTask(updater)
+        task.setAutoDelete(False)
+        task.signals.finished.connect(self._on_lists_updated)
+        self._list_update_task = task
+        self.update_lists_btn.setEnabled(False)
+        self.append_log("[Lists] Обновление списков...")
+        QThreadPool.globalInstance().start(task)
+
+    def _on_lists_updated(self, results):
+        self._list_update_task = None
+        self.update_lists_btn.setEnabled(True)
+        texts = {
+            "not-modified": "не изменился (304)",
+            "same": "без изменений по содержимому",
+            "updated": "обновлён",
+            "stored": "обновлён .backup (ipset сейчас выключен)",
+        }
+        for r in results:
+            if r.status == "failed":
+                self.append_log(f"[Lists] {r.name}: ошибка, файл не тронут: {r.error}")
+                continue
+            msg = f"[Lists] {r.name}: {texts.get(r.status, r.status)}"
+            if r.lines:
+                msg += f", записей {r.lines}" + (f", отброшено строк {r.invalid}" if r.invalid else "")
+            if r.source:
+                msg += f", источник {r.source}"
+            self.append_log(msg)
+        if any(r.changed for r in results) and self.supervisor.is_running():
+            self.append_log("[Lists] Списки изменились — перезапуск winws")
+            self._swap_winws()
+
+    # ---------- Hot reload ----------
+    @staticmethod
+    def _current_lists_key(plan) -> tuple:
+        out: list = [tuple(plan.argv)]
+        for p in referenced_lists(plan.args):
+            try:
+                st = os.stat(p)
+                out.append((p, st.st_mtime_ns, st.st_size))
+            except OSError:
+                out.append((p, -1, -1))
+        return tuple(out)
+
+    def on_toggle_hot_reload(self, enabled: bool):
+        self.settings.setValue("lists_hot_reload", enabled)
+        if enabled and not self.list_watcher.running:
+            try:
+                self.list_watcher.start()
+            except OSError as e:
+                self.append_log(f"[Lists] слежение за списками недоступно: {e}")
+                return
+            self.append_log(f"[Lists] слежение за списками: {self.list_watcher.backend}")
+        elif not enabled and self.list_watcher.running:
+            self.list_watcher.stop()
+
+    def _on_lists_changed(self, names: list):
+        self.append_log(f"[Lists] изменены: {', '.join(names)}")
+        if not self.supervisor.is_running():
+            self.append_log("[Lists] winws не запущен — изменения применятся при запуске")
+            return
+        self._swap_winws()
+
+    def _swap_winws(self, note: str = "Списки применены"):
+        """Подменить работающий winws планом выбранного профиля, если изменились argv или списки."""
+        if self._swap_busy:
+            self._reload_pending = note
+            return
+        try:
+            plan, _ = self.profiles.plan(self.profile_id)
+        except Exception as e:
+            self.append_log(f"[MVZ] не удалось разобрать профиль: {e}")
+            return
+        key = self._current_lists_key(plan)
+        if key == self._lists_key:
+            # изменились файлы, которых этот профиль не использует, или уже применено
+            return
+        args, notes = self.list_compiler.apply(plan.args)
+        for line in notes:
+            self.append_log(f"[MVZ] Списки: {line}")
+        self._swap_busy = True
+        self._swap_lists_key = key
+        self._swap_note = note
+        self.supervisor.swap_async([plan.exe] + args, cwd=plan.workdir)
+
+    def _finish_swap(self):
+        self._swap_busy = False
+        if self._reload_pending is not None:
+            note, self._reload_pending = self._reload_pending, None
+            self._swap_winws(note)
+
+    def _on_winws_swapped(self, res):
+        if not self.detached_running:
+            # пока новый поднимался, обход остановили
+            self.supervisor.stop_pid(res.pid)
+            self._swap_busy = False
+            # отложенная перезагрузка остановленному обходу не нужна
+            self._reload_pending = None
+            return
+        self.winws_pid = res.pid
+        self._winws_launch_time = time.monotonic()
+        self._lists_key = self._swap_lists_key
+        self.append_log(
+            f"[MVZ] {self._swap_note} без остановки: новый winws готов за {res.ready * 1000:.0f} мс, "
+            f"прежний остановлен через {res.total * 1000:.0f} мс"
+        )
+        self._boost_winws_priority()
+        self._finish_swap()
+
+    def _on_winws_swap_failed(self, err: str):
+        self.append_log(f"[MVZ] Новый winws не поднялся, работает прежний: {err}")
+        self._finish_swap()
+
+    def rollback_update(self):
+        if UpdateJob is None or rollback_last_update is None:
+            QMessageBox.warning(self, "MVZ", "Модуль обновления (mvz_updater.py) не найден.")
+            return
+        if self._update_job is not None:
+            return
+
+        snap = ObjectStore(os.path.join(app_dir(), OBJECTS_DIR_NAME)).last_snapshot()
+        if snap is None:
+            QMessageBox.information(self, "MVZ", "Нет сохранённой версии для отката.")
+            return
+
+        ver = snap.get("version") or "?"
+        ans = QMessageBox.question(
+            self, "MVZ",
+            f"Вернуть файлы MVZ к версии {ver} ({len(snap['files'])} файлов)?\n"
+            "Откат выполняется из локальной копии, без интернета.",
+        )
+        if ans != QMessageBox.Yes:
+            return
+
+        job = UpdateJob(target=rollback_last_update, allow_internal=True)
+        job.signals.finished.connect(self._on_rollback_finished)
+        self._run_update_job(job, "Подготовка отката...")
+
+    def _on_rollback_finished(self, res):
+        self._close_update_progress()
+        ver = getattr(res, "new_version", "") or "?"
+        self.append_log(f"[Update] Откат к {ver}: файлов {len(getattr(res, 'changed_files', []))}")
+
+        if getattr(res, "restarted", False):
+            self._really_quit = True
+            self.append_log("[Update] Перезапуск для отката...")
+            QApplication.quit()
+            return
+
+        QMessageBox.information(self, "MVZ", f"Файлы возвращены к версии {ver}.\nПерезапустите MVZ.")
+
     # ---------- Autostart (HKCU Run) ----------
     def _base_autostart_command(self) -> str:
         """
@@ -1833,6 +2174,9 @@ class MainWindow(QMainWindow):
             if self.discord_rpc and hasattr(self.discord_rpc, "disconnect"):
                 self.discord_rpc.disconnect()
             self._enable_hires_timer(False)
+            if self._lan_server is not None:
+                self._lan_server.stop()
+            self.list_watcher.stop()
         except Exception:
             pass
         QApplication.quit()
@@ -1848,6 +2192,9 @@ class MainWindow(QMainWindow):
             if self.discord_rpc and hasattr(self.discord_rpc, "disconnect"):
                 self.discord_rpc.disconnect()
             self._enable_hires_timer(False)
+            if self._lan_server is not None:
+                self._lan_server.stop()
+            self.list_watcher.stop()
         except Exception:
             pass
 
@@ -1,23 +1,46 @@
 from __future__ import annotations
 
+import io
+import abc
 import os
 import sys
 import json
+import bisect
+import struct
 import time
 import ssl
 import hashlib
 import shutil
 import tempfile
 import zipfile
+import socket
+import threading
 import subprocess
+import http.client
+import contextlib
 from pathlib import PurePosixPath
 from dataclasses import dataclass
 from typing import Optional, Callable, Any
 
+import urllib.parse
 import urllib.request
 import urllib.error
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures import wait as futures_wait
+
+from core.hashing import HASH_CACHE_NAME, HASH_CHUNK, FileCb, HashCache, hash_files, sha256_file
+from core.object_store import OBJECTS_DIR_NAME, ObjectStore
+from core import binpatch
+from core.manifest_sig import SIG_SUFFIX, check_signature
+from core.lan_cache import LAN_PORT, discover as lan_discover, save_release
 
 ProgressCb = Callable[[str, int], None]
+BytesCb = Callable[[int, int], None]
+
+# Стадии обновления по порядку. До "apply" установка не трогается,
+# поэтому отмена на любой из предыдущих стадий безопасна.
+STAGES = ("release", "manifest", "diff", "download", "verify", "stage", "apply")
 
 
 @dataclass
@@ -28,8 +51,39 @@ class UpdateResult:
     new_version: str
 
 
+@dataclass
+class StageProgress:
+    stage: str
+    label: str
+    percent: int
+    elapsed: float
+    bytes_done: int = 0
+    bytes_total: int = 0
+    rate: float = 0.0  # байт/с
+    eta: float = 0.0   # сек до конца загрузки (0 — неизвестно)
+
+
+StageCb = Callable[[StageProgress], None]
+
+
+class UpdateCancelled(Exception):
+    pass
+
+
 LOG_PATH = os.path.join(tempfile.gettempdir(), "mvz_updater.log")
 
+STAGE_DIR_NAME = "mvz_update_stage"
+
+# Открытые ключи Ed25519 (hex), которыми подписываются манифесты релизов
+# (make_release.py --gen-key / --sign-key). TLS у нас не проверяется, поэтому
+# подписанный манифест — единственная опора: sha256 из него проверяют каждый
+# файл. С ключом манифест без подписи или с неверной подписью отвергается.
+# Пока список пуст, без подписи принимается только манифест релиза GitHub
+# (с записью в лог); зеркала, папки и соседи по LAN (requires_signature)
+# без ключа не принимаются вовсе: любой в сети мог бы отдать свой манифест.
+# Несколько ключей — на время смены ключа.
+MANIFEST_PUBLIC_KEYS: tuple[str, ...] = ()
+
 
 def _log(msg: str) -> None:
     try:
@@ -40,6 +94,87 @@ def _log(msg: str) -> None:
         pass
 
 
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+class _StageTracker:
+    """Учёт стадий: прогресс, тайминги, скорость и точки отмены."""
+
+    def __init__(self, progress: Optional[ProgressCb], on_stage: Optional[StageCb],
+                 cancel: Optional[threading.Event]):
+        self.progress = progress
+        self.on_stage = on_stage
+        self.cancel = cancel
+        self.stage = ""
+        self.cancellable = True
+        self._t0 = 0.0
+        self._bytes = 0
+        self.timings: dict[str, float] = {}
+
+    def check(self) -> None:
+        if self.cancellable and self.cancel is not None and self.cancel.is_set():
+            raise UpdateCancelled(self.stage)
+
+    def begin(self, stage: str, cancellable: bool = True) -> None:
+        self.check()
+        self.stage = stage
+        self.cancellable = cancellable
+        self._t0 = time.monotonic()
+        self._bytes = 0
+        self.report(stage, 0)
+
+    def end(self) -> None:
+        dt = time.monotonic() - self._t0
+        self.timings[self.stage] = dt
+        msg = f"[Update] stage {self.stage}: {dt:.2f} s"
+        if self._bytes:
+            msg += f", {format_bytes(self._bytes)}, {format_bytes(self._bytes / max(dt, 1e-6))}/s"
+        _log(msg)
+
+    def report(self, label: str, percent: int, done: int = 0, total: int = 0,
+               rate: Optional[float] = None) -> None:
+        self.check()
+        percent = max(0, min(100, int(percent)))
+        if done:
+            self._bytes = done
+        if self.progress:
+            self.progress(label, percent)
+        if self.on_stage:
+            elapsed = time.monotonic() - self._t0
+            if rate is None:
+                rate = (done / elapsed) if done and elapsed > 0 else 0.0
+            eta = (total - done) / rate if rate > 0 and total > done else 0.0
+            self.on_stage(StageProgress(
+                stage=self.stage, label=label, percent=percent, elapsed=elapsed,
+                bytes_done=done, bytes_total=total, rate=rate, eta=eta,
+            ))
+
+    def bytes_cb(self, label: str) -> BytesCb:
+        last = [0.0]
+        first: list = []
+
+        def cb(done: int, total: int) -> None:
+            # не чаще 10 раз в секунду, иначе GUI захлебнётся сигналами
+            now = time.monotonic()
+            if not first:
+                # при докачке done начинается не с нуля: скорость считаем от первого отсчёта
+                first.extend((now, done))
+            if now - last[0] < 0.1 and done != total:
+                self.check()
+                return
+            last[0] = now
+            pct = int(done * 100 / total) if total > 0 else 0
+            dt = now - first[0]
+            rate = (done - first[1]) / dt if dt > 0 else 0.0
+            self.report(label, pct, done, total, rate=rate)
+        return cb
+
+
 # === ПОЛНОЕ ОТКЛЮЧЕНИЕ SSL ПРОВЕРКИ ===
 # Создаём глобальный контекст БЕЗ проверки сертификатов
 _SSL_CONTEXT = ssl._create_unverified_context()
@@ -64,12 +199,15 @@ def _safe_rel_path(rel: str) -> str:
     return str(p)
 
 
-def sha256_file(path: str) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+def move_replace(src: str, dst: str) -> None:
+    """Переименовать src в dst (тот же том — без копирования); иначе atomic_copy_replace."""
+    dst_dir = os.path.dirname(dst)
+    if dst_dir:
+        os.makedirs(dst_dir, exist_ok=True)
+    try:
+        os.replace(src, dst)
+    except OSError:
+        atomic_copy_replace(src, dst)
 
 
 def atomic_copy_replace(src: str, dst: str) -> None:
@@ -96,6 +234,40 @@ def http_get_json(url: str, user_agent: str, timeout: int = 15) -> dict:
         return json.loads(r.read().decode("utf-8", errors="replace"))
 
 
+@dataclass
+class ReleaseCheck:
+    # True — сервер ответил 304, release не передавался (берите закэшированное)
+    not_modified: bool
+    release: Optional[dict]
+    etag: str
+    last_modified: str
+
+
+def check_latest_release(
+        url: str, user_agent: str, etag: str = "", last_modified: str = "", timeout: int = 10
+) -> ReleaseCheck:
+    """Условный GET releases/latest: при неизменном релизе — 304 без тела и без разбора JSON."""
+    headers = {"User-Agent": user_agent, "Accept": "application/vnd.github+json"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with _urlopen(req, timeout=timeout) as r:
+            data = json.loads(r.read().decode("utf-8", errors="replace"))
+            return ReleaseCheck(
+                not_modified=False,
+                release=data if isinstance(data, dict) else {},
+                etag=r.headers.get("ETag", "") or "",
+                last_modified=r.headers.get("Last-Modified", "") or "",
+            )
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return ReleaseCheck(True, None, etag, last_modified)
+        raise
+
+
 def find_asset_url(release: dict, asset_name: str) -> Optional[str]:
     for a in release.get("assets", []) or []:
         if a.get("name") == asset_name:
@@ -103,33 +275,173 @@ def find_asset_url(release: dict, asset_name: str) -> Optional[str]:
     return None
 
 
+DOWNLOAD_CHUNK = 1024 * 256
+RETRYABLE_HTTP = {408, 429, 500, 502, 503, 504}
+
+
+def _read_part_meta(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            m = json.load(f)
+        return m if isinstance(m, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_part_meta(path: str, meta: dict) -> None:
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except OSError:
+        pass
+
+
+def _remove_quiet(*paths: str) -> None:
+    for p in paths:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def _content_range_total(value: str) -> int:
+    # "bytes 100-999/1000" -> 1000
+    try:
+        total = value.rsplit("/", 1)[1].strip()
+        return int(total) if total != "*" else 0
+    except (IndexError, ValueError):
+        return 0
+
+
+def _backoff(attempt: int, retries: int, label: str, err: str,
+             cancel: Optional[threading.Event]) -> None:
+    delay = min(30.0, 2.0 ** (attempt - 1))
+    _log(f"[Update] download {label}: {err}; retry {attempt}/{retries} in {delay:.0f}s")
+    if cancel is not None:
+        if cancel.wait(delay):
+            raise UpdateCancelled(label)
+    else:
+        time.sleep(delay)
+
+
 def download_url_to_file(
         url: str, dst_path: str, user_agent: str, timeout: int = 120,
-        progress: Optional[ProgressCb] = None, label: str = ""
+        progress: Optional[ProgressCb] = None, label: str = "",
+        on_bytes: Optional[BytesCb] = None, cancel: Optional[threading.Event] = None,
+        expected_sha256: str = "", retries: int = 5, resume: bool = True,
 ) -> None:
-    req = urllib.request.Request(url, headers={"User-Agent": user_agent})
-    with _urlopen(req, timeout=timeout) as response:
-        total = int(response.headers.get("Content-Length", 0) or 0)
-        downloaded = 0
-        if progress:
-            progress(label, 0)
+    """
+    Загрузка с докачкой: данные пишутся в dst_path + ".part", рядом в ".part.json"
+    хранятся url и ETag/Last-Modified. После обрыва запрос повторяется с
+    Range + If-Range (сервер пришлёт 200 и полный файл, если тот изменился).
+    Повторы — с экспоненциальной задержкой. expected_sha256 проверяется до
+    переименования .part в dst_path.
+    """
+    part = dst_path + ".part"
+    meta_path = part + ".json"
+
+    dst_dir = os.path.dirname(dst_path)
+    if dst_dir:
+        os.makedirs(dst_dir, exist_ok=True)
 
-        dst_dir = os.path.dirname(dst_path)
-        if dst_dir:
-            os.makedirs(dst_dir, exist_ok=True)
+    meta = _read_part_meta(meta_path) if resume else {}
+    if meta.get("url") != url:
+        _remove_quiet(part, meta_path)
+        meta = {}
+
+    if progress:
+        progress(label, 0)
+
+    attempt = 0
+    best = 0
+    while True:
+        if cancel is not None and cancel.is_set():
+            raise UpdateCancelled(label)
+
+        have = os.path.getsize(part) if os.path.isfile(part) else 0
+        validator = meta.get("etag") or meta.get("last_modified") or ""
+        headers = {"User-Agent": user_agent}
+        if resume and have > 0 and validator:
+            headers["Range"] = f"bytes={have}-"
+            headers["If-Range"] = validator
+        else:
+            have = 0
 
-        with open(dst_path, "wb") as f:
-            while True:
-                chunk = response.read(1024 * 256)
-                if not chunk:
+        try:
+            req = urllib.request.Request(url, headers=headers)
+            with _urlopen(req, timeout=timeout) as response:
+                length = int(response.headers.get("Content-Length", 0) or 0)
+                if response.status == 206 and have:
+                    total = _content_range_total(response.headers.get("Content-Range", "")) or (have + length)
+                    mode = "ab"
+                    _log(f"[Update] download {label}: resume from {have}/{total}")
+                else:
+                    have = 0
+                    total = length
+                    mode = "wb"
+                    meta = {
+                        "url": url,
+                        "etag": response.headers.get("ETag", "") or "",
+                        "last_modified": response.headers.get("Last-Modified", "") or "",
+                        "total": total,
+                    }
+                    _write_part_meta(meta_path, meta)
+
+                downloaded = have
+                with open(part, mode) as f:
+                    while True:
+                        if cancel is not None and cancel.is_set():
+                            raise UpdateCancelled(label)
+                        chunk = response.read(DOWNLOAD_CHUNK)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        if progress and total > 0:
+                            pct = int((downloaded / total) * 100)
+                            progress(label, max(0, min(100, pct)))
+                        if on_bytes:
+                            on_bytes(downloaded, total)
+
+            if total and downloaded < total:
+                raise ConnectionError(f"connection dropped at {downloaded}/{total}")
+            break
+
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and have:
+                # .part уже целиком скачан или устарел
+                if meta.get("total") and have == meta["total"]:
                     break
-                f.write(chunk)
-                downloaded += len(chunk)
-                if progress and total > 0:
-                    pct = int((downloaded / total) * 100)
-                    progress(label, max(0, min(100, pct)))
-        if progress:
-            progress(label, 100)
+                _remove_quiet(part, meta_path)
+                meta = {}
+                continue
+            if e.code not in RETRYABLE_HTTP or attempt >= retries:
+                raise
+            err = f"HTTP {e.code}"
+        except (urllib.error.URLError, http.client.HTTPException, socket.timeout,
+                ConnectionError, TimeoutError) as e:
+            if attempt >= retries:
+                raise
+            err = repr(e)
+
+        have = os.path.getsize(part) if os.path.isfile(part) else 0
+        if have > best:
+            # обрыв после реальной докачки — не повод исчерпывать попытки
+            best = have
+            attempt = 0
+        attempt += 1
+        _backoff(attempt, retries, label, err, cancel)
+
+    if expected_sha256:
+        got = sha256_file(part).lower()
+        if got != expected_sha256.lower().strip():
+            _remove_quiet(part, meta_path)
+            raise ValueError(f"{label or os.path.basename(dst_path)}: sha256 mismatch ({got})")
+
+    os.replace(part, dst_path)
+    _remove_quiet(meta_path)
+    if progress:
+        progress(label, 100)
 
 
 def load_manifest(path: str) -> dict:
@@ -144,6 +456,31 @@ def load_manifest(path: str) -> dict:
     return m
 
 
+def verify_manifest_signature(manifest_path: str, sig_path: Optional[str],
+                              keys: "Optional[tuple[str, ...]]" = None, required: bool = False) -> bool:
+    """
+    Проверить подпись манифеста до того, как верить хоть одному sha256 из него.
+    True — подпись проверена, False — ключи не заданы и проверять нечем
+    (только если required=False). ValueError — подписи нет, она не сходится
+    или подпись обязательна, а ключей нет.
+    """
+    keys = MANIFEST_PUBLIC_KEYS if keys is None else keys
+    if not keys:
+        if required:
+            raise ValueError("manifest.json: signature required for this source, but no public key configured")
+        _log("[Update] manifest signature not checked: no public key configured")
+        return False
+    if not sig_path:
+        raise ValueError("manifest.json: signature missing")
+    with open(manifest_path, "rb") as f:
+        data = f.read()
+    with open(sig_path, "r", encoding="utf-8", errors="replace") as f:
+        sig_text = f.read()
+    key = check_signature(data, sig_text, keys)
+    _log(f"[Update] manifest signature ok (key {key[:16]})")
+    return True
+
+
 def _dedupe_keep_order(items: list[str]) -> list[str]:
     out, seen = [], set()
     for x in items:
@@ -153,8 +490,16 @@ def _dedupe_keep_order(items: list[str]) -> list[str]:
     return out
 
 
-def compute_changed_files(manifest: dict, base_dir: str) -> list[str]:
-    changed = []
+def compute_changed_files(
+        manifest: dict, base_dir: str, hash_cache: Optional[HashCache] = None,
+        workers: Optional[int] = None, on_file: Optional[FileCb] = None,
+) -> list[str]:
+    """
+    Файлы из manifest, которых нет локально или чей sha256 отличается.
+    С hash_cache неизменившиеся файлы не перечитываются — хватает stat();
+    остальные хешируются параллельно (workers потоков).
+    """
+    entries = []
     for item in manifest.get("files", []) or []:
         if not isinstance(item, dict):
             continue
@@ -163,15 +508,14 @@ def compute_changed_files(manifest: dict, base_dir: str) -> list[str]:
         if not rel or not sha:
             continue
         rel = _safe_rel_path(rel)
-        local = os.path.join(base_dir, rel)
-        if not os.path.isfile(local):
-            changed.append(rel)
-            continue
-        try:
-            if sha256_file(local).lower() != sha:
-                changed.append(rel)
-        except:
-            changed.append(rel)
+        entries.append((rel, sha, os.path.join(base_dir, rel)))
+
+    present = [e for e in entries if os.path.isfile(e[2])]
+    hashes = hash_files([e[2] for e in present], workers=workers, cache=hash_cache,
+                        missing_ok=True, on_file=on_file)
+    got = {e[0]: h for e, h in zip(present, hashes)}
+
+    changed = [rel for rel, sha, _ in entries if got.get(rel) != sha]
     return _dedupe_keep_order(changed)
 
 
@@ -187,20 +531,419 @@ def compute_delete_files(manifest: dict, base_dir: str) -> list[str]:
     return _dedupe_keep_order(deleted)
 
 
-def extract_needed_from_zip(zip_path: str, needed_paths: list[str], out_dir: str) -> None:
-    os.makedirs(out_dir, exist_ok=True)
+def _zip_member_name(names: set[str], rel: str) -> str:
+    if rel in names:
+        return rel
+    if ("./" + rel) in names:
+        return "./" + rel
+    raise RuntimeError(f"update.zip missing file: {rel}")
+
+
+# --- дельта-загрузка: только нужные файлы из update.zip через HTTP Range ---
+
+# хвост архива с End of Central Directory (+ максимальный комментарий)
+ZIP_TAIL_BYTES = 65536 + 22
+# соседние диапазоны с зазором меньше этого качаем одним запросом
+DELTA_MERGE_GAP = 64 * 1024
+DELTA_MAX_REQUESTS = 32
+# если нужна бОльшая доля архива — выгоднее обычная (докачиваемая) загрузка
+DELTA_MAX_SHARE = 0.5
+
+
+class DeltaUnavailable(Exception):
+    """Сервер/архив не позволяют дельта-загрузку — нужен полный update.zip."""
+
+
+class _SegmentFile(io.RawIOBase):
+    """
+    Удалённый архив «с дырами»: скачанные диапазоны лежат подряд в локальном
+    файле, segments = [(смещение в архиве, смещение в файле, длина)].
+    Чтение недокачанного места — OSError.
+    """
+
+    def __init__(self, path: str, size: int, segments: list[tuple[int, int, int]]):
+        super().__init__()
+        self._f = open(path, "rb")
+        self._size = size
+        self._segs = sorted(segments)
+        self._starts = [s[0] for s in self._segs]
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"bad whence: {whence}")
+        if pos < 0:
+            raise OSError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b) -> int:
+        view = memoryview(b)
+        want = min(len(view), self._size - self._pos)
+        filled = 0
+        while filled < want:
+            i = bisect.bisect_right(self._starts, self._pos) - 1
+            off = self._pos - self._segs[i][0] if i >= 0 else -1
+            if i < 0 or off >= self._segs[i][2]:
+                if filled:
+                    break
+                raise OSError(f"delta package: offset {self._pos} was not downloaded")
+            _, local, length = self._segs[i]
+            n = min(want - filled, length - off)
+            self._f.seek(local + off)
+            got = self._f.readinto(view[filled:filled + n])
+            if not got:
+                break
+            filled += got
+            self._pos += got
+        return filled
+
+    def close(self) -> None:
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+@dataclass
+class DeltaPackage:
+    """Нужные члены update.zip + его central directory, скачанные по Range."""
+    path: str
+    size: int
+    segments: list[tuple[int, int, int]]
+
+    def open(self) -> _SegmentFile:
+        return _SegmentFile(self.path, self.size, self.segments)
+
+
+@contextlib.contextmanager
+def _open_package(src: "str | DeltaPackage"):
+    if isinstance(src, DeltaPackage):
+        with src.open() as f, zipfile.ZipFile(f, "r") as z:
+            yield z
+    else:
+        with zipfile.ZipFile(src, "r") as z:
+            yield z
+
+
+def _merge_ranges(ranges: list[tuple[int, int]], gap: int, max_count: int) -> list[tuple[int, int]]:
+    runs: list[list[int]] = []
+    for a, b in sorted(ranges):
+        if runs and a - runs[-1][1] <= gap:
+            runs[-1][1] = max(runs[-1][1], b)
+        else:
+            runs.append([a, b])
+    while len(runs) > max_count:
+        # склеиваем по самому маленькому зазору, пока запросов не станет достаточно мало
+        i = min(range(len(runs) - 1), key=lambda k: runs[k + 1][0] - runs[k][1])
+        runs[i][1] = runs[i + 1][1]
+        del runs[i + 1]
+    return [(a, b) for a, b in runs]
+
+
+def _fetch_range(
+        url: str, start: int, end: int, out, user_agent: str, validator: str, timeout: int,
+        label: str, on_chunk: Optional[Callable[[int], None]], cancel: Optional[threading.Event],
+        retries: int,
+) -> None:
+    """Дописать в out байты [start, end) удалённого файла; обрывы докачиваются."""
+    pos = start
+    attempt = 0
+    while pos < end:
+        if cancel is not None and cancel.is_set():
+            raise UpdateCancelled(label)
+        headers = {"User-Agent": user_agent, "Range": f"bytes={pos}-{end - 1}"}
+        if validator:
+            headers["If-Range"] = validator
+        got = 0
+        try:
+            req = urllib.request.Request(url, headers=headers)
+            with _urlopen(req, timeout=timeout) as r:
+                cr = r.headers.get("Content-Range", "") or ""
+                if r.status != 206 or not cr.startswith(f"bytes {pos}-"):
+                    # 200 — сервер игнорирует Range или архив сменился (If-Range)
+                    raise DeltaUnavailable(f"range request answered {r.status} {cr!r}")
+                while pos < end:
+                    if cancel is not None and cancel.is_set():
+                        raise UpdateCancelled(label)
+                    chunk = r.read(min(DOWNLOAD_CHUNK, end - pos))
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    pos += len(chunk)
+                    got += len(chunk)
+                    if on_chunk:
+                        on_chunk(len(chunk))
+            if pos < end:
+                raise ConnectionError(f"connection dropped at {pos}/{end}")
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRYABLE_HTTP:
+                raise DeltaUnavailable(f"HTTP {e.code}")
+            if attempt >= retries:
+                raise
+            err = f"HTTP {e.code}"
+        except (urllib.error.URLError, http.client.HTTPException, socket.timeout,
+                ConnectionError, TimeoutError) as e:
+            if attempt >= retries:
+                raise
+            err = repr(e)
+        else:
+            continue
+        if got:
+            attempt = 0
+        attempt += 1
+        _backoff(attempt, retries, label, err, cancel)
+
+
+def download_zip_members(
+        url: str, needed_paths: list[str], dst_path: str, user_agent: str, timeout: int = 120,
+        label: str = "", on_bytes: Optional[BytesCb] = None, cancel: Optional[threading.Event] = None,
+        retries: int = 5, max_share: float = DELTA_MAX_SHARE, expected_size: int = 0,
+) -> DeltaPackage:
+    """
+    Скачать из удалённого zip только central directory и нужные члены.
+    Сначала запрашивается хвост архива (EOCD), по central directory
+    вычисляются диапазоны членов, близкие склеиваются в один запрос.
+    DeltaUnavailable — если сервер не умеет Range, архив zip64 или
+    дельта вышла бы больше max_share от размера архива, а также если
+    размер архива не совпал с expected_size из манифеста (зеркало отдаёт
+    другой пакет — его sha256 проверит только полное скачивание).
+    """
     needed_paths = [_safe_rel_path(p) for p in needed_paths]
-    with zipfile.ZipFile(zip_path, "r") as z:
+
+    # --- хвост: EOCD и (обычно) весь central directory ---
+    req = urllib.request.Request(url, headers={"User-Agent": user_agent, "Range": f"bytes=-{ZIP_TAIL_BYTES}"})
+    try:
+        with _urlopen(req, timeout=timeout) as r:
+            if r.status != 206:
+                raise DeltaUnavailable(f"no range support (HTTP {r.status})")
+            total = _content_range_total(r.headers.get("Content-Range", "") or "")
+            if not total:
+                raise DeltaUnavailable("no Content-Range total")
+            if expected_size and total != expected_size:
+                raise DeltaUnavailable(f"package size {total} != {expected_size} from manifest")
+            validator = r.headers.get("ETag", "") or r.headers.get("Last-Modified", "") or ""
+            # подписанные ссылки CDN живут минуты — на время дельты их хватает с запасом
+            url = r.geturl() or url
+            tail = r.read()
+    except urllib.error.HTTPError as e:
+        raise DeltaUnavailable(f"HTTP {e.code}") from e
+    except (urllib.error.URLError, http.client.HTTPException, socket.timeout,
+            ConnectionError, TimeoutError) as e:
+        raise DeltaUnavailable(repr(e)) from e
+
+    tail_start = total - len(tail)
+    eocd = tail.rfind(b"PK\x05\x06")
+    if eocd < 0 or len(tail) - eocd < 22:
+        raise DeltaUnavailable("end of central directory not found")
+    cd_size, cd_offset = struct.unpack("<LL", tail[eocd + 12:eocd + 20])
+    if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+        raise DeltaUnavailable("zip64 package")
+
+    segments: list[tuple[int, int, int]] = []
+    local = 0
+    fetched = len(tail)
+    # всё от have_from до конца архива уже будет локально
+    have_from = min(cd_offset, tail_start)
+    with open(dst_path, "wb") as out:
+        if cd_offset < tail_start:
+            _fetch_range(url, cd_offset, tail_start, out, user_agent, validator, timeout,
+                         label, None, cancel, retries)
+            segments.append((cd_offset, 0, tail_start - cd_offset))
+            local = tail_start - cd_offset
+            fetched += local
+        out.write(tail)
+        segments.append((tail_start, local, len(tail)))
+        local += len(tail)
+
+    # --- диапазоны нужных членов по central directory ---
+    pkg = DeltaPackage(dst_path, total, list(segments))
+    with _open_package(pkg) as z:
+        infos = z.infolist()
+        names = set(z.namelist())
+        offsets = sorted({i.header_offset for i in infos} | {cd_offset})
+        ranges = []
+        for rel in needed_paths:
+            info = z.getinfo(_zip_member_name(names, rel))
+            # до следующего локального заголовка: заголовок, extra, данные, data descriptor
+            nxt = min(offsets[bisect.bisect_right(offsets, info.header_offset)], have_from)
+            if info.header_offset < nxt:
+                ranges.append((info.header_offset, nxt))
+
+    runs = _merge_ranges(ranges, DELTA_MERGE_GAP, DELTA_MAX_REQUESTS)
+    need = sum(b - a for a, b in runs)
+    if need + fetched > total * max_share:
+        _remove_quiet(dst_path)
+        raise DeltaUnavailable(f"delta {format_bytes(need)} of {format_bytes(total)} is not worth it")
+
+    _log(f"[Update] delta {label}: {len(needed_paths)} files, {len(runs)} requests, "
+         f"{format_bytes(need + fetched)} of {format_bytes(total)}")
+
+    done = [0]
+
+    def on_chunk(n: int) -> None:
+        done[0] += n
+        if on_bytes:
+            on_bytes(done[0], need)
+
+    with open(dst_path, "ab") as out:
+        for a, b in runs:
+            _fetch_range(url, a, b, out, user_agent, validator, timeout, label, on_chunk, cancel, retries)
+            segments.append((a, local, b - a))
+            local += b - a
+
+    return DeltaPackage(dst_path, total, segments)
+
+
+def _manifest_field(manifest: dict, field: str, kind: type) -> dict:
+    out = {}
+    for item in manifest.get("files", []) or []:
+        if isinstance(item, dict) and item.get("path") and isinstance(item.get(field), kind):
+            out[_safe_rel_path(item["path"])] = item[field]
+    return out
+
+
+def verify_zip_members(zip_path: "str | DeltaPackage", needed_paths: list[str], manifest: dict) -> None:
+    """Все нужные файлы есть в архиве и их размер совпадает с manifest."""
+    sizes = _manifest_field(manifest, "size", int)
+    with _open_package(zip_path) as z:
         names = set(z.namelist())
         for rel in needed_paths:
-            real_name = rel if rel in names else ("./" + rel)
-            if real_name not in names and rel not in names:
-                raise RuntimeError(f"update.zip missing file: {rel}")
-            use_name = real_name if real_name in names else rel
+            rel = _safe_rel_path(rel)
+            info = z.getinfo(_zip_member_name(names, rel))
+            want = sizes.get(rel)
+            if want is not None and info.file_size != want:
+                raise RuntimeError(f"update.zip: size mismatch for {rel} ({info.file_size} != {want})")
+
+
+def extract_needed_from_zip(
+        zip_path: "str | DeltaPackage", needed_paths: list[str], out_dir: str,
+        on_file: Optional[Callable[[int, int, str], None]] = None,
+        manifest: Optional[dict] = None,
+) -> None:
+    """
+    Распаковать нужные файлы в out_dir. С manifest каждый файл хешируется
+    прямо при распаковке и отвергается (ValueError), если sha256 не совпал, —
+    до того как что-либо в установке будет заменено.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    needed_paths = [_safe_rel_path(p) for p in needed_paths]
+    expected = _manifest_field(manifest, "sha256", str) if manifest else {}
+    with _open_package(zip_path) as z:
+        names = set(z.namelist())
+        for i, rel in enumerate(needed_paths, 1):
+            use_name = _zip_member_name(names, rel)
             out_path = os.path.join(out_dir, rel)
             os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            h = hashlib.sha256()
             with z.open(use_name, "r") as src, open(out_path, "wb") as dst:
-                shutil.copyfileobj(src, dst)
+                for chunk in iter(lambda: src.read(HASH_CHUNK), b""):
+                    h.update(chunk)
+                    dst.write(chunk)
+            want = (expected.get(rel) or "").lower().strip()
+            if want and h.hexdigest() != want:
+                _remove_quiet(out_path)
+                raise ValueError(f"update.zip: sha256 mismatch for {rel} ({h.hexdigest()})")
+            if on_file:
+                on_file(i, len(needed_paths), rel)
+
+
+def choose_patches(
+        manifest: dict, paths: list[str], base_dir: str,
+        previous: dict[str, Optional[str]], store: Optional[ObjectStore],
+) -> tuple[dict[str, dict], dict[str, str]]:
+    """
+    Для каждого файла из paths — самый дешёвый патч из manifest, база которого
+    есть локально (текущий файл или объект в хранилище) и который меньше
+    сжатого полного файла ("packed"). Возвращает (путь -> патч, sha базы -> файл).
+    """
+    items = {}
+    for item in manifest.get("files", []) or []:
+        if isinstance(item, dict) and item.get("path"):
+            items[_safe_rel_path(item["path"])] = item
+
+    plan: dict[str, dict] = {}
+    bases: dict[str, str] = {}
+    for rel in paths:
+        item = items.get(rel) or {}
+        full_cost = item.get("packed") or item.get("size") or 0
+        best: Optional[dict] = None
+        for pe in item.get("patches") or []:
+            if not isinstance(pe, dict):
+                continue
+            src = str(pe.get("from") or "").lower()
+            size = pe.get("size")
+            path = pe.get("path")
+            if not src or not path or not isinstance(size, int):
+                continue
+            if (full_cost and size >= full_cost) or (best and size >= best["size"]):
+                continue
+            if src not in bases:
+                if store is not None and store.has(src):
+                    bases[src] = store.object_path(src)
+                elif previous.get(rel) == src:
+                    bases[src] = os.path.join(base_dir, rel)
+                else:
+                    continue
+            best = {"from": src, "path": _safe_rel_path(path), "size": size}
+        if best:
+            plan[rel] = best
+    return plan, bases
+
+
+def apply_patches(
+        zip_path: "str | DeltaPackage", plan: dict[str, dict], bases: dict[str, str],
+        manifest: dict, out_dir: str, on_file: Optional[Callable[[int, int, str], None]] = None,
+) -> list[str]:
+    """
+    Собрать файлы plan из локальной базы и патча из архива, сверить с sha256
+    из manifest и записать в out_dir. Возвращает файлы, которые собрать не
+    удалось — их нужно взять целиком.
+    """
+    expected = _manifest_field(manifest, "sha256", str)
+    sizes = _manifest_field(manifest, "size", int)
+    failed = []
+    with _open_package(zip_path) as z:
+        names = set(z.namelist())
+        for i, (rel, pe) in enumerate(plan.items(), 1):
+            try:
+                info = z.getinfo(_zip_member_name(names, pe["path"]))
+                if info.file_size != pe["size"]:
+                    raise ValueError(f"patch size {info.file_size} != {pe['size']}")
+                with open(bases[pe["from"]], "rb") as f:
+                    old = f.read()
+                if rel not in sizes:
+                    raise ValueError("no size in manifest")
+                # размер результата из заголовка патча сверяется с манифестом до распаковки
+                data = binpatch.patch(old, z.read(info), expected_size=sizes[rel])
+                got = hashlib.sha256(data).hexdigest()
+                if got != (expected.get(rel) or "").lower():
+                    raise ValueError(f"sha256 mismatch ({got})")
+            except Exception as e:
+                _log(f"[Update] patch {rel}: {e!r}; falling back to full file")
+                failed.append(rel)
+                continue
+            out_path = os.path.join(out_dir, rel)
+            os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            with open(out_path, "wb") as f:
+                f.write(data)
+            if on_file:
+                on_file(i, len(plan), rel)
+    return failed
 
 
 def needs_deferred(rel: str, exe_name: str, allow_internal: bool) -> bool:
@@ -234,6 +977,13 @@ def build_deferred_bat(
     for rel in deferred_deletes:
         lines.append(f'del /f /q "%APPDIR%\\{rel.replace("/", chr(92))}" >nul 2>nul')
 
+    # Прежние версии лежат в хранилище объектов жёсткими ссылками на эти же файлы.
+    # copy /y и robocopy пишут поверх существующего файла и испортили бы сохранённую
+    # для отката версию, поэтому старый файл сначала удаляется: хранилище сохраняет
+    # свою ссылку, а копия из STAGE становится новым файлом.
+    for rel in deferred_files:
+        lines.append(f'del /f /q "%APPDIR%\\{rel.replace("/", chr(92))}" >nul 2>nul')
+
     if has_internal:
         lines.append(
             'if exist "%STAGE%\\_internal" robocopy "%STAGE%\\_internal" "%APPDIR%\\_internal" /E /NFL /NDL /NJH /NJS /NP >nul')
@@ -263,113 +1013,906 @@ def build_deferred_bat(
     return bat_path
 
 
+def snapshot_to_store(
+        store: ObjectStore, base_dir: str, paths: list[str], hash_cache: Optional[HashCache] = None,
+) -> dict[str, Optional[str]]:
+    """
+    Положить текущие версии paths в хранилище (жёсткими ссылками).
+    Возвращает снимок путь -> sha256; None — файла сейчас нет.
+    """
+    snap: dict[str, Optional[str]] = {}
+    for rel in paths:
+        local = os.path.join(base_dir, rel)
+        if not os.path.isfile(local):
+            snap[rel] = None
+            continue
+        sha = hash_cache.sha256(local) if hash_cache is not None else sha256_file(local).lower()
+        store.add(local, sha)
+        snap[rel] = sha
+    return snap
+
+
+def _apply_staged(
+        job: _StageTracker, base_dir: str, stage_dir: str, files: list[str], deletes: list[str],
+        exe_name: str, allow_internal: bool, stop_bin_cb: Optional[Callable[[], None]],
+) -> bool:
+    """
+    Стадия apply: удалить deletes и поставить files из stage_dir на место.
+    True — часть файлов занята (exe, _internal) и заменится .bat-скриптом после выхода.
+    """
+    if stop_bin_cb:
+        try:
+            stop_bin_cb()
+        except:
+            pass
+
+    imm_del, def_del = [], []
+    for r in deletes:
+        (def_del if needs_deferred(r, exe_name, allow_internal) else imm_del).append(r)
+
+    for r in imm_del:
+        try:
+            t = os.path.join(base_dir, r)
+            (shutil.rmtree(t, ignore_errors=True) if os.path.isdir(t) else os.remove(t))
+        except:
+            pass
+
+    imm_files, def_files = [], []
+    for r in files:
+        (def_files if needs_deferred(r, exe_name, allow_internal) else imm_files).append(r)
+
+    total = max(1, len(imm_files))
+    for i, r in enumerate(imm_files, 1):
+        job.report(f"apply: {r}", int((i / total) * 100))
+        move_replace(os.path.join(stage_dir, r), os.path.join(base_dir, r))
+
+    if def_files or def_del:
+        if not getattr(sys, "frozen", False):
+            raise RuntimeError("Deferred update requires frozen build")
+        bat = build_deferred_bat(base_dir, stage_dir, def_files, def_del, exe_name, allow_internal)
+        subprocess.Popen(["cmd", "/c", bat], creationflags=0x08000000)
+        return True
+    return False
+
+
 def _version_tuple(v: str) -> tuple[int, ...]:
     s = (v or "").strip().lstrip("v").split("-")[0].split("+")[0]
     return tuple(int(p) if p.isdigit() else 0 for p in (s.split(".") + ["0"] * 3)[:3])
 
 
+# === ИСТОЧНИКИ ОБНОВЛЕНИЙ ===
+# Кроме GitHub релиз может лежать на зеркале или у соседа по LAN (HTTP)
+# и в папке (сетевая шара, флешка). Зеркало и папка — это просто содержимое
+# release_out: manifest.json, его .sig и update.zip; версия берётся из
+# манифеста. Доверяем не источнику, а содержимому: манифест проверяется
+# подписью, пакет — package_sha256, каждый файл — sha256 из манифеста.
+
+# через сколько секунд без результата подключать следующий источник
+HEDGE_DELAY = 3.0
+SOURCE_CHECK_TIMEOUT = 10
+# манифест с зеркала читается в память целиком
+MANIFEST_MAX_BYTES = 16 * 1024 * 1024
+
+
+@dataclass
+class Release:
+    source: "UpdateSource"
+    tag: str
+    assets: dict  # имя ассета -> URL или путь
+    body: str = ""
+    # уже прочитанные при проверке ассеты (манифест зеркала): имя -> байты
+    cached: Optional[dict] = None
+
+    def as_github(self) -> dict:
+        """В форме ответа GitHub releases/latest — для кода, который ждёт именно её."""
+        return {
+            "tag_name": self.tag,
+            "body": self.body,
+            "assets": [{"name": n, "browser_download_url": u} for n, u in self.assets.items()],
+        }
+
+
+class UpdateSource(abc.ABC):
+    """Откуда брать релиз. Методы вызываются из рабочих потоков."""
+    kind = ""
+    # отдаёт файлы по sha256 (object_url), а не пакетом
+    content_addressed = False
+    # манифест принимается только с проверенной подписью (см. MANIFEST_PUBLIC_KEYS)
+    requires_signature = True
+
+    def __init__(self, location: str):
+        self.location = location
+
+    def __repr__(self) -> str:
+        return f"{self.kind}:{self.location}"
+
+    @abc.abstractmethod
+    def latest(self, user_agent: str, timeout: int, manifest_name: str) -> Optional[Release]:
+        """Последний релиз источника; None — релиза нет."""
+
+    def fetch(self, release: Release, asset: str, dst: str, user_agent: str, timeout: int = 300,
+              on_bytes: Optional[BytesCb] = None, cancel: Optional[threading.Event] = None,
+              expected_sha256: str = "") -> None:
+        data = (release.cached or {}).get(asset)
+        if data is not None:
+            _write_bytes_checked(data, dst, asset, expected_sha256)
+            return
+        url = release.assets.get(asset)
+        if not url:
+            raise FileNotFoundError(f"{self}: no {asset}")
+        download_url_to_file(url, dst, user_agent, timeout=timeout, label=asset, on_bytes=on_bytes,
+                             cancel=cancel, expected_sha256=expected_sha256)
+
+    def range_url(self, release: Release, asset: str) -> Optional[str]:
+        """URL, по которому можно качать диапазонами (дельта); None — только целиком."""
+        return release.assets.get(asset)
+
+    def local_path(self, release: Release, asset: str) -> Optional[str]:
+        """Путь к ассету, если он уже лежит на этой машине (копировать не нужно)."""
+        return None
+
+    def object_url(self, release: Release, sha: str) -> Optional[str]:
+        """URL файла по sha256 (контентно-адресуемый источник); None — не умеет."""
+        return None
+
+    def list_url(self, name: str, user_agent: str, timeout: int) -> Optional[tuple[str, str]]:
+        """(URL списка lists/<name>, его sha256 или ""); None — списков не раздаёт."""
+        return None
+
+
+def _write_bytes_checked(data: bytes, dst: str, label: str, expected_sha256: str = "") -> None:
+    if expected_sha256 and hashlib.sha256(data).hexdigest() != expected_sha256.lower().strip():
+        raise ValueError(f"{label}: sha256 mismatch")
+    tmp = dst + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dst)
+
+
+def _release_from_manifest(source: UpdateSource, manifest_name: str, data: bytes,
+                           locate: Callable[[str], str]) -> Optional[Release]:
+    m = json.loads(data.decode("utf-8", errors="replace"))
+    if not isinstance(m, dict):
+        return None
+    tag = str(m.get("version") or "").strip()
+    if not tag:
+        return None
+    package = str(m.get("package") or "update.zip").strip() or "update.zip"
+    names = (manifest_name, manifest_name + SIG_SUFFIX, package)
+    return Release(source, tag, {n: locate(n) for n in names}, cached={manifest_name: data})
+
+
+class GitHubSource(UpdateSource):
+    kind = "github"
+    requires_signature = False
+
+    def __init__(self, owner: str, repo: str):
+        super().__init__(f"{owner}/{repo}")
+
+    def latest(self, user_agent: str, timeout: int, manifest_name: str) -> Optional[Release]:
+        data = http_get_json(f"https://api.github.com/repos/{self.location}/releases/latest",
+                             user_agent, timeout=timeout)
+        tag = (data.get("tag_name") or "").strip()
+        if not tag:
+            return None
+        assets = {a.get("name"): a.get("browser_download_url") for a in data.get("assets", []) or []
+                  if a.get("name") and a.get("browser_download_url")}
+        return Release(self, tag, assets, data.get("body", "") or "")
+
+
+class MirrorSource(UpdateSource):
+    """Папка релиза по HTTP(S): статическое зеркало или другой MVZ в локальной сети."""
+    kind = "http"
+
+    def __init__(self, base_url: str):
+        super().__init__(base_url.rstrip("/") + "/")
+
+    def _url(self, name: str) -> str:
+        return self.location + urllib.parse.quote(name)
+
+    def latest(self, user_agent: str, timeout: int, manifest_name: str) -> Optional[Release]:
+        req = urllib.request.Request(self._url(manifest_name), headers={"User-Agent": user_agent})
+        with _urlopen(req, timeout=timeout) as r:
+            data = r.read(MANIFEST_MAX_BYTES + 1)
+        if len(data) > MANIFEST_MAX_BYTES:
+            raise ValueError(f"{self}: {manifest_name} is too large")
+        return _release_from_manifest(self, manifest_name, data, self._url)
+
+    def list_url(self, name: str, user_agent: str, timeout: int) -> Optional[tuple[str, str]]:
+        return self._url(f"lists/{name}"), ""
+
+
+class LocalDirSource(UpdateSource):
+    """Папка релиза на диске: флешка, сетевая шара (\\\\server\\mvz)."""
+    kind = "dir"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.location, *name.split("/"))
+
+    def latest(self, user_agent: str, timeout: int, manifest_name: str) -> Optional[Release]:
+        with open(self._path(manifest_name), "rb") as f:
+            data = f.read(MANIFEST_MAX_BYTES + 1)
+        if len(data) > MANIFEST_MAX_BYTES:
+            raise ValueError(f"{self}: {manifest_name} is too large")
+        return _release_from_manifest(self, manifest_name, data, self._path)
+
+    def fetch(self, release: Release, asset: str, dst: str, user_agent: str, timeout: int = 300,
+              on_bytes: Optional[BytesCb] = None, cancel: Optional[threading.Event] = None,
+              expected_sha256: str = "") -> None:
+        data = (release.cached or {}).get(asset)
+        if data is not None:
+            _write_bytes_checked(data, dst, asset, expected_sha256)
+            return
+        src = release.assets.get(asset)
+        if not src or not os.path.isfile(src):
+            raise FileNotFoundError(f"{self}: no {asset}")
+        total = os.path.getsize(src)
+        h = hashlib.sha256()
+        tmp = dst + ".tmp"
+        done = 0
+        try:
+            with open(src, "rb") as fi, open(tmp, "wb") as fo:
+                for chunk in iter(lambda: fi.read(DOWNLOAD_CHUNK), b""):
+                    if cancel is not None and cancel.is_set():
+                        raise UpdateCancelled(asset)
+                    fo.write(chunk)
+                    h.update(chunk)
+                    done += len(chunk)
+                    if on_bytes:
+                        on_bytes(done, total)
+            if expected_sha256 and h.hexdigest() != expected_sha256.lower().strip():
+                raise ValueError(f"{asset}: sha256 mismatch ({h.hexdigest()})")
+            os.replace(tmp, dst)
+        finally:
+            _remove_quiet(tmp)
+
+    def range_url(self, release: Release, asset: str) -> Optional[str]:
+        return None
+
+    def local_path(self, release: Release, asset: str) -> Optional[str]:
+        p = release.assets.get(asset)
+        return p if p and os.path.isfile(p) else None
+
+    def list_url(self, name: str, user_agent: str, timeout: int) -> Optional[tuple[str, str]]:
+        p = os.path.abspath(self._path(f"lists/{name}"))
+        if not os.path.isfile(p):
+            return None
+        return "file:" + urllib.request.pathname2url(p), ""
+
+
+class LanSource(MirrorSource):
+    """
+    Другой MVZ с включённой раздачей (core.lan_cache.LanCacheServer): отдаёт
+    подписанный манифест своей версии и файлы по sha256 — из хранилища
+    объектов и из установки. Без адреса сервер ищется UDP-запросом в сети.
+    """
+    kind = "lan"
+    content_addressed = True
+
+    def __init__(self, base_url: str = "", discover_timeout: float = 0.7):
+        super().__init__(base_url or "http://-/")
+        self.fixed = bool(base_url)
+        self.discover_timeout = discover_timeout
+
+    def _locate(self) -> bool:
+        """Найти соседа, если адрес не задан. False — никто не ответил."""
+        if self.fixed:
+            return True
+        found = lan_discover(self.discover_timeout)
+        if not found:
+            return False
+        # самая новая версия; при равных — ответивший первым
+        best = max(found, key=lambda f: _version_tuple(f[1]))
+        self.location = best[0]
+        return True
+
+    def latest(self, user_agent: str, timeout: int, manifest_name: str) -> Optional[Release]:
+        if not self._locate():
+            return None
+        rel = super().latest(user_agent, timeout, manifest_name)
+        if rel is not None:
+            # пакета у соседа нет — только файлы по sha256
+            rel.assets = {n: u for n, u in rel.assets.items() if n.startswith(manifest_name)}
+        return rel
+
+    def range_url(self, release: Release, asset: str) -> Optional[str]:
+        return None
+
+    def object_url(self, release: Release, sha: str) -> Optional[str]:
+        return f"{self.location}objects/{sha}"
+
+    def list_url(self, name: str, user_agent: str, timeout: int) -> Optional[tuple[str, str]]:
+        # /lists — {имя: {sha256, size}}: файл потом проверяется по этому sha256
+        if not self._locate():
+            return None
+        req = urllib.request.Request(self._url("lists"), headers={"User-Agent": user_agent})
+        with _urlopen(req, timeout=timeout) as r:
+            data = r.read(MANIFEST_MAX_BYTES + 1)
+        if len(data) > MANIFEST_MAX_BYTES:
+            raise ValueError(f"{self}: lists index is too large")
+        index = json.loads(data.decode("utf-8", errors="replace"))
+        entry = index.get(name) if isinstance(index, dict) else None
+        sha = str(entry.get("sha256") or "").strip().lower() if isinstance(entry, dict) else ""
+        if len(sha) != 64:
+            return None
+        return self._url(f"lists/{name}"), sha
+
+
+class _ListOrigin(UpdateSource):
+    """Адрес списка из ListSource — последний кандидат list_fetcher."""
+    kind = "list"
+
+    def latest(self, user_agent: str, timeout: int, manifest_name: str) -> Optional[Release]:
+        return None
+
+    def list_url(self, name: str, user_agent: str, timeout: int) -> Optional[tuple[str, str]]:
+        return self.location, ""
+
+
+def fetch_objects(
+        peers: list[Release], want: dict, store: ObjectStore, user_agent: str,
+        sizes: Optional[dict] = None, on_bytes: Optional[BytesCb] = None,
+        cancel: Optional[threading.Event] = None, workers: int = 4,
+) -> list[str]:
+    """
+    Скачать файлы want (путь -> sha256) по sha256 у соседей прямо в хранилище
+    объектов; каждый файл проверяется по sha256. Возвращает пути, которые
+    удалось получить; остальное качается обычным путём.
+    """
+    by_sha: dict = {}
+    for rel_path, sha in want.items():
+        by_sha.setdefault(sha, []).append(rel_path)
+    total = sum((sizes or {}).get(paths[0], 0) for paths in by_sha.values())
+    lock = threading.Lock()
+    done_bytes = [0]
+
+    def one(sha: str) -> bool:
+        dst = store.incoming_path(sha)
+        for peer in peers:
+            url = peer.source.object_url(peer, sha)
+            if not url:
+                continue
+            last = [0]
+
+            def cb(n: int, _total: int) -> None:
+                with lock:
+                    done_bytes[0] += n - last[0]
+                    last[0] = n
+                    if on_bytes:
+                        on_bytes(done_bytes[0], total)
+            try:
+                download_url_to_file(url, dst, user_agent, timeout=30, label=sha[:12], on_bytes=cb,
+                                     cancel=cancel, expected_sha256=sha, retries=1, resume=False)
+            except UpdateCancelled:
+                raise
+            except Exception as e:
+                _log(f"[Update] object {sha[:12]} from {peer.source}: {repr(e)}")
+                with lock:
+                    done_bytes[0] -= last[0]
+                continue
+            store.put(dst, sha)
+            return True
+        return False
+
+    got: list[str] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mvz-peer") as pool:
+        futures = {sha: pool.submit(one, sha) for sha in by_sha}
+        try:
+            for sha, f in futures.items():
+                if f.result():
+                    got += by_sha[sha]
+        except BaseException:
+            for f in futures.values():
+                f.cancel()
+            raise
+    return got
+
+
+def parse_sources(text: str) -> list[UpdateSource]:
+    """
+    Дополнительные источники из настройки: по одному на строку (или через ;).
+    http(s)://… — зеркало; lan — поиск MVZ с раздачей в локальной сети,
+    lan://host[:port] — он же по адресу; иначе — путь к папке релиза.
+    """
+    out: list[UpdateSource] = []
+    for item in (text or "").replace(";", "\n").splitlines():
+        item = item.strip()
+        if not item or item.startswith("#"):
+            continue
+        if item.lower() == "lan":
+            out.append(LanSource())
+        elif item.lower().startswith("lan://"):
+            hostport = item[6:].strip("/")
+            if ":" not in hostport:
+                hostport = f"{hostport}:{LAN_PORT}"
+            out.append(LanSource(f"http://{hostport}/"))
+        elif item.lower().startswith(("http://", "https://")):
+            out.append(MirrorSource(item))
+        else:
+            out.append(LocalDirSource(os.path.expandvars(os.path.expanduser(item))))
+    return out
+
+
+def find_releases(
+        sources: list[UpdateSource], user_agent: str, manifest_name: str = "manifest.json",
+        timeout: int = SOURCE_CHECK_TIMEOUT, cancel: Optional[threading.Event] = None,
+) -> list[Release]:
+    """
+    Опросить все источники параллельно. Возвращает релизы самой новой
+    версии — в порядке sources (по нему же потом идут загрузки). Если не
+    ответил ни один источник — исключение первого из них. Источники,
+    которым нужна подпись манифеста, без ключа не опрашиваются: иначе их
+    версия, даже самая новая, вытеснила бы релиз GitHub, а применить её нельзя.
+    """
+    if not MANIFEST_PUBLIC_KEYS:
+        skipped = [s for s in sources if s.requires_signature]
+        if skipped:
+            _log(f"[Update] no public key configured, skipping unsigned-only sources: {skipped}")
+        sources = [s for s in sources if not s.requires_signature]
+    if not sources:
+        raise ValueError("no update sources")
+    pool = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="mvz-src")
+    futures = [pool.submit(s.latest, user_agent, timeout, manifest_name) for s in sources]
+    results: list[Optional[Release]] = [None] * len(sources)
+    errors: list[Exception] = []
+    deadline = time.monotonic() + timeout + 5
+    try:
+        for i, f in enumerate(futures):
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise UpdateCancelled("release")
+                try:
+                    results[i] = f.result(timeout=min(0.2, max(0.0, deadline - time.monotonic())))
+                    break
+                except FuturesTimeout:
+                    if time.monotonic() >= deadline:
+                        errors.append(TimeoutError(f"{sources[i]}: no answer"))
+                        _log(f"[Update] source {sources[i]}: no answer")
+                        break
+                except UpdateCancelled:
+                    raise
+                except Exception as e:
+                    errors.append(e)
+                    _log(f"[Update] source {sources[i]}: {repr(e)}")
+                    break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    found = [r for r in results if r is not None]
+    if not found:
+        if errors:
+            raise errors[0]
+        return []
+    best = max(_version_tuple(r.tag) for r in found)
+    out = [r for r in found if _version_tuple(r.tag) == best]
+    _log(f"[Update] latest {out[0].tag} at {', '.join(repr(r.source) for r in out)}")
+    return out
+
+
+def hedged(
+        candidates: list[Release], attempt: Callable[[Release, threading.Event], Any], label: str,
+        cancel: Optional[threading.Event] = None, delay: float = HEDGE_DELAY,
+) -> Any:
+    """
+    Hedged-запрос: attempt(release, stop) по первому кандидату; нет результата
+    за delay секунд — параллельно по следующему, и так далее. Ошибка (в т.ч.
+    не сошёлся sha256) сразу подключает следующего. Возвращается первый
+    успешный результат, остальные попытки останавливаются через stop.
+    Медленный аплинк так тратится на вторую копию, только когда первая
+    явно застряла.
+    """
+    if not candidates:
+        raise ValueError(f"{label}: no source")
+    stops = [threading.Event() for _ in candidates]
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="mvz-hedge")
+    running: dict = {}
+    errors: list[Exception] = []
+    nxt = 0
+    hedge_at = 0.0
+    try:
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise UpdateCancelled(label)
+            if nxt < len(candidates) and (not running or time.monotonic() >= hedge_at):
+                if running:
+                    _log(f"[Update] {label}: no result in {delay:g}s, also trying {candidates[nxt].source}")
+                running[pool.submit(attempt, candidates[nxt], stops[nxt])] = nxt
+                nxt += 1
+                hedge_at = time.monotonic() + delay
+            if not running:
+                raise errors[0] if errors else RuntimeError(f"{label}: all sources failed")
+            done, _ = futures_wait(list(running), timeout=0.2, return_when=FIRST_COMPLETED)
+            for f in done:
+                i = running.pop(f)
+                try:
+                    res = f.result()
+                except UpdateCancelled:
+                    if cancel is not None and cancel.is_set():
+                        raise
+                    continue
+                except Exception as e:
+                    errors.append(e)
+                    _log(f"[Update] {label} from {candidates[i].source}: {repr(e)}")
+                    hedge_at = 0.0
+                    continue
+                if nxt > 1:
+                    _log(f"[Update] {label}: taken from {candidates[i].source}")
+                return res
+    finally:
+        for s in stops:
+            s.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_asset(
+        candidates: list[Release], asset: str, dst: str, user_agent: str, timeout: int = 300,
+        on_bytes: Optional[BytesCb] = None, cancel: Optional[threading.Event] = None,
+        expected_sha256: str = "", validate: Optional[Callable[[Release, str, threading.Event], None]] = None,
+        delay: float = HEDGE_DELAY,
+) -> Release:
+    """
+    Скачать ассет в dst с первого источника, отдавшего проверенное содержимое
+    (expected_sha256 и/или validate(release, path, stop), которая бросает
+    исключение). Каждый источник качает в свой файл — проигравшие не портят
+    результат. Возвращает релиз источника, с которого взят файл.
+    """
+    candidates = [r for r in candidates if asset in r.assets]
+    lead = [0, -1]  # байт у лидера, индекс лидера
+
+    def attempt(rel: Release, stop: threading.Event) -> tuple[Release, str]:
+        i = candidates.index(rel)
+        path = dst if len(candidates) == 1 else f"{dst}.src{i}"
+
+        def cb(done: int, total: int) -> None:
+            # в прогресс — только самая продвинутая из параллельных загрузок
+            if on_bytes and (lead[1] == i or done > lead[0]):
+                lead[0], lead[1] = done, i
+                on_bytes(done, total)
+
+        rel.source.fetch(rel, asset, path, user_agent, timeout=timeout, on_bytes=cb, cancel=stop,
+                         expected_sha256=expected_sha256)
+        try:
+            if validate:
+                validate(rel, path, stop)
+        except BaseException:
+            _remove_quiet(path)
+            raise
+        return rel, path
+
+    rel, path = hedged(candidates, attempt, asset, cancel=cancel, delay=delay)
+    if path != dst:
+        os.replace(path, dst)
+    return rel
+
+
+def list_fetcher(
+        sources: list[UpdateSource], user_agent: str, timeout: int = SOURCE_CHECK_TIMEOUT,
+        delay: float = HEDGE_DELAY,
+) -> Callable:
+    """
+    fetch для core.list_updater.ListUpdater: список качается hedged-запросом —
+    сначала с sources (соседи по LAN, зеркала, папки — lists/<имя>), затем
+    с адреса из ListSource. Побеждает первый ответ, прошедший проверку
+    ListUpdater. Подпись не нужна: список не исполняется, а мусор, обрыв
+    и «не тот список» отсеивает сама проверка.
+    """
+    def fetch(src, attempt: Callable[[str, str, threading.Event], Any],
+              cancel: Optional[threading.Event] = None) -> Any:
+        candidates = [Release(s, "", {}) for s in sources]
+        candidates.append(Release(_ListOrigin(src.url), "", {}))
+
+        def one(rel: Release, stop: threading.Event) -> Any:
+            found = rel.source.list_url(src.name, user_agent, timeout)
+            if not found:
+                raise FileNotFoundError(f"{rel.source}: no lists/{src.name}")
+            return attempt(found[0], found[1], stop)
+
+        return hedged(candidates, one, src.name, cancel=cancel, delay=delay)
+
+    return fetch
+
+
 def apply_update_from_release(
         owner: str, repo: str, current_version: str,
         manifest_name: str = "manifest.json", user_agent: str = "MVZ-Updater",
         allow_internal: bool = False, progress: Optional[ProgressCb] = None,
-        stop_bin_cb: Optional[Callable[[], None]] = None, settings: Optional[Any] = None
+        stop_bin_cb: Optional[Callable[[], None]] = None, settings: Optional[Any] = None,
+        on_stage: Optional[StageCb] = None, cancel: Optional[threading.Event] = None,
+        sources: Optional[list[UpdateSource]] = None,
 ) -> UpdateResult:
+    """
+    Обновление по стадиям STAGES. cancel (threading.Event) прерывает работу
+    исключением UpdateCancelled на любой стадии до "apply" — файлы приложения
+    к этому моменту ещё не тронуты, winws не остановлен.
+    sources — откуда брать релиз, по приоритету (по умолчанию только GitHub).
+    """
+    if not sources:
+        sources = [GitHubSource(owner, repo)]
     base_dir = app_dir()
+    job = _StageTracker(progress, on_stage, cancel)
     _log(f"[Update] check start (app={current_version})")
 
+    def remember_tag(tag: str) -> None:
+        if settings:
+            try:
+                settings.setValue("last_release_tag", tag)
+            except:
+                pass
+
+    # --- release ---
+    job.begin("release")
     try:
-        latest = http_get_json(
-            f"https://api.github.com/repos/{owner}/{repo}/releases/latest",
-            user_agent, timeout=15
-        )
+        releases = find_releases(sources, user_agent, manifest_name, timeout=15, cancel=cancel)
+    except UpdateCancelled:
+        raise
     except Exception as e:
         _log(f"[Update] Exception: {repr(e)}")
         raise
+    job.end()
 
-    tag = (latest.get("tag_name") or "").strip()
+    tag = releases[0].tag if releases else ""
     if not tag or _version_tuple(tag) <= _version_tuple(current_version):
         return UpdateResult(False, False, [], tag)
 
-    manifest_url = find_asset_url(latest, manifest_name)
-    if not manifest_url:
+    releases = [r for r in releases if manifest_name in r.assets]
+    if not releases:
         return UpdateResult(False, False, [], tag)
 
     exe_name = os.path.basename(sys.executable) if getattr(sys, "frozen", False) else "MVZ.exe"
     tmp_dir = tempfile.gettempdir()
     manifest_path = os.path.join(tmp_dir, "mvz_manifest.json")
-    stage_dir = os.path.join(tmp_dir, "mvz_update_stage")
+    # стадия внутри папки приложения: тот же том, файлы встают на место
+    # переименованием; если туда не пишется — обычная временная папка
+    stage_dir = os.path.join(base_dir, STAGE_DIR_NAME)
     zip_path = os.path.join(tmp_dir, "mvz_update.zip")
+    delta_path = os.path.join(tmp_dir, "mvz_update.delta")
+    retry_path = delta_path + ".retry"
 
     if os.path.isdir(stage_dir):
         shutil.rmtree(stage_dir, ignore_errors=True)
 
-    download_url_to_file(manifest_url, manifest_path, user_agent, timeout=60, progress=progress, label=manifest_name)
-    manifest = load_manifest(manifest_path)
-
-    package_name = (manifest.get("package") or "update.zip").strip() or "update.zip"
-    package_url = find_asset_url(latest, package_name)
-    if not package_url:
-        return UpdateResult(False, False, [], tag)
-
-    changed = compute_changed_files(manifest, base_dir)
-    deletes = compute_delete_files(manifest, base_dir)
-    touched = _dedupe_keep_order(changed + deletes)
-
-    if not touched:
-        if settings:
+    try:
+        # --- manifest ---
+        job.begin("manifest")
+
+        sig_of: dict = {}
+
+        def check_manifest(rel: Release, path: str, stop: threading.Event) -> None:
+            # подпись — с того же источника, что и манифест
+            sig_name = manifest_name + SIG_SUFFIX
+            required = rel.source.requires_signature
+            sig = None
+            if MANIFEST_PUBLIC_KEYS and sig_name in rel.assets:
+                sig = path + SIG_SUFFIX
+                rel.source.fetch(rel, sig_name, sig, user_agent, timeout=60, cancel=stop)
+            verify_manifest_signature(path, sig, required=required)
+            load_manifest(path)
+            sig_of[id(rel)] = sig
+
+        source = fetch_asset(releases, manifest_name, manifest_path, user_agent, timeout=60,
+                             on_bytes=job.bytes_cb(manifest_name), cancel=cancel, validate=check_manifest)
+        manifest = load_manifest(manifest_path)
+        sig_path = sig_of.get(id(source))
+        job.end()
+
+        package_name = (manifest.get("package") or "update.zip").strip() or "update.zip"
+        # соседи по LAN отдают файлы по sha256 — их пробуем раньше пакета
+        peers = [r for r in releases if r.source.content_addressed]
+        # источник, с которого взят манифест, — первым: его пакет точно от этой сборки
+        releases = [source] + [r for r in releases if r is not source]
+        releases = [r for r in releases if package_name in r.assets]
+        if not releases and not peers:
+            return UpdateResult(False, False, [], tag)
+
+        # --- diff ---
+        job.begin("diff")
+        hash_cache = HashCache(os.path.join(base_dir, HASH_CACHE_NAME))
+        changed = compute_changed_files(
+            manifest, base_dir, hash_cache,
+            on_file=lambda i, n, path: job.report("diff", int(i * 100 / n)),
+        )
+        hash_cache.save()
+        _log(f"[Update] hash cache: {hash_cache.hits} hits, {hash_cache.misses} hashed")
+        deletes = compute_delete_files(manifest, base_dir)
+        touched = _dedupe_keep_order(changed + deletes)
+
+        if not touched:
+            job.end()
+            remember_tag(tag)
+            return UpdateResult(False, False, [], tag)
+
+        # текущие версии заменяемых файлов — в хранилище (для отката);
+        # то, что там уже есть (перенесённый файл, откат назад), не качаем
+        wanted = {r: s.lower() for r, s in _manifest_field(manifest, "sha256", str).items()}
+        store: Optional[ObjectStore] = ObjectStore(os.path.join(base_dir, OBJECTS_DIR_NAME))
+        try:
+            previous = snapshot_to_store(store, base_dir, touched, hash_cache)
+            from_store = [r for r in changed if wanted.get(r) and store.has(wanted[r])]
+        except OSError as e:
+            _log(f"[Update] object store unavailable: {repr(e)}")
+            store, previous, from_store = None, {}, []
+        hash_cache.save()
+        to_fetch = [r for r in changed if r not in set(from_store)]
+        if from_store:
+            _log(f"[Update] {len(from_store)} files taken from local object store")
+        patch_plan, bases = choose_patches(manifest, to_fetch, base_dir, previous, store)
+        full = [r for r in to_fetch if r not in patch_plan]
+        if patch_plan:
+            _log(f"[Update] {len(patch_plan)} files via binary patches, "
+                 f"{format_bytes(sum(pe['size'] for pe in patch_plan.values()))}")
+        job.end()
+
+        # --- download ---
+        job.begin("download")
+        package_size = manifest.get("package_size")
+        package_size = package_size if isinstance(package_size, int) and package_size > 0 else 0
+        package_sha256 = str(manifest.get("package_sha256") or "").lower().strip()
+
+        def fetch(members: list[str], dst: str) -> "str | DeltaPackage":
+            # пакет уже на этой машине (флешка, шара) — читаем на месте, без копии
+            for rel in releases:
+                local = rel.source.local_path(rel, package_name)
+                if not local or (package_size and os.path.getsize(local) != package_size):
+                    continue
+                if package_sha256 and sha256_file(local).lower() != package_sha256:
+                    _log(f"[Update] {package_name} at {rel.source}: sha256 mismatch, skipped")
+                    continue
+                _log(f"[Update] {package_name} from {rel.source}")
+                return local
+            range_url = next((u for u in (r.source.range_url(r, package_name) for r in releases) if u), None)
+            if range_url:
+                try:
+                    return download_zip_members(range_url, members, dst, user_agent, timeout=300,
+                                                label=package_name, on_bytes=job.bytes_cb(package_name),
+                                                cancel=cancel, expected_size=package_size)
+                except DeltaUnavailable as e:
+                    _log(f"[Update] delta download unavailable: {e}; fetching full {package_name}")
+            fetch_asset(releases, package_name, zip_path, user_agent, timeout=300,
+                        on_bytes=job.bytes_cb(package_name), cancel=cancel,
+                        expected_sha256=package_sha256)
+            return zip_path
+
+        if peers and store is not None and to_fetch:
+            got = fetch_objects(peers, {r: wanted[r] for r in to_fetch if wanted.get(r)}, store, user_agent,
+                                sizes=_manifest_field(manifest, "size", int), on_bytes=job.bytes_cb("LAN"),
+                                cancel=cancel)
+            if got:
+                _log(f"[Update] {len(got)} files from LAN peers")
+                got_set = set(got)
+                from_store += got
+                to_fetch = [r for r in to_fetch if r not in got_set]
+                full = [r for r in full if r not in got_set]
+                patch_plan = {r: pe for r, pe in patch_plan.items() if r not in got_set}
+
+        package: "str | DeltaPackage" = zip_path
+        if to_fetch:
+            package = fetch(full + [pe["path"] for pe in patch_plan.values()], delta_path)
+        job.end()
+
+        # --- verify ---
+        job.begin("verify")
+        if full:
+            verify_zip_members(package, full, manifest)
+        job.end()
+
+        # --- stage ---
+        job.begin("stage")
+        if changed:
             try:
-                settings.setValue("last_release_tag", tag)
-            except:
-                pass
-        return UpdateResult(False, False, [], tag)
+                os.makedirs(stage_dir)
+            except OSError:
+                stage_dir = os.path.join(tmp_dir, STAGE_DIR_NAME)
+                shutil.rmtree(stage_dir, ignore_errors=True)
+            on_file = lambda i, n, rel: job.report(f"stage: {rel}", int(i * 100 / n))
+            if full:
+                extract_needed_from_zip(package, full, stage_dir, on_file=on_file, manifest=manifest)
+            if patch_plan:
+                failed = apply_patches(package, patch_plan, bases, manifest, stage_dir, on_file=on_file)
+                if failed:
+                    # в полном архиве есть и сами файлы; для дельты докачиваем их отдельно
+                    extra = package if isinstance(package, str) else fetch(failed, retry_path)
+                    verify_zip_members(extra, failed, manifest)
+                    extract_needed_from_zip(extra, failed, stage_dir, on_file=on_file, manifest=manifest)
+            for r in from_store:
+                store.materialize(wanted[r], os.path.join(stage_dir, r))
+            if store is not None:
+                try:
+                    for r in to_fetch:
+                        if wanted.get(r):
+                            store.add(os.path.join(stage_dir, r), wanted[r])
+                except OSError as e:
+                    _log(f"[Update] object store: {repr(e)}")
+        _remove_quiet(delta_path, retry_path)
+        job.end()
+    except UpdateCancelled:
+        _log(f"[Update] cancelled at stage {job.stage}")
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        _remove_quiet(delta_path, retry_path)
+        raise UpdateCancelled(job.stage)
+    except Exception:
+        # в т.ч. отвергнутый по sha256 файл: ничего не заменено, стадию не оставляем
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        raise
 
-    if stop_bin_cb:
+    # --- apply (отменить уже нельзя) ---
+    job.begin("apply", cancellable=False)
+    restarted = _apply_staged(job, base_dir, stage_dir, changed, deletes, exe_name, allow_internal, stop_bin_cb)
+    if store is not None:
         try:
-            stop_bin_cb()
-        except:
-            pass
+            store.save_snapshot(current_version, previous)
+            store.gc(keep=wanted.values())
+        except OSError as e:
+            _log(f"[Update] object store: {repr(e)}")
+    try:
+        # манифест новой версии — для раздачи соседям (core.lan_cache)
+        save_release(base_dir, manifest_path, sig_path)
+    except OSError as e:
+        _log(f"[Update] release copy: {repr(e)}")
+    job.end()
 
-    imm_del, def_del = [], []
-    for r in deletes:
-        (def_del if needs_deferred(r, exe_name, allow_internal) else imm_del).append(r)
+    if not restarted and os.path.isdir(stage_dir):
+        shutil.rmtree(stage_dir, ignore_errors=True)
+    remember_tag(tag)
+    return UpdateResult(True, restarted, touched, tag)
 
-    for r in imm_del:
-        try:
-            t = os.path.join(base_dir, r)
-            (shutil.rmtree(t, ignore_errors=True) if os.path.isdir(t) else os.remove(t))
-        except:
-            pass
 
-    download_url_to_file(package_url, zip_path, user_agent, timeout=300, progress=progress, label=package_name)
-    extract_needed_from_zip(zip_path, changed, stage_dir)
+def rollback_last_update(
+        allow_internal: bool = False, progress: Optional[ProgressCb] = None,
+        stop_bin_cb: Optional[Callable[[], None]] = None,
+        on_stage: Optional[StageCb] = None, cancel: Optional[threading.Event] = None,
+) -> UpdateResult:
+    """
+    Вернуть файлы к версии до последнего обновления — из локального
+    хранилища объектов, без сети. Снимок после отката удаляется, так что
+    повторный вызов откатывает ещё на шаг назад (если есть куда).
+    """
+    base_dir = app_dir()
+    job = _StageTracker(progress, on_stage, cancel)
+    store = ObjectStore(os.path.join(base_dir, OBJECTS_DIR_NAME))
+    snap = store.last_snapshot()
+    if snap is None:
+        raise RuntimeError("Нет сохранённой версии для отката")
 
-    imm_files, def_files = [], []
-    for r in changed:
-        (def_files if needs_deferred(r, exe_name, allow_internal) else imm_files).append(r)
+    exe_name = os.path.basename(sys.executable) if getattr(sys, "frozen", False) else "MVZ.exe"
+    files = {_safe_rel_path(r): (s or "").lower() for r, s in snap["files"].items()}
+    restore = [r for r, s in files.items() if s]
+    deletes = [r for r, s in files.items() if not s and os.path.exists(os.path.join(base_dir, r))]
+    version = str(snap.get("version") or "")
+    stage_dir = os.path.join(base_dir, STAGE_DIR_NAME)
+    if os.path.isdir(stage_dir):
+        shutil.rmtree(stage_dir, ignore_errors=True)
+    _log(f"[Update] rollback to {version}: {len(restore)} files, {len(deletes)} deletes")
 
-    total = max(1, len(imm_files))
-    for i, r in enumerate(imm_files, 1):
-        if progress:
-            progress(f"apply: {r}", int((i / total) * 100))
-        atomic_copy_replace(os.path.join(stage_dir, r), os.path.join(base_dir, r))
+    try:
+        job.begin("verify")
+        missing = [r for r in restore if not store.has(files[r])]
+        if missing:
+            raise RuntimeError("В хранилище нет прежней версии файлов: " + ", ".join(missing[:5]))
+        job.end()
 
-    if def_files or def_del:
-        if not getattr(sys, "frozen", False):
-            raise RuntimeError("Deferred update requires frozen build")
-        bat = build_deferred_bat(base_dir, stage_dir, def_files, def_del, exe_name, allow_internal)
-        subprocess.Popen(["cmd", "/c", bat], creationflags=0x08000000)
-        if settings:
-            try:
-                settings.setValue("last_release_tag", tag)
-            except:
-                pass
-        return UpdateResult(True, True, touched, tag)
+        job.begin("stage")
+        try:
+            os.makedirs(stage_dir)
+        except OSError:
+            stage_dir = os.path.join(tempfile.gettempdir(), STAGE_DIR_NAME)
+            shutil.rmtree(stage_dir, ignore_errors=True)
+        for i, r in enumerate(restore, 1):
+            job.report(f"stage: {r}", int(i * 100 / len(restore)))
+            store.materialize(files[r], os.path.join(stage_dir, r))
+        job.end()
+    except UpdateCancelled:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        raise UpdateCancelled(job.stage)
+    except Exception:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        raise
 
-    if os.path.isdir(stage_dir):
+    job.begin("apply", cancellable=False)
+    restarted = _apply_staged(job, base_dir, stage_dir, restore, deletes, exe_name, allow_internal, stop_bin_cb)
+    store.drop_snapshot(snap)
+    store.hashes.save()
+    job.end()
+
+    if not restarted and os.path.isdir(stage_dir):
         shutil.rmtree(stage_dir, ignore_errors=True)
-    if settings:
-        try:
-            settings.setValue("last_release_tag", tag)
-        except:
-            pass
-    return UpdateResult(True, False, touched, tag)
+    return UpdateResult(True, restarted, _dedupe_keep_order(restore + deletes), version)
@@ -0,0 +1,137 @@
+# ui/update_worker.py
+from __future__ import annotations
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+import threading
+import urllib.error
+from typing import Any, Callable, Optional
+
+from core.list_updater import DEFAULT_SOURCES, ListSource, ListUpdater
+from ui.mvz_updater import (
+    ReleaseCheck, UpdateCancelled, UpdateSource, apply_update_from_release, check_latest_release, find_releases,
+)
+
+
+class UpdateCheckSignals(QObject):
+    finished = Signal(object)  # ReleaseCheck
+    failed = Signal(int, str)  # HTTP-код (0 — не HTTP), текст ошибки
+
+
+class UpdateCheckTask(QRunnable):
+    """
+    Проверка releases/latest в QThreadPool; результат приходит сигналами в GUI-поток.
+    Если GitHub недоступен (лимит 403, сеть), опрашиваются fallback-источники.
+    """
+
+    def __init__(self, url: str, user_agent: str, etag: str = "", last_modified: str = "", timeout: int = 10,
+                 fallback: Optional[list[UpdateSource]] = None, manifest_name: str = "manifest.json"):
+        super().__init__()
+        self.url = url
+        self.user_agent = user_agent
+        self.etag = etag
+        self.last_modified = last_modified
+        self.timeout = timeout
+        self.fallback = fallback or []
+        self.manifest_name = manifest_name
+        self.signals = UpdateCheckSignals()
+
+    def _check_fallback(self) -> Optional[ReleaseCheck]:
+        if not self.fallback:
+            return None
+        try:
+            found = find_releases(self.fallback, self.user_agent, self.manifest_name, timeout=self.timeout)
+        except Exception:
+            return None
+        if not found:
+            return None
+        return ReleaseCheck(False, found[0].as_github(), "", "")
+
+    def run(self):
+        try:
+            res = check_latest_release(
+                self.url, self.user_agent,
+                etag=self.etag, last_modified=self.last_modified, timeout=self.timeout,
+            )
+        except urllib.error.HTTPError as e:
+            res = self._check_fallback()
+            if res is None:
+                self.signals.failed.emit(int(e.code), str(e))
+                return
+        except Exception as e:
+            res = self._check_fallback()
+            if res is None:
+                self.signals.failed.emit(0, str(e))
+                return
+        self.signals.finished.emit(res)
+
+
+class UpdateJobSignals(QObject):
+    progress = Signal(object)   # StageProgress
+    finished = Signal(object)   # UpdateResult
+    failed = Signal(str)
+    cancelled = Signal(str)     # стадия, на которой отменили
+    stop_requested = Signal()   # GUI должен остановить winws и вызвать ack_stop()
+
+
+class UpdateJob(QRunnable):
+    """
+    apply_update_from_release (или другой target с той же сигнатурой
+    стадий, например rollback_last_update) в QThreadPool. Прогресс по стадиям
+    приходит сигналами; cancel() прерывает задачу до стадии apply, не трогая установку.
+    """
+
+    def __init__(self, stop_timeout: float = 15.0, target: Optional[Callable[..., Any]] = None,
+                 **update_kwargs: Any):
+        super().__init__()
+        self.target = target or apply_update_from_release
+        self.update_kwargs = update_kwargs
+        self.stop_timeout = stop_timeout
+        self.signals = UpdateJobSignals()
+        self._cancel = threading.Event()
+        self._stopped = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def ack_stop(self):
+        self._stopped.set()
+
+    def _stop_bin(self):
+        # остановка winws трогает виджеты — делаем её в GUI-потоке и ждём
+        self._stopped.clear()
+        self.signals.stop_requested.emit()
+        self._stopped.wait(self.stop_timeout)
+
+    def run(self):
+        try:
+            res = self.target(
+                on_stage=self.signals.progress.emit,
+                cancel=self._cancel,
+                stop_bin_cb=self._stop_bin,
+                **self.update_kwargs,
+            )
+        except UpdateCancelled as e:
+            self.signals.cancelled.emit(str(e))
+            return
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(res)
+
+
+class ListUpdateSignals(QObject):
+    finished = Signal(object)   # list[ListUpdate]
+
+
+class ListUpdateTask(QRunnable):
+    """ListUpdater.update_all в QThreadPool: скачивание и проверка списков не блокируют GUI."""
+
+    def __init__(self, updater: ListUpdater, sources: tuple[ListSource, ...] = DEFAULT_SOURCES):
+        super().__init__()
+        self.updater = updater
+        self.sources = sources
+        self.signals = ListUpdateSignals()
+
+    def run(self):
+        self.signals.finished.emit(self.updater.update_all(self.sources))